@@ -1,1032 +1,1090 @@
-# achievement_service.py
-from django.db.models import Count, Q, Max, Avg
-from django.utils import timezone
+"""
+Achievement engine.
+
+Every achievement is decided by a rule in the RULES registry. A player's history is loaded
+in a constant number of queries (load_histories, which loads any number of players together,
+e.g. all participants of a tournament) and replayed as one chronologically
+ordered stream: every game, and after the games of a tournament the tournament itself with
+the player's standing. Each rule folds the events it cares about into its own state, a
+plain dict, and then reports the awards that state has earned.
+
+Existing achievements are loaded once; new ones are written with one bulk_create and
+changed counts with one bulk_update. A player can hold each achievement type once, so
+achievements for a single tournament go to the first tournament that qualifies.
+
+The rule states are saved per player (AchievementProgress) up to a watermark: the last
+tournament up to which all of the player's tournaments are completed. The next check loads
+only what comes after it and folds that into the saved states, so its cost depends on the
+new games, not on the length of the history. Changing a game or a standing at or before the
+watermark discards the saved states, and the next check replays the history in full.
+
+evaluate_club replays the whole club at once: one chronological scan over every match and
+standing feeds the rule states of all players, so a consistency run over everyone costs
+O(total games) instead of a history load per player.
+"""
+import copy
 import datetime
 
-def check_achievements(user):
+from django.db.models import Count, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from .cache_service import bump_player_versions
+
+
+RULES = []
+
+
+def rule(cls):
+    """Class decorator that adds an achievement rule to the registry"""
+    RULES.append(cls())
+    return cls
+
+
+class Award:
+    """An achievement a player has earned, with its count for counted achievements"""
+    __slots__ = ('achievement_type', 'count', 'tournament_id')
+
+    def __init__(self, achievement_type, count=None, tournament_id=None):
+        self.achievement_type = achievement_type
+        self.count = count                  # None for achievements that are not counted
+        self.tournament_id = tournament_id
+
+
+class Game:
+    """One finished game of the player, from the player's side (see PlayerGame)"""
+    __slots__ = (
+        'tournament_id', 'date', 'round_number', 'match_id', 'color', 'result', 'opponent_id'
+    )
+
+    def __init__(self, tournament_id, date, round_number, match_id, color, result, opponent_id):
+        self.tournament_id = tournament_id
+        self.date = date
+        self.round_number = round_number
+        self.match_id = match_id
+        self.color = color
+        self.result = result
+        self.opponent_id = opponent_id
+
+
+class TournamentEntry:
+    """A tournament the player took part in, with their standing and their games in it"""
+    __slots__ = (
+        'tournament_id', 'date', 'tournament_type', 'time_control', 'is_completed', 'participant_count',
+        'round_total', 'highest_rated_id', 'penultimate_round_id', 'winner_id', 'has_standing', 'rank',
+        'score', 'snapshot_rank', 'snapshot_size', 'leader_ids', 'games', 'wins', 'losses', 'total'
+    )
+
+    def __init__(self, tournament):
+        self.tournament_id = tournament.id
+        self.date = tournament.date
+        self.tournament_type = tournament.tournament_type
+        self.time_control = tournament.time_control
+        self.is_completed = tournament.is_completed
+        self.participant_count = tournament.participant_count
+        self.round_total = tournament.round_total
+        self.highest_rated_id = tournament.highest_rated_id
+        self.penultimate_round_id = tournament.penultimate_round_id
+        self.winner_id = tournament.winner_id
+        self.has_standing = False
+        self.rank = None
+        self.score = None
+        self.snapshot_rank = None           # Rank after the penultimate round
+        self.snapshot_size = 0              # Players in the standings after the penultimate round
+        self.leader_ids = []                # Players ranked first after the penultimate round
+        self.games = []
+        self.wins = self.losses = self.total = 0
+
+    @property
+    def is_winner(self):
+        return self.has_standing and self.rank == 1
+
+    def close(self, games):
+        """Attach the player's games in this tournament, in round order"""
+        self.games = games
+        self.total = len(games)
+        self.wins = sum(1 for game in games if game.result == 'win')
+        self.losses = sum(1 for game in games if game.result == 'loss')
+
+
+class PlayerHistory:
+    """Everything the rules need to know about one player, as one ordered stream of events"""
+
+    def __init__(self, player, games, tournaments, elos):
+        self.player = player
+        self.games = games
+        self.tournaments = tournaments
+        self.elos = elos    # Current overall rating of the player and of every opponent they beat
+
+    @classmethod
+    def load(cls, player, progress=None):
+        """Load the history of a player after the watermark of progress, or all of it without one"""
+        return load_histories([player], {player.pk: progress} if progress else {})[player.pk]
+
+    def events(self):
+        """
+        The games and tournaments of the player in chronological order, as ('game', Game) and
+        ('tournament', TournamentEntry). A tournament follows its last game, with its games attached.
+        """
+        by_tournament = {}
+        for game in self.games:
+            by_tournament.setdefault(game.tournament_id, []).append(game)
+        for entry in self.tournaments:
+            entry.close(by_tournament.get(entry.tournament_id, []))
+
+        stream = [((game.date, game.tournament_id, 0, game.round_number, game.match_id), 'game', game) for game in self.games]
+        stream.extend(((entry.date, entry.tournament_id, 1, 0, 0), 'tournament', entry) for entry in self.tournaments)
+        stream.sort(key=lambda event: event[0])
+        return [(kind, item) for _, kind, item in stream]
+
+    def split(self, events):
+        """
+        Split the events after the last tournament up to which all of the player's tournaments
+        are completed. The events up to there are final and can be saved as progress; the ones
+        after it can still change. Returns both, and the completed tournaments in the first part.
+        """
+        final = []
+        for entry in self.tournaments:
+            if not entry.is_completed:
+                break
+            final.append(entry)
+        if not final:
+            return [], events, final
+        position = next(i for i, (_, item) in enumerate(events) if item is final[-1]) + 1
+        return events[:position], events[position:], final
+
+
+def watermark_filter(progress, player_ids, player_field, date_field, tournament_field, after=True):
     """
-    Check for all possible achievements for a user and update the database.
-    Returns a list of newly earned achievements.
+    Filter for the rows of the given players after their watermarks (progress by player id),
+    or up to them with after=False. Rows of players without a watermark are all after it.
     """
-    from .models import Tournament, TournamentStanding, Match, Achievement
-    from django.db.models import Q
-    
-    # Track newly earned achievements to report back
-    new_achievements = []
-    
-    # --- TOURNAMENT MILESTONE ACHIEVEMENTS ---
-    
-    # Get all completed tournaments for this user
-    tournaments = Tournament.objects.filter(
-        participants=user,
-        is_completed=True
-    )
-    
-    # Count total tournaments participation
-    tournament_count = tournaments.count()
-    
-    # Check tournament participation milestones
-    if tournament_count >= 10:
-        achievement, created = Achievement.objects.get_or_create(
-            user=user, 
-            achievement_type='tournament_veteran_10',
-            defaults={'count': tournament_count}
-        )
-        if created:
-            new_achievements.append(achievement)
-        else:
-            achievement.count = tournament_count
-            achievement.save()
-            
-    if tournament_count >= 25:
-        achievement, created = Achievement.objects.get_or_create(
-            user=user, 
-            achievement_type='tournament_veteran_25',
-            defaults={'count': tournament_count}
-        )
-        if created:
-            new_achievements.append(achievement)
-        else:
-            achievement.count = tournament_count
-            achievement.save()
-            
-    if tournament_count >= 50:
-        achievement, created = Achievement.objects.get_or_create(
-            user=user, 
-            achievement_type='tournament_veteran_50',
-            defaults={'count': tournament_count}
-        )
-        if created:
-            new_achievements.append(achievement)
-        else:
-            achievement.count = tournament_count
-            achievement.save()
-    
-    # --- TOURNAMENT RANKINGS ACHIEVEMENTS ---
-    
-    # Count first, second, and third place finishes
-    first_places = TournamentStanding.objects.filter(
-        tournament__in=tournaments,
-        player=user,
-        rank=1
-    ).count()
-    
-    second_places = TournamentStanding.objects.filter(
-        tournament__in=tournaments,
-        player=user,
-        rank=2
-    ).count()
-    
-    third_places = TournamentStanding.objects.filter(
-        tournament__in=tournaments,
-        player=user,
-        rank=3
-    ).count()
-    
-    # Tournament win milestones - Fixed the first win achievement logic
-    if first_places >= 1:
-        # Check if the achievement already exists
-        existing_achievement = Achievement.objects.filter(
-            user=user, 
-            achievement_type='tournament_win_1'
-        ).first()
-        
-        if existing_achievement:
-            # Update the count if it has changed
-            if existing_achievement.count != first_places:
-                existing_achievement.count = first_places
-                existing_achievement.save()
-                print(f"DEBUG: Updated tournament_win_1 count to {first_places}")
-        else:
-            # Create new achievement
-            achievement = Achievement.objects.create(
-                user=user, 
-                achievement_type='tournament_win_1',
-                count=first_places
-            )
-            new_achievements.append(achievement)
-            
-    if first_places >= 3:
-        achievement, created = Achievement.objects.get_or_create(
-            user=user, 
-            achievement_type='tournament_win_3',
-            defaults={'count': first_places}
-        )
-        if created:
-            new_achievements.append(achievement)
-        else:
-            if achievement.count != first_places:
-                achievement.count = first_places
-                achievement.save()
-            
-    if first_places >= 5:
-        achievement, created = Achievement.objects.get_or_create(
-            user=user, 
-            achievement_type='tournament_win_5',
-            defaults={'count': first_places}
-        )
-        if created:
-            new_achievements.append(achievement)
-        else:
-            if achievement.count != first_places:
-                achievement.count = first_places
-                achievement.save()
-            
-    if first_places >= 10:
-        achievement, created = Achievement.objects.get_or_create(
-            user=user, 
-            achievement_type='tournament_win_10',
-            defaults={'count': first_places}
-        )
-        if created:
-            new_achievements.append(achievement)
-        else:
-            if achievement.count != first_places:
-                achievement.count = first_places
-                achievement.save()
-    
-    # Second place achievements
-    if second_places >= 3:
-        achievement, created = Achievement.objects.get_or_create(
-            user=user, 
-            achievement_type='silver_medal_3',
-            defaults={'count': second_places}
-        )
-        if created:
-            new_achievements.append(achievement)
-        else:
-            achievement.count = second_places
-            achievement.save()
-            
-    if second_places >= 5:
-        achievement, created = Achievement.objects.get_or_create(
-            user=user, 
-            achievement_type='silver_medal_5',
-            defaults={'count': second_places}
-        )
-        if created:
-            new_achievements.append(achievement)
-        else:
-            achievement.count = second_places
-            achievement.save()
-    
-    # Third place achievements
-    if third_places >= 3:
-        achievement, created = Achievement.objects.get_or_create(
-            user=user, 
-            achievement_type='bronze_medal_3',
-            defaults={'count': third_places}
-        )
-        if created:
-            new_achievements.append(achievement)
-        else:
-            achievement.count = third_places
-            achievement.save()
-            
-    if third_places >= 5:
-        achievement, created = Achievement.objects.get_or_create(
-            user=user, 
-            achievement_type='bronze_medal_5',
-            defaults={'count': third_places}
-        )
-        if created:
-            new_achievements.append(achievement)
-        else:
-            achievement.count = third_places
-            achievement.save()
-    
-    # --- SPECIAL TOURNAMENT ACHIEVEMENTS ---
-    
-    for tournament in tournaments:
-        # Get tournament type and time control
-        tournament_type = tournament.tournament_type
-        time_control = tournament.time_control
-        
-        # Check if user won this tournament
-        try:
-            user_standing = tournament.standings.get(player=user)
-            is_winner = user_standing.rank == 1
-            
-            # Check for tournament format specific achievements
-            if is_winner:
-                # Format specific achievements
-                if tournament_type == 'swiss':
-                    achievement, created = Achievement.objects.get_or_create(
-                        user=user, 
-                        achievement_type='swiss_master'
-                    )
-                    if created:
-                        new_achievements.append(achievement)
-                    
-                elif tournament_type == 'round_robin':
-                    achievement, created = Achievement.objects.get_or_create(
-                        user=user, 
-                        achievement_type='round_robin_champion'
-                    )
-                    if created:
-                        new_achievements.append(achievement)
-                    
-                elif tournament_type == 'double_round_robin':
-                    achievement, created = Achievement.objects.get_or_create(
-                        user=user, 
-                        achievement_type='double_round_robin_king'
-                    )
-                    if created:
-                        new_achievements.append(achievement)
-                
-                # Time control specific achievements
-                if time_control == 'bullet':
-                    achievement, created = Achievement.objects.get_or_create(
-                        user=user, 
-                        achievement_type='bullet_blitzer'
-                    )
-                    if created:
-                        new_achievements.append(achievement)
-                    
-                elif time_control == 'blitz':
-                    achievement, created = Achievement.objects.get_or_create(
-                        user=user, 
-                        achievement_type='blitz_boss'
-                    )
-                    if created:
-                        new_achievements.append(achievement)
-                    
-                elif time_control == 'rapid':
-                    achievement, created = Achievement.objects.get_or_create(
-                        user=user, 
-                        achievement_type='rapid_ruler'
-                    )
-                    if created:
-                        new_achievements.append(achievement)
-                    
-                elif time_control == 'classical':
-                    achievement, created = Achievement.objects.get_or_create(
-                        user=user, 
-                        achievement_type='classical_conqueror'
-                    )
-                    if created:
-                        new_achievements.append(achievement)
-                
-                # Check for "Comeback Kid" achievement
-                # Get user's first match in this tournament
-                first_match = Match.objects.filter(
-                    tournament=tournament,
-                    round__number=1
-                ).filter(
-                    Q(white_player=user) | Q(black_player=user)
-                ).first()
-                
-                if first_match:
-                    # Check if user lost their first match
-                    lost_first_match = (first_match.white_player == user and first_match.result == 'black_win') or \
-                                      (first_match.black_player == user and first_match.result == 'white_win')
-                    
-                    if lost_first_match:
-                        achievement, created = Achievement.objects.get_or_create(
-                            user=user, 
-                            achievement_type='comeback_kid',
-                            tournament=tournament
-                        )
-                        if created:
-                            new_achievements.append(achievement)
-            
-            # Check for "Perfect Score" achievement
-            # Get all user's matches in this tournament
-            user_matches = Match.objects.filter(
-                tournament=tournament
-            ).filter(
-                Q(white_player=user) | Q(black_player=user)
-            ).exclude(result='pending')
-            
-            if user_matches.exists():
-                wins = 0
-                losses = 0
-                draws = 0
-                
-                for match in user_matches:
-                    if (match.white_player == user and match.result == 'white_win') or \
-                       (match.black_player == user and match.result == 'black_win'):
-                        wins += 1
-                    elif (match.white_player == user and match.result == 'black_win') or \
-                         (match.black_player == user and match.result == 'white_win'):
-                        losses += 1
-                    else:
-                        draws += 1
-                
-                # Check for various achievement patterns
-                total_games = wins + losses + draws
-                
-                # Perfect Score
-                if total_games > 0 and wins == total_games:
-                    achievement, created = Achievement.objects.get_or_create(
-                        user=user, 
-                        achievement_type='perfect_score',
-                        tournament=tournament
-                    )
-                    if created:
-                        new_achievements.append(achievement)
-                
-                # Undefeated
-                if total_games > 0 and losses == 0:
-                    # First check if an identical achievement already exists
-                    existing_achievement = Achievement.objects.filter(
-                        user=user,
-                        achievement_type='undefeated',
-                        tournament=tournament
-                    ).first()
-                    
-                    if not existing_achievement:
-                        # Only create if it doesn't exist
-                        achievement = Achievement.objects.create(
-                            user=user,
-                            achievement_type='undefeated',
-                            tournament=tournament
-                        )
-                        new_achievements.append(achievement)
-                
-                # Support Bear (No wins)
-                if total_games > 0 and wins == 0:
-                    achievement, created = Achievement.objects.get_or_create(
-                        user=user, 
-                        achievement_type='support_bear',
-                        tournament=tournament
-                    )
-                    if created:
-                        new_achievements.append(achievement)
-                
-                # Chess for Dummies (Last place)
-                if user_standing.rank == tournament.participants.count():
-                    achievement, created = Achievement.objects.get_or_create(
-                        user=user, 
-                        achievement_type='dummies',
-                        tournament=tournament
-                    )
-                    if created:
-                        new_achievements.append(achievement)
-                
-                # The Ace (Win all games)
-                if is_winner and wins == total_games:
-                    achievement, created = Achievement.objects.get_or_create(
-                        user=user, 
-                        achievement_type='goat',
-                        tournament=tournament
-                    )
-                    if created:
-                        new_achievements.append(achievement)
-                
-                # Truce Seeker (50%+ draws)
-                if total_games > 0 and draws / total_games >= 0.5:
-                    achievement, created = Achievement.objects.get_or_create(
-                        user=user, 
-                        achievement_type='truce_seeker',
-                        tournament=tournament
-                    )
-                    if created:
-                        new_achievements.append(achievement)
-                
-                # Giant Slayer
-                highest_rated_player = tournament.participants.order_by('-elo').first()
-                if highest_rated_player and highest_rated_player != user:
-                    # Look for matches against the highest rated player
-                    highest_rated_matches = user_matches.filter(
-                        Q(white_player=highest_rated_player, black_player=user) |
-                        Q(white_player=user, black_player=highest_rated_player)
-                    )
-                    
-                    for match in highest_rated_matches:
-                        # Check if user won against the highest rated player
-                        if (match.white_player == user and match.result == 'white_win') or \
-                           (match.black_player == user and match.result == 'black_win'):
-                            achievement, created = Achievement.objects.get_or_create(
-                                user=user, 
-                                achievement_type='giant_slayer',
-                                tournament=tournament
-                            )
-                            if created:
-                                new_achievements.append(achievement)
-                            break
-                            
-        except TournamentStanding.DoesNotExist:
-            # User doesn't have standings in this tournament
-            continue
-    
-    # --- MATCH-BASED ACHIEVEMENTS ---
-    
-    # Get all user's matches
-    all_matches = Match.objects.filter(
-        Q(white_player=user) | Q(black_player=user)
-    ).exclude(result='pending').order_by('tournament__date', 'round__number')
-    
-    # Process match history with careful null checking
-    opponents = set()
-    for match in all_matches:
-        # Safely handle white and black players
-        if match.white_player == user and match.black_player is not None:
-            opponents.add(match.black_player.id)
-        elif match.black_player == user and match.white_player is not None:
-            opponents.add(match.white_player.id)
-    
-    # Social Butterfly Achievement
-    opponent_matches = {}
-    for match in all_matches:
-        # Skip matches with None for white or black player
-        if match.white_player is None or match.black_player is None:
-            continue
-        
-        if match.white_player == user and match.result == 'white_win':
-            opponent_id = match.black_player.id
-            if opponent_id not in opponent_matches:
-                opponent_matches[opponent_id] = []
-            opponent_matches[opponent_id].append((match.tournament.date, match.round.number, 'win'))
-        elif match.black_player == user and match.result == 'black_win':
-            opponent_id = match.white_player.id
-            if opponent_id not in opponent_matches:
-                opponent_matches[opponent_id] = []
-            opponent_matches[opponent_id].append((match.tournament.date, match.round.number, 'win'))
-        elif match.white_player == user and match.result != 'white_win':
-            opponent_id = match.black_player.id
-            if opponent_id not in opponent_matches:
-                opponent_matches[opponent_id] = []
-            opponent_matches[opponent_id].append((match.tournament.date, match.round.number, 'not_win'))
-        elif match.black_player == user and match.result != 'black_win':
-            opponent_id = match.white_player.id
-            if opponent_id not in opponent_matches:
-                opponent_matches[opponent_id] = []
-            opponent_matches[opponent_id].append((match.tournament.date, match.round.number, 'not_win'))
-    
-    if len(opponents) >= 15:
-        achievement, created = Achievement.objects.get_or_create(
-            user=user, 
-            achievement_type='social_butterfly'
-        )
-        if created:
-            new_achievements.append(achievement)
-    
-    # Check for streaks
-    current_streak = 0
-    max_streak = 0
-    
-    white_streak = 0
-    max_white_streak = 0
-    
-    black_streak = 0
-    max_black_streak = 0
-    
-    for match in all_matches:
-        # Check overall streak
-        if (match.white_player == user and match.result == 'white_win') or \
-           (match.black_player == user and match.result == 'black_win'):
-            # Win
-            current_streak += 1
-            max_streak = max(max_streak, current_streak)
-            
-            # Check color-specific streaks
-            if match.white_player == user:
-                white_streak += 1
-                max_white_streak = max(max_white_streak, white_streak)
-                black_streak = 0  # Reset other color streak
-            else:
-                black_streak += 1
-                max_black_streak = max(max_black_streak, black_streak)
-                white_streak = 0  # Reset other color streak
-                
-        else:
-            # Loss or draw
-            current_streak = 0
-            
-            # Reset color-specific streaks
-            if match.white_player == user:
-                white_streak = 0
-            else:
-                black_streak = 0
-    
-    # Hat Trick (3 consecutive wins)
-    if max_streak >= 3:
-        achievement, created = Achievement.objects.get_or_create(
-            user=user, 
-            achievement_type='hat_trick'
-        )
-        if created:
-            new_achievements.append(achievement)
-    
-    # Winning Streak (5 consecutive wins)
-    if max_streak >= 5:
-        achievement, created = Achievement.objects.get_or_create(
-            user=user, 
-            achievement_type='winning_streak_5'
-        )
-        if created:
-            new_achievements.append(achievement)
-    
-    # Unstoppable (10 consecutive wins)
-    if max_streak >= 10:
-        achievement, created = Achievement.objects.get_or_create(
-            user=user, 
-            achievement_type='winning_streak_10'
-        )
-        if created:
-            new_achievements.append(achievement)
-    
-    # White Dominator (5 consecutive wins as White)
-    if max_white_streak >= 5:
-        achievement, created = Achievement.objects.get_or_create(
-            user=user, 
-            achievement_type='white_dominator'
-        )
-        if created:
-            new_achievements.append(achievement)
-    
-    # Black Defender (5 consecutive wins as Black)
-    if max_black_streak >= 5:
-        achievement, created = Achievement.objects.get_or_create(
-            user=user, 
-            achievement_type='black_defender'
-        )
-        if created:
-            new_achievements.append(achievement)
-    
-    # Check for Underdog achievement
-    underdog_count = 0
-    for match in all_matches:
-        # Skip matches with None for white or black player
-        if match.white_player is None or match.black_player is None:
-            continue
-        
-        if match.white_player == user and match.result == 'white_win' and \
-           match.black_player.elo >= (match.white_player.elo + 200):
-            underdog_count += 1
-            
-        elif match.black_player == user and match.result == 'black_win' and \
-             match.white_player.elo >= (match.black_player.elo + 200):
-            underdog_count += 1
-    
-    if underdog_count > 0:
-        achievement, created = Achievement.objects.get_or_create(
-            user=user, 
-            achievement_type='underdog',
-            defaults={'count': underdog_count}
-        )
-        if created:
-            new_achievements.append(achievement)
-        else:
-            achievement.count = underdog_count
-            achievement.save()
-    
-    # --- RATING-BASED ACHIEVEMENTS ---
-    # These should only be checked at the end of tournaments
-    
-    # Check rating milestones
-    rating = user.blitz_elo  # Using blitz rating as the primary rating
-    
-    if rating >= 1600:
-        achievement, created = Achievement.objects.get_or_create(
-            user=user, 
-            achievement_type='rating_1600'
-        )
-        if created:
-            new_achievements.append(achievement)
-    
-    if rating >= 1800:
-        achievement, created = Achievement.objects.get_or_create(
-            user=user, 
-            achievement_type='rating_1800'
-        )
-        if created:
-            new_achievements.append(achievement)
-    
-    if rating >= 2000:
-        achievement, created = Achievement.objects.get_or_create(
-            user=user, 
-            achievement_type='rating_2000'
-        )
-        if created:
-            new_achievements.append(achievement)
-    
-    if rating >= 2200:
-        achievement, created = Achievement.objects.get_or_create(
-            user=user, 
-            achievement_type='rating_2200'
-        )
-        if created:
-            new_achievements.append(achievement)
-    
-    # Rival Nemesis - Win 3 consecutive games against the same opponent
-    opponent_matches = {}
-    for match in all_matches:
-        # Skip matches with None for white or black player
-        if match.white_player is None or match.black_player is None:
+    # Players without a watermark have all their rows after it and none up to it
+    without = [player_id for player_id in player_ids if player_id not in progress] if after else []
+    condition = Q(**{f"{player_field}__in": without})
+    for player_id in player_ids:
+        watermark = progress.get(player_id)
+        if watermark is None:
             continue
-        
-        if match.white_player == user and match.result == 'white_win':
-            opponent_id = match.black_player.id
-            if opponent_id not in opponent_matches:
-                opponent_matches[opponent_id] = []
-            opponent_matches[opponent_id].append((match.tournament.date, match.round.number, 'win'))
-        elif match.black_player == user and match.result == 'black_win':
-            opponent_id = match.white_player.id
-            if opponent_id not in opponent_matches:
-                opponent_matches[opponent_id] = []
-            opponent_matches[opponent_id].append((match.tournament.date, match.round.number, 'win'))
-        elif match.white_player == user and match.result != 'white_win':
-            opponent_id = match.black_player.id
-            if opponent_id not in opponent_matches:
-                opponent_matches[opponent_id] = []
-            opponent_matches[opponent_id].append((match.tournament.date, match.round.number, 'not_win'))
-        elif match.black_player == user and match.result != 'black_win':
-            opponent_id = match.white_player.id
-            if opponent_id not in opponent_matches:
-                opponent_matches[opponent_id] = []
-            opponent_matches[opponent_id].append((match.tournament.date, match.round.number, 'not_win'))
-    
-    # Check for 3 consecutive wins against any opponent
-    for opponent_id, matches in opponent_matches.items():
-        # Sort by date and round
-        matches.sort()
-        consecutive_wins = 0
-        max_consecutive_wins = 0
-        
-        for _, _, result in matches:
-            if result == 'win':
-                consecutive_wins += 1
-                max_consecutive_wins = max(max_consecutive_wins, consecutive_wins)
-            else:
-                consecutive_wins = 0
-        
-        if max_consecutive_wins >= 3:
-            achievement, created = Achievement.objects.get_or_create(
-                user=user, 
-                achievement_type='rival_nemesis'
+        if after:
+            rows = Q(**{f"{date_field}__gt": watermark.date}) | Q(
+                **{date_field: watermark.date, f"{tournament_field}__gt": watermark.tournament_id}
             )
-            if created:
-                new_achievements.append(achievement)
-            break
-    
-    # Bar Legend - Participate in 10 consecutive weekly tournaments
-    all_tournaments = user.tournaments.order_by('date')
-    if all_tournaments.count() >= 10:
-        # Convert to list for easier manipulation
-        tournament_dates = list(all_tournaments.values_list('date', flat=True))
-        
-        # Check for consecutive weekly tournaments
-        consecutive_weeks = 1
-        max_consecutive_weeks = 1
-        
-        for i in range(1, len(tournament_dates)):
-            # If the difference between tournaments is 5-9 days, consider it weekly
-            days_diff = (tournament_dates[i] - tournament_dates[i-1]).days
-            if 5 <= days_diff <= 9:
-                consecutive_weeks += 1
-                max_consecutive_weeks = max(max_consecutive_weeks, consecutive_weeks)
-            else:
-                consecutive_weeks = 1
-        
-        if max_consecutive_weeks >= 10:
-            achievement, created = Achievement.objects.get_or_create(
-                user=user,
-                achievement_type='bar_legend'
+        else:
+            rows = Q(**{f"{date_field}__lt": watermark.date}) | Q(
+                **{date_field: watermark.date, f"{tournament_field}__lte": watermark.tournament_id}
             )
-            if created:
-                new_achievements.append(achievement)
-    
-    # --- MILESTONE ACHIEVEMENTS ---
-    
-    # Century Club - Play 100 rated games
-    total_games = all_matches.count()
-    if total_games >= 100:
-        achievement, created = Achievement.objects.get_or_create(
-            user=user,
-            achievement_type='century_club'
+        condition |= Q(**{player_field: player_id}) & rows
+    return condition
+
+
+def with_tournament_details(tournaments):
+    """Annotate a Tournament queryset with what TournamentEntry needs besides the tournament itself"""
+    from .models import Round
+
+    round_totals = Round.objects.filter(tournament=OuterRef('pk')).order_by().values('tournament').annotate(
+        total=Count('id')
+    ).values('total')
+    return tournaments.annotate(
+        round_total=Coalesce(Subquery(round_totals), 0),
+        penultimate_round_id=Subquery(
+            Round.objects.filter(tournament=OuterRef('pk')).order_by('-number').values('id')[1:2]
         )
-        if created:
-            new_achievements.append(achievement)
-    
-    # Blitz Marathon - Play 10 games in a single day
-    # Group matches by date
-    matches_by_date = {}
-    for match in all_matches:
-        match_date = match.tournament.date
-        if match_date not in matches_by_date:
-            matches_by_date[match_date] = 0
-        matches_by_date[match_date] += 1
-    
-    # Check if any date has 10+ games
-    for date, count in matches_by_date.items():
-        if count >= 10:
-            achievement, created = Achievement.objects.get_or_create(
-                user=user,
-                achievement_type='blitz_marathon'
-            )
-            if created:
-                new_achievements.append(achievement)
-            break
-    
-    # --- WHIMSICAL ACHIEVEMENTS ---
-    
-    # Phoenix Rising - Lose 3 consecutive games then win the next 3
-    if all_matches.count() >= 6:
-        results = []
-        for match in all_matches.order_by('tournament__date', 'round__number'):
-            if (match.white_player == user and match.result == 'white_win') or \
-               (match.black_player == user and match.result == 'black_win'):
-                results.append('win')
-            elif match.result != 'draw':  # Only count definite losses
-                results.append('loss')
-        
-        # Look for pattern: loss, loss, loss, win, win, win
-        for i in range(len(results) - 5):
-            if results[i:i+6] == ['loss', 'loss', 'loss', 'win', 'win', 'win']:
-                achievement, created = Achievement.objects.get_or_create(
-                    user=user,
-                    achievement_type='phoenix_rising'
-                )
-                if created:
-                    new_achievements.append(achievement)
-                break
-    
-    # Draw Magnet - Draw 3 consecutive games
-    if all_matches.count() >= 3:
-        consecutive_draws = 0
-        max_consecutive_draws = 0
-        
-        for match in all_matches.order_by('tournament__date', 'round__number'):
-            if match.result == 'draw':
-                consecutive_draws += 1
-                max_consecutive_draws = max(max_consecutive_draws, consecutive_draws)
-            else:
-                consecutive_draws = 0
-        
-        if max_consecutive_draws >= 3:
-            achievement, created = Achievement.objects.get_or_create(
-                user=user,
-                achievement_type='draw_magnet'
-            )
-            if created:
-                new_achievements.append(achievement)
-    
-    # Last Stand - Win your final game after losing all previous games in a tournament
-    for tournament in tournaments:
-        tournament_matches = Match.objects.filter(
-            tournament=tournament
-        ).filter(
-            Q(white_player=user) | Q(black_player=user)
-        ).exclude(result='pending').order_by('round__number')
-        
-        if tournament_matches.count() >= 2:
-            # Get only the user's results
-            results = []
-            for match in tournament_matches:
-                if (match.white_player == user and match.result == 'white_win') or \
-                   (match.black_player == user and match.result == 'black_win'):
-                    results.append('win')
-                elif match.result == 'draw':
-                    results.append('draw')
-                else:
-                    results.append('loss')
-            
-            # Check if all games were losses except the last one which was a win
-            if all(result == 'loss' for result in results[:-1]) and results[-1] == 'win':
-                achievement, created = Achievement.objects.get_or_create(
-                    user=user,
-                    achievement_type='last_stand',
-                    tournament=tournament
-                )
-                if created:
-                    new_achievements.append(achievement)
-    
-    # --- ACHIEVEMENT TROPHIES ---
-    
-    # Grand Slam - Win tournaments in all four time controls
-    time_control_wins = set()
-    for tournament in tournaments:
-        try:
-            standing = TournamentStanding.objects.get(
-                tournament=tournament,
-                player=user,
-                rank=1
-            )
-            time_control_wins.add(tournament.time_control)
-        except TournamentStanding.DoesNotExist:
-            pass
-    
-    # Check if all 4 time controls have been won
-    if len(time_control_wins) >= 4:  # bullet, blitz, rapid, classical
-        achievement, created = Achievement.objects.get_or_create(
-            user=user,
-            achievement_type='grand_slam'
+    )
+
+
+def load_histories(players, progress):
+    """
+    Load the histories of several players after their watermarks (progress by player id;
+    players without one are loaded in full). Takes five queries however many players and
+    games there are, six if one of them completed a tournament of two rounds or more.
+    """
+    from .models import PlayerGame, StandingSnapshot, Tournament, TournamentStanding, User
+
+    player_ids = [player.pk for player in players]
+
+    # --- STEP 1: The tournaments of every player after their watermark ---
+    participations = Tournament.participants.through.objects.filter(
+        watermark_filter(progress, player_ids, 'user_id', 'tournament__date', 'tournament_id')
+    )
+    tournaments = {
+        tournament.pk: tournament
+        for tournament in with_tournament_details(Tournament.objects.filter(pk__in=participations.values('tournament_id')))
+    }
+    entries = {}
+    player_tournaments = {player_id: [] for player_id in player_ids}
+    for player_id, tournament_id in participations.values_list('user_id', 'tournament_id'):
+        entry = entries[player_id, tournament_id] = TournamentEntry(tournaments[tournament_id])
+        player_tournaments[player_id].append(entry)
+
+    # --- STEP 2: The players' standings in the completed ones ---
+    for player_id, tournament_id, rank, score in TournamentStanding.objects.filter(
+        watermark_filter(progress, player_ids, 'player_id', 'tournament__date', 'tournament_id'),
+        tournament__is_completed=True
+    ).values_list('player_id', 'tournament_id', 'rank', 'score'):
+        entry = entries.get((player_id, tournament_id))
+        if entry is not None:
+            entry.has_standing = True
+            entry.rank = rank
+            entry.score = score
+
+    # --- STEP 3: Standings before the final round of the completed tournaments ---
+    # The leaders of every one of them, and the full standings of those a player won
+    completed = [entry for entry in entries.values() if entry.is_completed and entry.penultimate_round_id]
+    if completed:
+        won = {entry.penultimate_round_id for entry in completed if entry.is_winner}
+        sizes = {}
+        ranks = {}
+        leaders = {}
+        for round_id, player_id, rank in StandingSnapshot.objects.filter(
+            Q(round_id__in=won) | Q(rank=1),
+            round_id__in={entry.penultimate_round_id for entry in completed}
+        ).values_list('round_id', 'player_id', 'rank'):
+            sizes[round_id] = sizes.get(round_id, 0) + 1
+            ranks[round_id, player_id] = rank
+            if rank == 1:
+                leaders.setdefault(round_id, []).append(player_id)
+        for (player_id, _), entry in entries.items():
+            if not entry.is_completed or not entry.penultimate_round_id:
+                continue
+            entry.leader_ids = leaders.get(entry.penultimate_round_id, [])
+            if entry.is_winner:
+                entry.snapshot_size = sizes.get(entry.penultimate_round_id, 0)
+                entry.snapshot_rank = ranks.get((entry.penultimate_round_id, player_id))
+
+    # --- STEP 4: Every finished game, in the order they were played ---
+    games = {player_id: [] for player_id in player_ids}
+    for player_id, *row in PlayerGame.objects.filter(
+        watermark_filter(progress, player_ids, 'player_id', 'date', 'tournament_id')
+    ).exclude(result='pending').order_by(
+        'player_id', 'date', 'tournament_id', 'round_number', 'match_id'
+    ).values_list('player_id', 'tournament_id', 'date', 'round_number', 'match_id', 'color', 'result', 'opponent_id'):
+        games[player_id].append(Game(*row))
+
+    # --- STEP 5: Ratings of the players and of everyone they ever beat, before the watermarks too ---
+    elos = dict(User.objects.filter(
+        Q(pk__in=player_ids)
+        | Q(pk__in=PlayerGame.objects.filter(player_id__in=player_ids, result='win').values('opponent'))
+    ).values_list('id', 'elo'))
+
+    return {
+        player.pk: PlayerHistory(
+            player, games[player.pk],
+            sorted(player_tournaments[player.pk], key=lambda entry: (entry.date, entry.tournament_id)), elos
         )
-        if created:
-            new_achievements.append(achievement)
-    
-    # Format Master - Win tournaments in all three formats
-    format_wins = set()
-    for tournament in tournaments:
-        if tournament.tournament_type:  # Skip tournaments with no defined type
-            try:
-                standing = TournamentStanding.objects.get(
-                    tournament=tournament,
-                    player=user,
-                    rank=1
+        for player in players
+    }
+
+
+def start_states():
+    """Fresh state of every rule, by rule name"""
+    return {rule.name: rule.start() for rule in RULES}
+
+
+def fold(states, events):
+    """Fold events into the rule states, in one pass"""
+    rules = [(rule, states[rule.name]) for rule in RULES]
+    for kind, item in events:
+        for rule, state in rules:
+            if kind == 'game':
+                rule.game(state, item)
+            else:
+                rule.tournament(state, item)
+
+
+def collect_awards(states, history):
+    """Awards earned by the rule states"""
+    awards = []
+    for rule in RULES:
+        awards.extend(rule.awards(states[rule.name], history))
+    return awards
+
+
+def evaluate(history, states=None):
+    """Replay a history through every rule in one pass; returns the awards earned"""
+    states = start_states() if states is None else states
+    fold(states, history.events())
+    return collect_awards(states, history)
+
+
+def plan_awards(players, awards):
+    """
+    Compare the awards of players (by player id) with their achievements. Returns the
+    achievements to create, by player id, and (achievement, new count) pairs for the counts
+    that change. Nothing is written.
+    """
+    from .models import Achievement
+
+    existing = {player.pk: {} for player in players}
+    for achievement in Achievement.objects.filter(user__in=players):
+        existing[achievement.user_id][achievement.achievement_type] = achievement
+
+    created = {player.pk: [] for player in players}
+    changed = []
+    for player in players:
+        for award in awards[player.pk]:
+            achievement = existing[player.pk].get(award.achievement_type)
+            if achievement is None:
+                achievement = Achievement(
+                    user=player, achievement_type=award.achievement_type,
+                    count=award.count or 1, tournament_id=award.tournament_id
                 )
-                format_wins.add(tournament.tournament_type)
-            except TournamentStanding.DoesNotExist:
-                pass
-    
-    # Check if all 3 formats have been won
-    all_formats = {'swiss', 'round_robin', 'double_round_robin'}
-    if format_wins >= all_formats:
-        achievement, created = Achievement.objects.get_or_create(
-            user=user,
-            achievement_type='format_master'
+                existing[player.pk][award.achievement_type] = achievement
+                created[player.pk].append(achievement)
+            elif award.count is not None and achievement.count != award.count:
+                changed.append((achievement, award.count))
+    return created, changed
+
+
+def save_awards(players, awards):
+    """
+    Write the awards of players (by player id): new achievements in one bulk_create, changed
+    counts in one bulk_update. Returns the new achievements by player id.
+    """
+    from .models import Achievement
+
+    created, changed = plan_awards(players, awards)
+    for achievement, count in changed:
+        achievement.count = count
+    changed = [achievement for achievement, _ in changed]
+
+    new_achievements = [achievement for achievements in created.values() for achievement in achievements]
+    if new_achievements:
+        Achievement.objects.bulk_create(new_achievements)
+    if changed:
+        Achievement.objects.bulk_update(changed, ['count'])
+    bump_player_versions(
+        {achievement.user_id for achievement in new_achievements} | {achievement.user_id for achievement in changed}
+    )
+    return created
+
+
+def load_progress(players):
+    """
+    Saved AchievementProgress of players by player id, leaving out the players whose history
+    has to be replayed in full: nothing saved yet, a rule added since, or a tournament up to
+    the watermark that was added, removed or reopened
+    """
+    from .models import AchievementProgress, Tournament
+
+    rules = {rule.name for rule in RULES}
+    progress = {
+        saved.player_id: saved
+        for saved in AchievementProgress.objects.filter(player__in=players) if set(saved.state) == rules
+    }
+    if not progress:
+        return progress
+
+    folded = Tournament.participants.through.objects.filter(
+        watermark_filter(progress, list(progress), 'user_id', 'tournament__date', 'tournament_id', after=False)
+    ).values('user_id').annotate(
+        completed=Count('id', filter=Q(tournament__is_completed=True)),
+        open=Count('id', filter=Q(tournament__is_completed=False))
+    )
+    counts = {row['user_id']: (row['completed'], row['open']) for row in folded}
+    return {
+        player_id: saved for player_id, saved in progress.items()
+        if counts.get(player_id, (0, 0)) == (saved.tournaments, 0)
+    }
+
+
+def progress_after(player, progress, states, events, final):
+    """New AchievementProgress of a player after folding the final events into the rule states"""
+    from .models import AchievementProgress
+
+    last_match_id = progress.match_id if progress else None
+    for kind, item in events:
+        if kind == 'game':
+            last_match_id = item.match_id
+    return AchievementProgress(
+        player=player,
+        tournament_id=final[-1].tournament_id,
+        date=final[-1].date,
+        match_id=last_match_id,
+        tournaments=(progress.tournaments if progress else 0) + len(final),
+        state=copy.deepcopy(states)
+    )
+
+
+def save_progress(rows):
+    """Insert or replace AchievementProgress rows, in one query"""
+    from .models import AchievementProgress
+
+    if rows:
+        AchievementProgress.objects.bulk_create(
+            rows, update_conflicts=True, unique_fields=['player'],
+            update_fields=['tournament', 'date', 'match', 'tournaments', 'state', 'updated_at']
         )
-        if created:
-            new_achievements.append(achievement)
-    
-    # Seasonal Champion - Win tournaments in Spring, Summer, Fall, and Winter
-    season_wins = set()
+
+
+def reset_achievement_progress(player_ids, date):
+    """
+    Discard the saved progress of players whose watermark is on or after date, after their
+    games or standings on that date changed. Their next check replays the history in full.
+    """
+    from .models import AchievementProgress
+
+    AchievementProgress.objects.filter(player_id__in=list(player_ids), date__gte=date).delete()
+
+
+def evaluate_players(players):
+    """
+    Evaluate the achievements of several players together, in a constant number of queries,
+    without writing anything. Returns their awards by player id and the AchievementProgress
+    rows to save.
+    """
+    progress = load_progress(players)
+    histories = load_histories(players, progress)
+
+    awards = {}
+    saved = []
+    for player in players:
+        history = histories[player.pk]
+        states = progress[player.pk].state if player.pk in progress else start_states()
+
+        final_events, open_events, final = history.split(history.events())
+        if final:
+            fold(states, final_events)
+            saved.append(progress_after(player, progress.get(player.pk), states, final_events, final))
+        fold(states, open_events)
+        awards[player.pk] = collect_awards(states, history)
+    return awards, saved
+
+
+def check_players_achievements(players):
+    """
+    Check the achievements of several players together and update the database.
+    Returns the newly earned achievements by player id.
+    """
+    awards, saved = evaluate_players(players)
+    save_progress(saved)
+    return save_awards(players, awards)
+
+
+def check_tournament_achievements(tournament, participants=None):
+    """
+    Check the achievements of all participants of a tournament together.
+    Returns the newly earned achievements by participant.
+    """
+    if participants is None:
+        participants = list(tournament.participants.prefetch_related('ratings'))
+    new_achievements = check_players_achievements(participants)
+    return {participant: new_achievements[participant.pk] for participant in participants}
+
+
+def check_achievements(user):
+    """
+    Check for all possible achievements for a user and update the database.
+    Returns a list of newly earned achievements.
+    """
+    return check_players_achievements([user])[user.pk]
+
+
+def evaluate_club():
+    """
+    Evaluate the achievements of every player in one chronological scan over all matches
+    and standings of the club, without writing anything. Returns the players, their awards
+    by player id and the AchievementProgress rows to save.
+    """
+    from .models import AchievementProgress, Match, StandingSnapshot, Tournament, TournamentStanding, User
+    from .player_stats_service import PLAYER_RESULTS
+
+    players = list(User.objects.prefetch_related('ratings').order_by('id'))
+    elos = {player.pk: player.elo for player in players}
+    states = {player.pk: start_states() for player in players}
+    rule_states = {player_id: [(rule, player_states[rule.name]) for rule in RULES] for player_id, player_states in states.items()}
+
+    # --- STEP 1: Every tournament, its participants and the standings of the completed ones ---
+    tournaments = list(with_tournament_details(Tournament.objects.all()).order_by('date', 'id'))
+    participants = {}
+    for tournament_id, player_id in Tournament.participants.through.objects.values_list('tournament_id', 'user_id'):
+        participants.setdefault(tournament_id, []).append(player_id)
+    standings = {
+        (tournament_id, player_id): (rank, score)
+        for tournament_id, player_id, rank, score in TournamentStanding.objects.filter(
+            tournament__is_completed=True
+        ).values_list('tournament_id', 'player_id', 'rank', 'score')
+    }
+
+    # --- STEP 2: Standings before the final round of the completed tournaments ---
+    # The leaders of every one of them, and the full standings of those that have a winner
+    winners = {tournament_id for (tournament_id, _), (rank, _) in standings.items() if rank == 1}
+    penultimate = {
+        tournament.pk: tournament.penultimate_round_id for tournament in tournaments
+        if tournament.is_completed and tournament.penultimate_round_id
+    }
+    sizes = {}
+    snapshot_ranks = {}
+    leaders = {}
+    for round_id, player_id, rank in StandingSnapshot.objects.filter(
+        Q(round_id__in=[penultimate[tournament_id] for tournament_id in winners if tournament_id in penultimate])
+        | Q(rank=1),
+        round_id__in=list(penultimate.values())
+    ).values_list('round_id', 'player_id', 'rank'):
+        sizes[round_id] = sizes.get(round_id, 0) + 1
+        snapshot_ranks[round_id, player_id] = rank
+        if rank == 1:
+            leaders.setdefault(round_id, []).append(player_id)
+
+    # --- STEP 3: One pass over every finished match, tournament by tournament ---
+    # Up to a player's first tournament that is not completed, their states can be saved as
+    # progress. From there on a copy taken at that point is kept for it.
+    final = {}          # Player id -> last completed tournament up to the watermark
+    completed = {}      # Player id -> completed tournaments up to the watermark
+    last_match = {}     # Player id -> last match up to the watermark
+    frozen = {}         # Player id -> rule states at the watermark
+
+    matches = Match.objects.exclude(result='pending').order_by(
+        'tournament__date', 'tournament_id', 'round__number', 'id'
+    ).values_list('tournament_id', 'round__number', 'id', 'white_player_id', 'black_player_id', 'result')
+    matches = matches.iterator(chunk_size=2000)
+    match = next(matches, None)
     for tournament in tournaments:
-        try:
-            standing = TournamentStanding.objects.get(
-                tournament=tournament,
-                player=user,
-                rank=1
+        games = {}
+        while match is not None and match[0] == tournament.pk:
+            tournament_id, round_number, match_id, white_id, black_id, result = match
+            white_result, black_result = PLAYER_RESULTS[result]
+            sides = [(white_id, 'white', white_result, black_id)]
+            if black_id:
+                sides.append((black_id, 'black', black_result, white_id))
+
+            for player_id, color, player_result, opponent_id in sides:
+                game = Game(tournament_id, tournament.date, round_number, match_id, color, player_result, opponent_id)
+                games.setdefault(player_id, []).append(game)
+                if not tournament.is_completed and player_id not in frozen:
+                    frozen[player_id] = copy.deepcopy(states[player_id])
+                elif player_id not in frozen:
+                    last_match[player_id] = match_id
+                for rule, state in rule_states[player_id]:
+                    rule.game(state, game)
+            match = next(matches, None)
+
+        for player_id in participants.get(tournament.pk, []):
+            entry = TournamentEntry(tournament)
+            if tournament.is_completed and tournament.penultimate_round_id:
+                entry.leader_ids = leaders.get(tournament.penultimate_round_id, [])
+            if (tournament.pk, player_id) in standings:
+                entry.has_standing = True
+                entry.rank, entry.score = standings[tournament.pk, player_id]
+                if entry.is_winner and tournament.penultimate_round_id:
+                    entry.snapshot_size = sizes.get(tournament.penultimate_round_id, 0)
+                    entry.snapshot_rank = snapshot_ranks.get((tournament.penultimate_round_id, player_id))
+            entry.close(games.get(player_id, []))
+
+            if not tournament.is_completed and player_id not in frozen:
+                frozen[player_id] = copy.deepcopy(states[player_id])
+            elif player_id not in frozen:
+                final[player_id] = entry
+                completed[player_id] = completed.get(player_id, 0) + 1
+            for rule, state in rule_states[player_id]:
+                rule.tournament(state, entry)
+
+    awards = {}
+    saved = []
+    for player in players:
+        awards[player.pk] = collect_awards(states[player.pk], PlayerHistory(player, [], [], elos))
+        if player.pk in final:
+            saved.append(AchievementProgress(
+                player=player,
+                tournament_id=final[player.pk].tournament_id,
+                date=final[player.pk].date,
+                match_id=last_match.get(player.pk),
+                tournaments=completed[player.pk],
+                state=frozen.get(player.pk, states[player.pk])
+            ))
+    return players, awards, saved
+
+
+# --- RULES ---
+
+class Rule:
+    """
+    An achievement rule. start() returns its state for one player; game() and tournament()
+    fold events into that state; awards() reports what the state has earned. States are
+    saved as JSON, so they hold only strings, numbers, lists and dicts with string keys.
+    """
+
+    @property
+    def name(self):
+        return type(self).__name__
+
+    def start(self):
+        return {}
+
+    def game(self, state, game):
+        pass
+
+    def tournament(self, state, entry):
+        pass
+
+    def awards(self, state, history):
+        return []
+
+
+class TournamentRule(Rule):
+    """Awarded once, for the first completed tournament that qualifies"""
+    achievement_type = None
+
+    def start(self):
+        return {'tournament': None}
+
+    def qualifies(self, entry):
+        raise NotImplementedError
+
+    def tournament(self, state, entry):
+        if state['tournament'] is None and entry.is_completed and self.qualifies(entry):
+            state['tournament'] = entry.tournament_id
+
+    def awards(self, state, history):
+        if state['tournament'] is None:
+            return []
+        return [Award(self.achievement_type, tournament_id=state['tournament'])]
+
+
+class PerformanceRule(TournamentRule):
+    """A tournament rule on the player's results, for tournaments with a standing and games"""
+
+    def qualifies(self, entry):
+        return entry.has_standing and entry.total > 0 and self.performance(entry)
+
+    def performance(self, entry):
+        raise NotImplementedError
+
+
+@rule
+class TournamentVeteranRule(Rule):
+    """Tournament Veteran, Master and Legend: 10, 25 and 50 completed tournaments"""
+    THRESHOLDS = {'tournament_veteran_10': 10, 'tournament_veteran_25': 25, 'tournament_veteran_50': 50}
+
+    def start(self):
+        return {'played': 0}
+
+    def tournament(self, state, entry):
+        if entry.is_completed:
+            state['played'] += 1
+
+    def awards(self, state, history):
+        return [
+            Award(achievement_type, count=state['played'])
+            for achievement_type, threshold in self.THRESHOLDS.items() if state['played'] >= threshold
+        ]
+
+
+@rule
+class PlacingRule(Rule):
+    """Tournament wins and silver and bronze medals, counted"""
+    THRESHOLDS = {
+        1: {'tournament_win_1': 1, 'tournament_win_3': 3, 'tournament_win_5': 5, 'tournament_win_10': 10},
+        2: {'silver_medal_3': 3, 'silver_medal_5': 5},
+        3: {'bronze_medal_3': 3, 'bronze_medal_5': 5},
+    }
+
+    def start(self):
+        return {'placings': {'1': 0, '2': 0, '3': 0}}
+
+    def tournament(self, state, entry):
+        if entry.is_completed and entry.has_standing and entry.rank in self.THRESHOLDS:
+            state['placings'][str(entry.rank)] += 1
+
+    def awards(self, state, history):
+        awards = []
+        for rank, thresholds in self.THRESHOLDS.items():
+            count = state['placings'][str(rank)]
+            awards.extend(
+                Award(achievement_type, count=count)
+                for achievement_type, threshold in thresholds.items() if count >= threshold
             )
-            # Determine season based on month
-            month = tournament.date.month
-            if 3 <= month <= 5:
-                season_wins.add('spring')
-            elif 6 <= month <= 8:
-                season_wins.add('summer')
-            elif 9 <= month <= 11:
-                season_wins.add('fall')
-            else:  # 12, 1, 2
-                season_wins.add('winter')
-        except TournamentStanding.DoesNotExist:
-            pass
-    
-    # Check if all 4 seasons have been won
-    if len(season_wins) >= 4:
-        achievement, created = Achievement.objects.get_or_create(
-            user=user,
-            achievement_type='seasonal_champion'
+        return awards
+
+
+@rule
+class SpecialistRule(Rule):
+    """Format and time control specialists: win a tournament of that format or time control"""
+    FORMATS = {'swiss': 'swiss_master', 'round_robin': 'round_robin_champion', 'double_round_robin': 'double_round_robin_king'}
+    TIME_CONTROLS = {'bullet': 'bullet_blitzer', 'blitz': 'blitz_boss', 'rapid': 'rapid_ruler', 'classical': 'classical_conqueror'}
+
+    def start(self):
+        return {'earned': []}
+
+    def tournament(self, state, entry):
+        if not (entry.is_completed and entry.is_winner):
+            return
+        for achievement_type in (self.FORMATS.get(entry.tournament_type), self.TIME_CONTROLS.get(entry.time_control)):
+            if achievement_type and achievement_type not in state['earned']:
+                state['earned'].append(achievement_type)
+
+    def awards(self, state, history):
+        return [Award(achievement_type) for achievement_type in state['earned']]
+
+
+@rule
+class ComebackKidRule(TournamentRule):
+    """Win a tournament after losing the first game"""
+    achievement_type = 'comeback_kid'
+
+    def qualifies(self, entry):
+        first_game = next((game for game in entry.games if game.round_number == 1), None)
+        return entry.is_winner and first_game is not None and first_game.result == 'loss'
+
+
+@rule
+class PerfectScoreRule(PerformanceRule):
+    """Win every game of a tournament"""
+    achievement_type = 'perfect_score'
+
+    def performance(self, entry):
+        return entry.wins == entry.total
+
+
+@rule
+class UndefeatedRule(PerformanceRule):
+    """Finish a tournament without a loss"""
+    achievement_type = 'undefeated'
+
+    def performance(self, entry):
+        return entry.losses == 0
+
+
+@rule
+class SupportBearRule(PerformanceRule):
+    """Finish a tournament without a win"""
+    achievement_type = 'support_bear'
+
+    def performance(self, entry):
+        return entry.wins == 0
+
+
+@rule
+class DummiesRule(PerformanceRule):
+    """Finish last"""
+    achievement_type = 'dummies'
+
+    def performance(self, entry):
+        return entry.rank == entry.participant_count
+
+
+@rule
+class GoatRule(PerformanceRule):
+    """Win a tournament with a win in every game"""
+    achievement_type = 'goat'
+
+    def performance(self, entry):
+        return entry.rank == 1 and entry.wins == entry.total
+
+
+@rule
+class TruceSeekerRule(PerformanceRule):
+    """Half or more of a tournament's games neither won nor lost (byes and forfeits included)"""
+    achievement_type = 'truce_seeker'
+
+    def performance(self, entry):
+        draws = entry.total - entry.wins - entry.losses
+        return draws / entry.total >= 0.5
+
+
+@rule
+class GiantSlayerRule(PerformanceRule):
+    """Beat the highest rated participant of a tournament, on the ratings when it was completed"""
+    achievement_type = 'giant_slayer'
+
+    def performance(self, entry):
+        return any(
+            game.opponent_id == entry.highest_rated_id and game.result == 'win' for game in entry.games
         )
-        if created:
-            new_achievements.append(achievement)
-    
-    # The Perfectionist - Complete 5 tournaments without a single loss
-    perfect_tournaments = 0
-    for tournament in tournaments:
-        tournament_matches = Match.objects.filter(
-            tournament=tournament
-        ).filter(
-            Q(white_player=user) | Q(black_player=user)
-        ).exclude(result='pending')
-        
-        # Check if there are any losses
-        has_loss = False
-        for match in tournament_matches:
-            if (match.white_player == user and match.result == 'black_win') or \
-               (match.black_player == user and match.result == 'white_win'):
-                has_loss = True
-                break
-        
-        if not has_loss and tournament_matches.exists():
-            perfect_tournaments += 1
-    
-    if perfect_tournaments >= 5:
-        achievement, created = Achievement.objects.get_or_create(
-            user=user,
-            achievement_type='the_perfectionist'
+
+
+@rule
+class LastStandRule(TournamentRule):
+    """Lose every game of a tournament but win the last one"""
+    achievement_type = 'last_stand'
+
+    def qualifies(self, entry):
+        if len(entry.games) < 2:
+            return False
+        # Byes and forfeits count as losses
+        return entry.games[-1].result == 'win' and all(
+            game.result not in ('win', 'draw') for game in entry.games[:-1]
         )
-        if created:
-            new_achievements.append(achievement)
-    
-    # Count forfeits for a player
-    forfeited_matches = Match.objects.filter(
-        (Q(white_player=user) & Q(result='white_forfeit')) | 
-        (Q(black_player=user) & Q(result='black_forfeit'))
-    ).count()
-
-    if forfeited_matches >= 3:
-        achievement, created = Achievement.objects.get_or_create(
-            user=user, 
-            achievement_type='early_departure',
-            defaults={'count': forfeited_matches}
+
+
+@rule
+class ComebackKingRule(TournamentRule):
+    """Win a tournament from the bottom half of the standings before the final round"""
+    achievement_type = 'comeback_king'
+
+    def qualifies(self, entry):
+        return (
+            entry.is_winner and entry.round_total >= 2 and entry.snapshot_rank is not None
+            and entry.snapshot_rank - 1 >= entry.snapshot_size / 2
+        )
+
+
+@rule
+class KingmakerRule(TournamentRule):
+    """Beat a leader in the final round, so that someone else wins the tournament"""
+    achievement_type = 'kingmaker'
+
+    def qualifies(self, entry):
+        return entry.round_total >= 2 and any(
+            game.round_number == entry.round_total and game.result == 'win'
+            and game.opponent_id in entry.leader_ids and game.opponent_id != entry.winner_id
+            for game in entry.games
         )
-        if created:
-            new_achievements.append(achievement)
+
+
+@rule
+class ScoreMaximizerRule(TournamentRule):
+    """Score 90% of the possible points in a tournament of five rounds or more"""
+    achievement_type = 'score_maximizer'
+
+    def qualifies(self, entry):
+        return entry.has_standing and entry.round_total >= 5 and entry.score >= 0.9 * entry.round_total
+
+
+@rule
+class LateBloomerRule(Rule):
+    """Win a first tournament after playing ten or more"""
+
+    def start(self):
+        return {'played': 0, 'date': None, 'same_date': 0, 'first_win': None, 'tournament': None}
+
+    def tournament(self, state, entry):
+        if not entry.is_completed:
+            return
+        date = entry.date.isoformat()
+        if date != state['date']:
+            state['date'] = date
+            state['same_date'] = 0
+        if entry.is_winner and state['first_win'] is None:
+            state['first_win'] = entry.tournament_id
+            # Only tournaments on an earlier date count
+            if state['played'] - state['same_date'] >= 10:
+                state['tournament'] = entry.tournament_id
+        state['played'] += 1
+        state['same_date'] += 1
+
+    def awards(self, state, history):
+        if state['tournament'] is None:
+            return []
+        return [Award('late_bloomer', tournament_id=state['tournament'])]
+
+
+@rule
+class PerfectionistRule(Rule):
+    """Complete five tournaments without a loss"""
+
+    def start(self):
+        return {'tournaments': 0}
+
+    def tournament(self, state, entry):
+        if entry.is_completed and entry.total and not entry.losses:
+            state['tournaments'] += 1
+
+    def awards(self, state, history):
+        return [Award('the_perfectionist')] if state['tournaments'] >= 5 else []
+
+
+@rule
+class TitleCollectionRule(Rule):
+    """Grand Slam, Format Master and Seasonal Champion: win in every time control, format and season"""
+    TIME_CONTROLS = {'bullet', 'blitz', 'rapid', 'classical'}
+    FORMATS = {'swiss', 'round_robin', 'double_round_robin'}
+    SEASONS = {12: 'winter', 1: 'winter', 2: 'winter', 3: 'spring', 4: 'spring', 5: 'spring',
+               6: 'summer', 7: 'summer', 8: 'summer', 9: 'fall', 10: 'fall', 11: 'fall'}
+
+    def start(self):
+        return {'time_controls': [], 'formats': [], 'seasons': []}
+
+    def tournament(self, state, entry):
+        if not (entry.is_completed and entry.is_winner):
+            return
+        for key, value in (('time_controls', entry.time_control), ('formats', entry.tournament_type),
+                           ('seasons', self.SEASONS[entry.date.month])):
+            if value and value not in state[key]:
+                state[key].append(value)
+
+    def awards(self, state, history):
+        awards = []
+        if len(state['time_controls']) >= 4:
+            awards.append(Award('grand_slam'))
+        if self.FORMATS <= set(state['formats']):
+            awards.append(Award('format_master'))
+        if len(state['seasons']) >= 4:
+            awards.append(Award('seasonal_champion'))
+        return awards
+
+
+@rule
+class BarLegendRule(Rule):
+    """Play in ten weekly tournaments in a row (five to nine days apart)"""
+
+    def start(self):
+        return {'date': None, 'weeks': 0, 'best': 0}
+
+    def tournament(self, state, entry):
+        # Every tournament the player signed up for counts, finished or not
+        if state['date'] is not None and 5 <= (entry.date - datetime.date.fromisoformat(state['date'])).days <= 9:
+            state['weeks'] += 1
         else:
-            achievement.count = forfeited_matches
-            achievement.save()
-    
-    # --- UNCONVENTIONAL ACHIEVEMENTS ---
-    
-    # Comeback King/Queen - Win a tournament after being in bottom half before final round
-    for tournament in tournaments:
-        # Check if user won this tournament
-        try:
-            standing = TournamentStanding.objects.get(
-                tournament=tournament,
-                player=user,
-                rank=1
-            )
-            
-            # If tournament had at least 2 rounds, check standing before final round
-            rounds = tournament.rounds.order_by('number')
-            if rounds.count() >= 2:
-                penultimate_round = rounds.order_by('-number')[1]  # Second to last round
-                
-                # Calculate standings after penultimate round
-                # This is simplified - ideally we would get historical standings
-                matches_before_final = Match.objects.filter(
-                    tournament=tournament,
-                    round__number__lte=penultimate_round.number
-                ).exclude(result='pending')
-                
-                # Count points for each player
-                player_points = {}
-                for match in matches_before_final:
-                    if match.result == 'white_win':
-                        if match.white_player.id not in player_points:
-                            player_points[match.white_player.id] = 0
-                        player_points[match.white_player.id] += 1
-                    elif match.result == 'black_win':
-                        if match.black_player.id not in player_points:
-                            player_points[match.black_player.id] = 0
-                        player_points[match.black_player.id] += 1
-                    elif match.result == 'draw':
-                        if match.white_player.id not in player_points:
-                            player_points[match.white_player.id] = 0
-                        if match.black_player.id not in player_points:
-                            player_points[match.black_player.id] = 0
-                        player_points[match.white_player.id] += 0.5
-                        player_points[match.black_player.id] += 0.5
-                
-                # Sort players by points
-                sorted_players = sorted(player_points.items(), key=lambda x: x[1], reverse=True)
-                
-                # Check if user was in bottom half
-                player_position = next((i for i, (pid, _) in enumerate(sorted_players) if pid == user.id), -1)
-                if player_position >= len(sorted_players) / 2:
-                    achievement, created = Achievement.objects.get_or_create(
-                        user=user,
-                        achievement_type='comeback_king',
-                        tournament=tournament
-                    )
-                    if created:
-                        new_achievements.append(achievement)
-        except TournamentStanding.DoesNotExist:
-            continue
-    
-    # Late Bloomer - Win your first tournament after playing in 10+ tournaments
-    first_win = None
-    for tournament in tournaments.order_by('date'):
-        try:
-            standing = TournamentStanding.objects.get(
-                tournament=tournament,
-                player=user,
-                rank=1
-            )
-            first_win = tournament
-            break
-        except TournamentStanding.DoesNotExist:
-            continue
-    
-    if first_win:
-        # Count tournaments before this win
-        tournaments_before_win = tournaments.filter(date__lt=first_win.date).count()
-        if tournaments_before_win >= 10:
-            achievement, created = Achievement.objects.get_or_create(
-                user=user,
-                achievement_type='late_bloomer',
-                tournament=first_win
-            )
-            if created:
-                new_achievements.append(achievement)
-    
-    # Score Maximizer - Score 90%+ of possible points in a tournament with 5+ rounds
-    for tournament in tournaments:
-        rounds = tournament.rounds.count()
-        if rounds >= 5:
-            try:
-                standing = TournamentStanding.objects.get(
-                    tournament=tournament,
-                    player=user
-                )
-                
-                # Calculate maximum possible points
-                # In a tournament with n rounds, max points is n
-                max_points = rounds
-                
-                # Check if scored 90%+ of possible points
-                if standing.score >= 0.9 * max_points:
-                    achievement, created = Achievement.objects.get_or_create(
-                        user=user,
-                        achievement_type='score_maximizer',
-                        tournament=tournament
-                    )
-                    if created:
-                        new_achievements.append(achievement)
-            except TournamentStanding.DoesNotExist:
-                continue
-    
-    return new_achievements
\ No newline at end of file
+            state['weeks'] = 1
+        state['best'] = max(state['best'], state['weeks'])
+        state['date'] = entry.date.isoformat()
+
+    def awards(self, state, history):
+        return [Award('bar_legend')] if state['best'] >= 10 else []
+
+
+@rule
+class StreakRule(Rule):
+    """Hat Trick, Winning Streak and Unstoppable, and five wins in a row with either colour"""
+    STREAKS = {'hat_trick': 3, 'winning_streak_5': 5, 'winning_streak_10': 10}
+    COLOR_STREAKS = {'white': 'white_dominator', 'black': 'black_defender'}
+
+    def start(self):
+        return {'streak': 0, 'best': 0, 'white': 0, 'black': 0, 'best_white': 0, 'best_black': 0}
+
+    def game(self, state, game):
+        if game.result == 'win':
+            state['streak'] += 1
+            state['best'] = max(state['best'], state['streak'])
+            # A win with one colour breaks the streak with the other
+            other = 'black' if game.color == 'white' else 'white'
+            state[game.color] += 1
+            state[f"best_{game.color}"] = max(state[f"best_{game.color}"], state[game.color])
+            state[other] = 0
+        else:
+            state['streak'] = 0
+            state[game.color] = 0
+
+    def awards(self, state, history):
+        awards = [Award(achievement_type) for achievement_type, length in self.STREAKS.items() if state['best'] >= length]
+        awards.extend(
+            Award(achievement_type)
+            for color, achievement_type in self.COLOR_STREAKS.items() if state[f"best_{color}"] >= 5
+        )
+        return awards
+
+
+@rule
+class OpponentRule(Rule):
+    """Social Butterfly (15 different opponents) and Rival Nemesis (beat the same opponent three times in a row)"""
+
+    def start(self):
+        return {'games': {}, 'streaks': {}, 'nemesis': False}
+
+    def game(self, state, game):
+        if game.opponent_id is None:
+            return
+        opponent = str(game.opponent_id)
+        state['games'][opponent] = state['games'].get(opponent, 0) + 1
+        state['streaks'][opponent] = state['streaks'].get(opponent, 0) + 1 if game.result == 'win' else 0
+        if state['streaks'][opponent] >= 3:
+            state['nemesis'] = True
+
+    def awards(self, state, history):
+        awards = []
+        if len(state['games']) >= 15:
+            awards.append(Award('social_butterfly'))
+        if state['nemesis']:
+            awards.append(Award('rival_nemesis'))
+        return awards
+
+
+@rule
+class UnderdogRule(Rule):
+    """Beat opponents rated 200 or more above you, counted on the current ratings"""
+
+    def start(self):
+        return {'beaten': {}}
+
+    def game(self, state, game):
+        if game.result == 'win' and game.opponent_id is not None:
+            opponent = str(game.opponent_id)
+            state['beaten'][opponent] = state['beaten'].get(opponent, 0) + 1
+
+    def awards(self, state, history):
+        elo = history.elos[history.player.pk]
+        wins = sum(
+            count for opponent, count in state['beaten'].items()
+            if history.elos.get(int(opponent), float('-inf')) >= elo + 200
+        )
+        return [Award('underdog', count=wins)] if wins else []
+
+
+@rule
+class MilestoneRule(Rule):
+    """Century Club (100 games) and Blitz Marathon (10 games on one day)"""
+
+    def start(self):
+        return {'games': 0, 'date': None, 'day_games': 0, 'marathon': False}
+
+    def game(self, state, game):
+        state['games'] += 1
+        date = game.date.isoformat()
+        if date != state['date']:
+            state['date'] = date
+            state['day_games'] = 0
+        state['day_games'] += 1
+        if state['day_games'] >= 10:
+            state['marathon'] = True
+
+    def awards(self, state, history):
+        awards = []
+        if state['games'] >= 100:
+            awards.append(Award('century_club'))
+        if state['marathon']:
+            awards.append(Award('blitz_marathon'))
+        return awards
+
+
+@rule
+class ResultPatternRule(Rule):
+    """Phoenix Rising (three losses, then three wins; draws skipped) and Draw Magnet (three draws in a row)"""
+    PHOENIX = ['loss', 'loss', 'loss', 'win', 'win', 'win']
+
+    def start(self):
+        return {'recent': [], 'phoenix': False, 'draws': 0, 'magnet': False}
+
+    def game(self, state, game):
+        if game.result == 'draw':
+            state['draws'] += 1
+            if state['draws'] >= 3:
+                state['magnet'] = True
+            return
+        state['draws'] = 0
+        # Byes and forfeits, won or lost, count as losses
+        state['recent'] = (state['recent'] + ['win' if game.result == 'win' else 'loss'])[-6:]
+        if state['recent'] == self.PHOENIX:
+            state['phoenix'] = True
+
+    def awards(self, state, history):
+        awards = []
+        if state['phoenix']:
+            awards.append(Award('phoenix_rising'))
+        if state['magnet']:
+            awards.append(Award('draw_magnet'))
+        return awards
+
+
+@rule
+class EarlyDepartureRule(Rule):
+    """Missing Poster: forfeit three games or more, counted"""
+
+    def start(self):
+        return {'forfeits': 0}
+
+    def game(self, state, game):
+        if game.result == 'forfeit_loss':
+            state['forfeits'] += 1
+
+    def awards(self, state, history):
+        return [Award('early_departure', count=state['forfeits'])] if state['forfeits'] >= 3 else []
+
+
+@rule
+class RatingMilestoneRule(Rule):
+    """Rising Star to Master Player, on the current blitz rating"""
+    THRESHOLDS = {'rating_1600': 1600, 'rating_1800': 1800, 'rating_2000': 2000, 'rating_2200': 2200}
+
+    def awards(self, state, history):
+        rating = history.player.blitz_elo
+        return [Award(achievement_type) for achievement_type, threshold in self.THRESHOLDS.items() if rating >= threshold]
@@ -1,16 +1,34 @@
 # admin.py
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, Tournament, Round, Match, TournamentStanding
+from .models import User, Tournament, Round, Match, TournamentStanding, PlayerRating
+from .rating_service import set_overall_rating
+
+# Ratings of a player on every track, read-only since the rating engine maintains them
+class PlayerRatingInline(admin.TabularInline):
+    model = PlayerRating
+    extra = 0
+    can_delete = False
+    readonly_fields = ('time_control', 'rating', 'rd', 'volatility', 'games', 'last_played')
+    
+    def has_add_permission(self, request, obj=None):
+        return False
 
 # Register the custom User model with the UserAdmin
 class CustomUserAdmin(UserAdmin):
     fieldsets = UserAdmin.fieldsets + (
-        ('Chess Profile', {'fields': ('lichess_account', 'chesscom_account', 'fide_rating', 'elo', 'rd', 'volatility')}),
+        ('Chess Profile', {'fields': ('lichess_account', 'chesscom_account', 'fide_rating', 'elo')}),
     )
+    inlines = [PlayerRatingInline]
     list_display = ('username', 'email', 'first_name', 'last_name', 'elo', 'is_staff')
     list_filter = UserAdmin.list_filter + ('elo',)
     search_fields = UserAdmin.search_fields + ('lichess_account', 'chesscom_account')
+    
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # A rating edited by hand also becomes the player's overall rating record
+        if change and 'elo' in form.changed_data:
+            set_overall_rating(obj.pk, obj.elo)
 
 # Register Tournament with custom admin
 class TournamentAdmin(admin.ModelAdmin):
@@ -32,7 +50,7 @@ class MatchAdmin(admin.ModelAdmin):
 
 # Register TournamentStanding with custom admin
 class TournamentStandingAdmin(admin.ModelAdmin):
-    list_display = ('player', 'tournament', 'score', 'rank')
+    list_display = ('player', 'tournament', 'score', 'rank', 'buchholz', 'sonneborn_berger')
     list_filter = ('tournament',)
     search_fields = ('player__username',)
 
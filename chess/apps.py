@@ -1,6 +1,21 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.signals import request_started
 
 
 class ChessConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'chess'
+
+    def ready(self):
+        # The database is not queried here; the leaderboards are built on the first request
+        if getattr(settings, 'LEADERBOARD_WARMUP', False):
+            request_started.connect(warm_leaderboards_once, dispatch_uid='chess_warm_leaderboards')
+
+
+def warm_leaderboards_once(sender, **kwargs):
+    """Build the cached leaderboards on the first request of the process"""
+    from .leaderboard_service import warm_leaderboards
+
+    request_started.disconnect(dispatch_uid='chess_warm_leaderboards')
+    warm_leaderboards()
@@ -0,0 +1,118 @@
+"""
+Versioned cache keys.
+
+Cached data is keyed on versions instead of being deleted. Every change that affects a
+tournament page bumps the version of that tournament, every change that affects a profile
+bumps the version of that player, and rating changes bump the ratings version. Readers build
+their keys from the current versions, so stale entries are never read again and expire on
+their own.
+
+A version is a token taken from the clock, not a counter. Setting a new one is a single write,
+so concurrent bumps cannot be lost, and a version that was evicted from the cache is replaced by
+a token that no earlier version can have had, so old entries are never served again.
+
+Page fragments are cached with the {% cache %} template tag, keyed on these versions. The
+views pass the expensive parts of their context through deferred(), so a fragment that is
+served from the cache never runs the queries behind it.
+"""
+import functools
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+FRAGMENT_TIMEOUT = 24 * 60 * 60
+
+RATINGS_VERSION_KEY = 'version:ratings'
+
+# User fields shown in the cached profile fragments; saving only other fields, such as
+# last_login, leaves the profile alone
+PROFILE_FIELDS = {
+    'username', 'first_name', 'last_name', 'is_active', 'elo', 'lichess_account', 'chesscom_account',
+    'fide_id', 'fide_rating',
+}
+
+
+def tournament_version_key(tournament_id):
+    return f"version:tournament:{tournament_id}"
+
+
+def player_version_key(player_id):
+    return f"version:player:{player_id}"
+
+
+def new_version():
+    """A version token newer than every token handed out before"""
+    return time.time_ns()
+
+
+def get_version(key):
+    """Current version stored under key, starting a new one if there is none"""
+    version = cache.get(key)
+    if version is None:
+        version = new_version()
+        if not cache.add(key, version, timeout=None):
+            # Another process started one first
+            version = cache.get(key, version)
+    return version
+
+
+def bump_versions(keys):
+    """
+    Move the given versions on once the current transaction commits, so no request can
+    cache data from before the change under the new version
+    """
+    keys = set(keys)
+    if keys:
+        transaction.on_commit(lambda: _bump_versions(keys))
+
+
+def _bump_versions(keys):
+    version = new_version()
+    cache.set_many({key: version for key in keys}, timeout=None)
+
+
+def ratings_version():
+    return get_version(RATINGS_VERSION_KEY)
+
+
+def bump_ratings_version():
+    bump_versions([RATINGS_VERSION_KEY])
+
+
+def tournament_version(tournament_id):
+    return get_version(tournament_version_key(tournament_id))
+
+
+def bump_tournament_version(*tournament_ids):
+    bump_versions(tournament_version_key(tournament_id) for tournament_id in tournament_ids)
+
+
+def player_version(player_id):
+    return get_version(player_version_key(player_id))
+
+
+def bump_player_versions(player_ids):
+    bump_versions(player_version_key(player_id) for player_id in player_ids if player_id)
+
+
+def deferred(func):
+    """
+    Wrap a context value so it is only computed when the template uses it. Templates call
+    callables, and the result is kept for the rest of the request.
+    """
+    return functools.lru_cache(maxsize=None)(func)
+
+
+def deferred_group(func, names):
+    """
+    Deferred context values for names that func computes together, returning them as a
+    dict. func runs once, when the first of them is used.
+    """
+    group = deferred(func)
+    return {name: deferred(functools.partial(_group_value, group, name)) for name in names}
+
+
+def _group_value(group, name):
+    return group()[name]
@@ -3,6 +3,7 @@ from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.core.validators import MinValueValidator
 from .models import Tournament, Match, User
+from .tiebreak_service import TIEBREAK_LABELS
 from django.utils.crypto import get_random_string
 
 # Update to forms.py - Adding max_participants field to TournamentForm
@@ -20,6 +21,7 @@ class TournamentForm(forms.ModelForm):
             'time_control', 
             'num_rounds', 
             'max_participants',
+            'tiebreak_order',
             'description'
         ]
         widgets = {
@@ -36,8 +38,24 @@ class TournamentForm(forms.ModelForm):
                 'min': '2',
                 'placeholder': 'Maximum number of participants'
             }),
+            'tiebreak_order': forms.TextInput(attrs={
+                'class': 'form-control',
+                'placeholder': 'e.g. buchholz, median_buchholz, direct_encounter'
+            }),
         }
     
+    def clean_tiebreak_order(self):
+        """Check the tiebreaks exist and store them without spaces"""
+        tiebreaks = [key.strip() for key in self.cleaned_data.get('tiebreak_order', '').split(',') if key.strip()]
+        unknown = [key for key in tiebreaks if key not in TIEBREAK_LABELS]
+        if unknown:
+            raise forms.ValidationError(
+                f"Unknown tiebreak: {', '.join(unknown)}. Choose from {', '.join(TIEBREAK_LABELS)}"
+            )
+        if len(set(tiebreaks)) != len(tiebreaks):
+            raise forms.ValidationError("Each tiebreak can only be used once")
+        return ','.join(tiebreaks)
+    
     def clean(self):
         cleaned_data = super().clean()
         tournament_type = cleaned_data.get('tournament_type')
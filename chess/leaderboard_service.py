@@ -0,0 +1,80 @@
+"""
+Rating leaderboards.
+
+The top players of every rating track are cached as plain data, under a key that contains
+a ratings version. Everything that changes ratings bumps that version, so the next request
+builds fresh lists and the old entries simply expire. Between changes the home page reads
+the leaderboards from the cache without touching the User table.
+"""
+import datetime
+
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from .cache_service import ratings_version
+from .rating_service import RATING_TRACKS
+
+
+LEADERBOARD_SIZE = 20
+LEADERBOARD_TIMEOUT = 6 * 60 * 60   # Trends are relative to today, so entries expire anyway
+TREND_DAYS = 30
+
+# User fields shown on a leaderboard; saving any of them bumps the ratings version
+LEADERBOARD_FIELDS = {'username', 'first_name', 'last_name', 'is_active', 'is_staff', 'is_superuser'}
+
+
+def leaderboard(track, size=LEADERBOARD_SIZE):
+    """
+    The top players of a rating track ('overall', 'bullet', 'blitz', 'rapid' or 'classical'),
+    as dicts with id, name, rating, rank and trend (rating change over the last 30 days)
+    """
+    key = f"leaderboard:{track}:{size}:v{ratings_version()}"
+    return cache.get_or_set(key, lambda: build_leaderboard(track, size), LEADERBOARD_TIMEOUT)
+
+
+def build_leaderboard(track, size=LEADERBOARD_SIZE):
+    """Build a leaderboard from the database, in two queries on indexed tables"""
+    from .models import PlayerRating, RatingChange
+
+    # Players that were rated on the track, best first
+    players = list(PlayerRating.objects.filter(
+        time_control=track,
+        player__is_active=True,
+        player__is_staff=False,
+        player__is_superuser=False
+    ).order_by('-rating', 'player_id').values(
+        'player_id', 'rating', username=F('player__username'),
+        first_name=F('player__first_name'), last_name=F('player__last_name')
+    )[:size])
+
+    # Rating before the first game of the trend window, per player
+    since = timezone.now().date() - datetime.timedelta(days=TREND_DAYS)
+    start_ratings = {}
+    for player_id, rating_before in RatingChange.objects.filter(
+        player_id__in=[player['player_id'] for player in players],
+        time_control=track,
+        match__tournament__date__gte=since
+    ).order_by(
+        # The order rating periods are applied in: tournament date and id, then round
+        'match__tournament__date', 'match__tournament_id', 'match__round__number', 'id'
+    ).values_list('player_id', 'rating_before'):
+        start_ratings.setdefault(player_id, rating_before)
+
+    entries = []
+    for position, player in enumerate(players, start=1):
+        rating = player['rating']
+        full_name = f"{player['first_name']} {player['last_name']}".strip()
+        entries.append({
+            'id': player['player_id'],
+            'name': full_name or player['username'],
+            'rating': rating,
+            'rank': position,
+            'trend': round(rating - start_ratings.get(player['player_id'], rating)),
+        })
+    return entries
+
+
+def warm_leaderboards():
+    """Build and cache the leaderboards of every rating track"""
+    return {track: leaderboard(track) for track in RATING_TRACKS}
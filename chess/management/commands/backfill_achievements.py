@@ -1,31 +1,201 @@
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import django
 from django.core.management.base import BaseCommand
-from chess.models import User
-from chess.achievement_service import check_achievements
+
+from chess.achievement_service import (
+    check_players_achievements, evaluate_club, evaluate_players, plan_awards, save_awards, save_progress
+)
+
+# Workers are spawned, not forked, so each opens database connections of its own. They
+# import this module before Django is set up, so the models are imported where they are used.
+
+
+def init_worker():
+    """Set up Django in a new worker process"""
+    django.setup()
+
+
+def process_shard(player_ids, dry_run):
+    """
+    Check the achievements of one shard of players; returns the changes (see describe_changes)
+    """
+    from chess.models import User
+
+    players = list(User.objects.filter(pk__in=player_ids).prefetch_related('ratings').order_by('id'))
+
+    if dry_run:
+        awards, _ = evaluate_players(players)
+        return describe_changes(players, *plan_awards(players, awards))
+    return describe_changes(players, check_players_achievements(players))
+
+
+def describe_changes(players, created, changed=()):
+    """
+    Per player with changes: the username, the achievement types earned and (type, old count,
+    new count) for changed counts
+    """
+    counts = {}
+    for achievement, count in changed:
+        counts.setdefault(achievement.user_id, []).append((achievement.achievement_type, achievement.count, count))
+    return [
+        (
+            player.username,
+            [achievement.achievement_type for achievement in created[player.pk]],
+            counts.get(player.pk, [])
+        )
+        for player in players if created[player.pk] or player.pk in counts
+    ]
+
 
 class Command(BaseCommand):
-    help = 'Backfills the newly added achievements for all users'
+    help = (
+        'Checks the achievements of every user, e.g. after a new achievement rule was added. '
+        'Users are processed in shards, in parallel; completed shards are checkpointed so an '
+        'interrupted run resumes where it stopped. --single-scan replays the whole club in one pass instead.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Number of worker processes (1 runs in this process)'
+        )
+        parser.add_argument(
+            '--shard-size', type=int, default=200,
+            help='Number of users checked together by a worker'
+        )
+        parser.add_argument(
+            '--checkpoint', default='backfill_achievements.checkpoint.json',
+            help='File that records the completed shards; removed when the backfill completes'
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Ignore an existing checkpoint and start from the first user'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report the achievements that would be added or changed, without saving anything'
+        )
+        parser.add_argument(
+            '--single-scan', action='store_true',
+            help='Evaluate all users together in one chronological scan over every match and standing, '
+                 'in this process and without a checkpoint; suited to nightly consistency runs'
+        )
 
     def handle(self, *args, **options):
-        users = User.objects.all()
-        total_users = users.count()
-        
-        self.stdout.write(f"Starting new achievement backfill for {total_users} users")
-        
-        total_achievements = 0
-        
-        for i, user in enumerate(users):
-            self.stdout.write(f"Processing user {i+1}/{total_users}: {user.username}")
-            new_achievements = check_achievements(user)
-            
-            if new_achievements:
-                achievement_names = [a.get_achievement_type_display() for a in new_achievements]
-                total_achievements += len(new_achievements)
-                self.stdout.write(self.style.SUCCESS(
-                    f"  Added {len(new_achievements)} achievements: {', '.join(achievement_names)}"
-                ))
+        started = time.perf_counter()
+        dry_run = options['dry_run']
+        checkpoint = None if dry_run or options['single_scan'] else options['checkpoint']
+
+        done = [] if options['restart'] or not checkpoint else self.load_checkpoint(checkpoint)
+        if done:
+            self.stdout.write(f"Resuming after {len(done)} completed shards")
+
+        totals = {'shards': 0, 'players': 0, 'achievements': 0, 'counts': 0}
+
+        if options['single_scan']:
+            self.single_scan(dry_run, options['shard_size'], totals)
+        elif options['workers'] <= 1:
+            for shard in self.shards(done, options['shard_size']):
+                self.shard_done(shard, process_shard(shard, dry_run), done, checkpoint, totals)
+        else:
+            with ProcessPoolExecutor(
+                max_workers=options['workers'], mp_context=multiprocessing.get_context('spawn'), initializer=init_worker
+            ) as pool:
+                running = {}
+                for shard in self.shards(done, options['shard_size']):
+                    if len(running) >= 2 * options['workers']:
+                        self.collect(running, done, checkpoint, totals)
+                    running[pool.submit(process_shard, shard, dry_run)] = shard
+                while running:
+                    self.collect(running, done, checkpoint, totals)
+
+        if checkpoint and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+        summary = (
+            f"{totals['players']} users with changes in {totals['shards']} shards: "
+            f"{totals['achievements']} new achievements"
+        )
+        if dry_run:
+            summary += f", {totals['counts']} changed counts"
+        summary += f" ({time.perf_counter() - started:.2f}s)"
+        if dry_run:
+            self.stdout.write(summary)
+            self.stdout.write(self.style.WARNING("Dry run, nothing was saved"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Achievement backfill completed! {summary}"))
+
+    def single_scan(self, dry_run, size, totals):
+        """Evaluate every user in one scan (evaluate_club), then write the results in shards"""
+        players, awards, saved = evaluate_club()
+        saved = {progress.player_id: progress for progress in saved}
+
+        for start in range(0, len(players), size):
+            shard = players[start:start + size]
+            if dry_run:
+                changes = describe_changes(shard, *plan_awards(shard, awards))
             else:
-                self.stdout.write("  No new achievements found")
-        
-        self.stdout.write(self.style.SUCCESS(
-            f'Achievement backfill completed! Added {total_achievements} new achievements.'
-        ))
\ No newline at end of file
+                save_progress([saved[player.pk] for player in shard if player.pk in saved])
+                changes = describe_changes(shard, save_awards(shard, awards))
+            self.shard_done([player.pk for player in shard], changes, [], None, totals)
+
+    def shards(self, done, size):
+        """
+        Stream the user ids in id order, in shards of size ids, leaving out completed shards.
+        Every shard is a query of its own, so no cursor stays open while the workers write.
+        """
+        from chess.models import User
+
+        last_id = 0
+        while True:
+            page = list(User.objects.filter(pk__gt=last_id).order_by('id').values_list('id', flat=True)[:size])
+            if not page:
+                return
+            last_id = page[-1]
+            shard = [player_id for player_id in page if not any(first <= player_id <= last for first, last in done)]
+            if shard:
+                yield shard
+
+    def collect(self, running, done, checkpoint, totals):
+        """Wait for at least one running shard and record the ones that finished"""
+        finished, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in finished:
+            self.shard_done(running.pop(future), future.result(), done, checkpoint, totals)
+
+    def shard_done(self, shard, changes, done, checkpoint, totals):
+        """Report a finished shard and add it to the checkpoint"""
+        from chess.models import Achievement
+
+        names = dict(Achievement.ACHIEVEMENT_TYPES)
+        for username, created, counts in changes:
+            parts = [f"+{names.get(achievement_type, achievement_type)}" for achievement_type in created]
+            parts += [f"{names.get(achievement_type, achievement_type)} {before} -> {after}" for achievement_type, before, after in counts]
+            self.stdout.write(f"  {username}: {', '.join(parts)}")
+            totals['achievements'] += len(created)
+            totals['counts'] += len(counts)
+
+        totals['shards'] += 1
+        totals['players'] += len(changes)
+        self.stdout.write(f"Shard {shard[0]}-{shard[-1]}: {len(shard)} users, {len(changes)} with changes")
+
+        if checkpoint:
+            done.append([shard[0], shard[-1]])
+            self.save_checkpoint(checkpoint, done)
+
+    def load_checkpoint(self, path):
+        """Completed shards, as [first id, last id], from a checkpoint file"""
+        if not os.path.exists(path):
+            return []
+        with open(path) as f:
+            return json.load(f)['done']
+
+    def save_checkpoint(self, path, done):
+        """Write the completed shards, replacing the checkpoint file in one step"""
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump({'done': done}, f)
+        os.replace(f"{path}.tmp", path)
@@ -0,0 +1,112 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from chess.rating_service import (
+    DEFAULT_RATING, GLICKO2_SCALE, compute_rating_period, update_volatilities, update_volatility_scalar
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks the Glicko-2 volatility step on synthetic rating periods: '
+        'per-player scalar iteration against the batched array solver'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, default=10000, help='Players per rating period')
+        parser.add_argument('--games', type=int, default=1, help='Games per player in each period')
+        parser.add_argument('--periods', type=int, default=5, help='Number of periods to time')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for the synthetic periods')
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        num_players = options['players']
+
+        scalar_times = []
+        batched_times = []
+        period_times = []
+        max_difference = 0.0
+
+        for _ in range(options['periods']):
+            ratings, rds, volatilities, white_idx, black_idx, white_scores = self.synthetic_period(
+                rng, num_players, options['games']
+            )
+            phi, v, delta = self.period_inputs(ratings, rds, white_idx, black_idx, white_scores)
+            sigma = volatilities
+
+            started = time.perf_counter()
+            scalar = np.array([
+                update_volatility_scalar(phi[i], v[i], delta[i], sigma[i]) for i in range(len(phi))
+            ])
+            scalar_times.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            batched = update_volatilities(phi, v, delta, sigma)
+            batched_times.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            compute_rating_period(ratings, rds, volatilities, white_idx, black_idx, white_scores)
+            period_times.append(time.perf_counter() - started)
+
+            max_difference = max(max_difference, float(np.abs(scalar - batched).max()))
+
+        scalar_ms = np.median(scalar_times) * 1000
+        batched_ms = np.median(batched_times) * 1000
+        period_ms = np.median(period_times) * 1000
+
+        self.stdout.write(
+            f"{num_players} players, {options['games']} game(s) each, median of {options['periods']} periods:"
+        )
+        self.stdout.write(f"  Scalar volatility iteration:  {scalar_ms:10.2f} ms")
+        self.stdout.write(f"  Batched volatility solver:    {batched_ms:10.2f} ms")
+        self.stdout.write(f"  Full batched rating period:   {period_ms:10.2f} ms")
+        self.stdout.write(f"  Speed-up of the volatility step: {scalar_ms / batched_ms:.1f}x")
+        self.stdout.write(f"  Largest difference between solvers: {max_difference:.2e}")
+
+        if max_difference > 1e-9:
+            self.stdout.write(self.style.ERROR("Batched and scalar volatilities disagree"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Batched and scalar volatilities agree"))
+
+    def synthetic_period(self, rng, num_players, games):
+        """Random players with Elo-based results, every player playing the given number of games"""
+        ratings = rng.normal(DEFAULT_RATING, 250, num_players)
+        rds = rng.uniform(40, 350, num_players)
+        volatilities = rng.uniform(0.04, 0.09, num_players)
+
+        white_idx = []
+        black_idx = []
+        for _ in range(games):
+            order = rng.permutation(num_players)
+            white_idx.append(order[0::2][:num_players // 2])
+            black_idx.append(order[1::2][:num_players // 2])
+        white_idx = np.concatenate(white_idx)
+        black_idx = np.concatenate(black_idx)
+
+        expected = 1 / (1 + 10 ** ((ratings[black_idx] - ratings[white_idx]) / 400))
+        draws = rng.random(len(white_idx)) < 0.15
+        white_scores = np.where(draws, 0.5, (rng.random(len(white_idx)) < expected).astype(float))
+
+        return ratings, rds, volatilities, white_idx, black_idx, white_scores
+
+    def period_inputs(self, ratings, rds, white_idx, black_idx, white_scores):
+        """phi, v and delta of every player, as used by the volatility step"""
+        mu = (ratings - DEFAULT_RATING) / GLICKO2_SCALE
+        phi = rds / GLICKO2_SCALE
+        n = len(ratings)
+
+        players = np.concatenate([white_idx, black_idx])
+        opponents = np.concatenate([black_idx, white_idx])
+        scores = np.concatenate([white_scores, 1 - white_scores])
+
+        g = 1 / np.sqrt(1 + 3 * phi[opponents] ** 2 / np.pi ** 2)
+        expected = 1 / (1 + np.exp(-g * (mu[players] - mu[opponents])))
+        v_inv = np.bincount(players, weights=g ** 2 * expected * (1 - expected), minlength=n)
+        delta_sum = np.bincount(players, weights=g * (scores - expected), minlength=n)
+
+        # Players without a game (odd field) are left out
+        played = v_inv > 0
+        v = 1 / v_inv[played]
+        return phi[played], v, v * delta_sum[played]
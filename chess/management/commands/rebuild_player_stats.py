@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from chess.models import PlayerStats
+from chess.player_stats_service import GAME_COUNTS, PLACING_COUNTERS, compute_player_stats, rebuild_player_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Recomputes the statistics counters of every player (games, results by colour, '
+        'tournaments played, won and medals) from the game records and final standings'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report the counters that differ from the stored ones, without saving anything'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        if options['dry_run']:
+            self.report(compute_player_stats())
+            self.stdout.write(self.style.WARNING("Dry run, nothing was saved"))
+            return
+
+        rows = rebuild_player_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"Player statistics rebuilt in {time.perf_counter() - started:.2f}s: {len(rows)} rows"
+        ))
+
+    def report(self, rows):
+        """Print the stored counters that differ from the recomputed ones"""
+        fields = list(GAME_COUNTS) + ['tournaments_played'] + list(PLACING_COUNTERS.values())
+        stored = {
+            (stats.player_id, stats.time_control): stats
+            for stats in PlayerStats.objects.select_related('player')
+        }
+
+        differences = 0
+        for key in set(rows) | set(stored):
+            expected = rows.get(key)
+            current = stored.get(key)
+            for field in fields:
+                before = getattr(current, field) if current else 0
+                after = getattr(expected, field) if expected else 0
+                if before != after:
+                    differences += 1
+                    self.stdout.write(f"  player {key[0]} ({key[1]}): {field} {before} -> {after}")
+
+        self.stdout.write(f"{differences} counters differ from the stored ones")
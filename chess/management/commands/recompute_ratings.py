@@ -0,0 +1,308 @@
+import datetime
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
+
+from chess.models import Match, PlayerRating, PlayerRatingHistory, RatingChange, RatingCheckpoint, Round, Tournament, User
+from chess.cache_service import bump_ratings_version
+from chess.player_stats_service import refresh_player_game_ratings
+from chess.rating_service import (
+    DEFAULT_RATING, DEFAULT_RD, DEFAULT_VOLATILITY, RATING_FIELDS, RATING_TRACKS, WHITE_SCORES,
+    dump_rating_state, load_rating_state, new_rating_state, rating_activity, replay_period
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuilds every player\'s Glicko-2 ratings (bullet, blitz, rapid, classical and overall) '
+        'by replaying all rated games in (tournament date, round number) order. '
+        'Also rebuilds the rating ledger and the rating history.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            help='Only replay tournaments on or after this date (YYYY-MM-DD), '
+                 'starting from the latest checkpoint before it'
+        )
+        parser.add_argument(
+            '--checkpoint-every', type=int, default=10,
+            help='Store a rating checkpoint after every N tournament days (0 to disable)'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Compute the new ratings and report the differences without saving anything'
+        )
+        parser.add_argument(
+            '--report', type=int, default=20,
+            help='Number of largest rating differences to list'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        since = self.parse_since(options['since'])
+        dry_run = options['dry_run']
+
+        player_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+        position = {player_id: i for i, player_id in enumerate(player_ids)}
+        seeds, unplayed = self.load_seeds(position)
+
+        # --- STEP 1: Starting state ---
+        checkpoint = None
+        if since:
+            checkpoint = RatingCheckpoint.objects.filter(as_of__lt=since).order_by('-as_of').first()
+            if checkpoint:
+                since = checkpoint.as_of + datetime.timedelta(days=1)
+                self.stdout.write(f"Starting from checkpoint {checkpoint.as_of}, replaying from {since}")
+            else:
+                self.stdout.write(self.style.WARNING(
+                    f"No checkpoint before {since}, replaying the full history"
+                ))
+                since = None
+
+        if checkpoint:
+            state = load_rating_state(checkpoint.state, player_ids, seeds)
+        else:
+            state = new_rating_state(len(player_ids), seeds)
+
+        # --- STEP 2: Load everything to replay in a few queries ---
+        tournament_filter = Q(date__gte=since) if since else Q()
+        tournaments = {
+            tournament_id: (date, time_control, is_completed)
+            for tournament_id, date, time_control, is_completed in Tournament.objects.filter(
+                tournament_filter
+            ).values_list('id', 'date', 'time_control', 'is_completed')
+        }
+
+        # Only completed rounds are rated, just like the live rating periods
+        rounds = list(Round.objects.filter(
+            Q(is_completed=True) | Q(tournament__is_completed=True),
+            tournament_id__in=list(tournaments)
+        ).order_by('tournament__date', 'tournament_id', 'number').values_list('id', 'tournament_id'))
+
+        games = {}
+        for match_id, round_id, white_id, black_id, result in Match.objects.filter(
+            round_id__in=[round_id for round_id, _ in rounds],
+            black_player__isnull=False,
+            result__in=list(WHITE_SCORES)
+        ).values_list('id', 'round_id', 'white_player_id', 'black_player_id', 'result'):
+            games.setdefault(round_id, []).append((match_id, position[white_id], position[black_id], WHITE_SCORES[result]))
+
+        participants = {}
+        for tournament_id, user_id in Tournament.participants.through.objects.filter(
+            tournament_id__in=[t for t, (_, _, done) in tournaments.items() if done]
+        ).values_list('tournament_id', 'user_id'):
+            participants.setdefault(tournament_id, []).append(user_id)
+
+        self.stdout.write(
+            f"Replaying {sum(len(g) for g in games.values())} games in {len(rounds)} rounds "
+            f"of {len(tournaments)} tournaments for {len(player_ids)} players"
+        )
+
+        # --- STEP 3: Replay all rating periods in memory ---
+        changes = []
+        history = []
+        checkpoints = []
+        checkpoint_every = options['checkpoint_every']
+        days_done = 0
+
+        for i, (round_id, tournament_id) in enumerate(rounds):
+            date, time_control, is_completed = tournaments[tournament_id]
+            round_games = games.get(round_id)
+
+            if round_games:
+                match_ids = [game[0] for game in round_games]
+                white_idx = np.array([game[1] for game in round_games], dtype=np.intp)
+                black_idx = np.array([game[2] for game in round_games], dtype=np.intp)
+                white_scores = np.array([game[3] for game in round_games], dtype=float)
+
+                for track in (time_control, 'overall'):
+                    if track not in RATING_TRACKS:
+                        continue
+                    changes.extend(self.ledger_entries(
+                        track, match_ids, player_ids,
+                        *replay_period(state, track, white_idx, black_idx, white_scores),
+                        white_scores
+                    ))
+
+            # End of a tournament: record rating history for its participants
+            last_of_tournament = i + 1 == len(rounds) or rounds[i + 1][1] != tournament_id
+            if last_of_tournament and is_completed and time_control in RATING_TRACKS:
+                ratings = state[time_control][0]
+                for user_id in participants.get(tournament_id, []):
+                    history.append(PlayerRatingHistory(
+                        player_id=user_id,
+                        tournament_id=tournament_id,
+                        date=date,
+                        rating=round(float(ratings[position[user_id]])),
+                        time_control=time_control
+                    ))
+
+            # End of a tournament day: maybe store a checkpoint
+            last_of_day = i + 1 == len(rounds) or tournaments[rounds[i + 1][1]][0] != date
+            if last_of_day:
+                days_done += 1
+                if checkpoint_every and (days_done % checkpoint_every == 0 or i + 1 == len(rounds)):
+                    checkpoints.append(RatingCheckpoint(as_of=date, state=dump_rating_state(state, player_ids)))
+
+        replay_time = time.perf_counter() - started
+        self.stdout.write(f"Replay finished in {replay_time:.2f}s")
+
+        # --- STEP 4: Report or save ---
+        players = list(User.objects.order_by('id'))
+        self.report(players, state, seeds, options['report'])
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING("Dry run, nothing was saved"))
+            return
+
+        with transaction.atomic():
+            replayed = Q(match__tournament__date__gte=since) if since else Q()
+            RatingChange.objects.filter(replayed).delete()
+            RatingChange.objects.bulk_create(changes, batch_size=2000)
+            refresh_player_game_ratings()
+
+            # Every track a player has rated games on, from the rebuilt ledger, and the
+            # unplayed rows, which only hold a seed
+            activity = rating_activity()
+            ratings = [rating for key, rating in unplayed.items() if key not in activity]
+            for (player_id, track), (games_count, last_played) in activity.items():
+                i = position[player_id]
+                ratings.append(PlayerRating(
+                    player_id=player_id,
+                    time_control=track,
+                    rating=float(state[track][0][i]),
+                    rd=float(state[track][1][i]),
+                    volatility=float(state[track][2][i]),
+                    games=games_count,
+                    last_played=last_played
+                ))
+            PlayerRating.objects.all().delete()
+            PlayerRating.objects.bulk_create(ratings, batch_size=2000)
+
+            # Players without rated games keep the rating they were seeded with
+            replayed_players = [player for player in players if (player.id, 'overall') in activity]
+            for player in replayed_players:
+                player.elo = float(state['overall'][0][position[player.id]])
+            User.objects.bulk_update(replayed_players, ['elo'], batch_size=500)
+
+            replayed_history = Q(tournament__date__gte=since) if since else Q()
+            PlayerRatingHistory.objects.filter(replayed_history).delete()
+            PlayerRatingHistory.objects.bulk_create(history, batch_size=2000)
+
+            Round.objects.filter(pk__in=[round_id for round_id, _ in rounds]).update(ratings_applied=True)
+
+            if checkpoint_every:
+                replayed_checkpoints = Q(as_of__gte=since) if since else Q()
+                RatingCheckpoint.objects.filter(replayed_checkpoints).delete()
+                RatingCheckpoint.objects.bulk_create(checkpoints)
+
+            bump_ratings_version()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Ratings recomputed in {time.perf_counter() - started:.2f}s: "
+            f"{len(changes)} ledger entries, {len(history)} history entries, {len(checkpoints)} checkpoints"
+        ))
+
+    def parse_since(self, value):
+        if not value:
+            return None
+        try:
+            return datetime.date.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f"Invalid date for --since: {value}. Expected YYYY-MM-DD")
+
+    def ledger_entries(self, track, match_ids, player_ids, players, inverse, before, after, white_scores):
+        """Build RatingChange entries for both sides of every game of one replayed period"""
+        entries = []
+        num_games = len(match_ids)
+        for side in range(2):
+            for g, match_id in enumerate(match_ids):
+                k = inverse[side * num_games + g]
+                score = white_scores[g] if side == 0 else 1 - white_scores[g]
+                entries.append(RatingChange(
+                    match_id=match_id,
+                    player_id=player_ids[players[k]],
+                    time_control=track,
+                    score=float(score),
+                    rating_before=float(before[0][k]),
+                    rd_before=float(before[1][k]),
+                    volatility_before=float(before[2][k]),
+                    rating_after=float(after[0][k]),
+                    rd_after=float(after[1][k]),
+                    volatility_after=float(after[2][k]),
+                ))
+        return entries
+
+    def load_seeds(self, position):
+        """
+        The rating state every player started each track from, keyed by (player position, track),
+        and the PlayerRating rows of tracks without rated games, keyed by (player_id, track).
+
+        A track with games in the ledger starts from the state before its first one. A track
+        without rated games starts from its stored row, which only holds a seed, and a player
+        without rated games or an overall row starts from User.elo, which admins may have set.
+        A track with rated games that are not in the ledger (rated before it existed) starts at
+        the defaults: its stored row already includes those games, which are about to be
+        replayed.
+        """
+        first_change = RatingChange.objects.filter(
+            player_id=OuterRef('player_id'), time_control=OuterRef('time_control')
+        ).order_by('match__tournament__date', 'match__tournament_id', 'match__round__number', 'id')
+
+        played = set()
+        for white_id, black_id, time_control in Match.objects.filter(
+            Q(round__is_completed=True) | Q(tournament__is_completed=True),
+            black_player__isnull=False,
+            result__in=list(WHITE_SCORES)
+        ).values_list('white_player_id', 'black_player_id', 'tournament__time_control').distinct():
+            for player_id in (white_id, black_id):
+                played.update({(player_id, time_control), (player_id, 'overall')})
+
+        seeds = {}
+        unplayed = {}
+        for rating in PlayerRating.objects.annotate(**{
+            f"first_{field}": Subquery(first_change.values(f"{field}_before")[:1]) for field in RATING_FIELDS
+        }):
+            key = (position[rating.player_id], rating.time_control)
+            if rating.first_rating is not None:
+                seeds[key] = tuple(getattr(rating, f"first_{field}") for field in RATING_FIELDS)
+            elif (rating.player_id, rating.time_control) not in played:
+                seeds[key] = tuple(getattr(rating, field) for field in RATING_FIELDS)
+                unplayed[(rating.player_id, rating.time_control)] = PlayerRating(
+                    player_id=rating.player_id, time_control=rating.time_control,
+                    **{field: getattr(rating, field) for field in RATING_FIELDS}
+                )
+
+        overall = set(PlayerRating.objects.filter(time_control='overall').values_list('player_id', flat=True))
+        for player_id, elo in User.objects.exclude(pk__in=overall).values_list('id', 'elo'):
+            if (player_id, 'overall') not in played:
+                seeds[(position[player_id], 'overall')] = (elo, DEFAULT_RD, DEFAULT_VOLATILITY)
+        return seeds, unplayed
+
+    def report(self, players, state, seeds, limit):
+        """Print how much the replayed ratings differ from the stored ones"""
+        stored = {
+            (player_id, track): rating
+            for player_id, track, rating in PlayerRating.objects.values_list('player_id', 'time_control', 'rating')
+        }
+        differences = []
+        for i, player in enumerate(players):
+            for track in RATING_TRACKS:
+                seed = seeds.get((i, track))
+                current = stored.get((player.id, track), seed[0] if seed else DEFAULT_RATING)
+                replayed = float(state[track][0][i])
+                if abs(replayed - current) >= 0.5:
+                    differences.append((abs(replayed - current), player, track, current, replayed))
+
+        changed_players = len({difference[1].id for difference in differences})
+        self.stdout.write(f"{changed_players} players have at least one rating that changes")
+
+        differences.sort(key=lambda d: d[0], reverse=True)
+        for _, player, track, current, replayed in differences[:limit]:
+            self.stdout.write(
+                f"  {player}: {track} {current:.0f} -> {replayed:.0f} ({replayed - current:+.0f})"
+            )
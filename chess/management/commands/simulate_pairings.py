@@ -0,0 +1,264 @@
+import contextlib
+import io
+import json
+import random
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from chess.models import Match, Round, Tournament, User
+from chess.pairing_service import TournamentState, pair_round_robin, pair_swiss
+from chess.utils import (
+    generate_round_robin_pairings, generate_swiss_pairings, round_robin_rounds, update_tournament_standings
+)
+
+DRAW_RATE = 0.15
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulates complete tournaments with synthetic players and Elo-based results, '
+        'and reports pairing latency, query counts, rematches, colour imbalance and floaters per round. '
+        'Runs with the same --seed are reproducible and can be compared across commits with --output.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tournaments', type=int, default=1000, help='Number of tournaments to simulate')
+        parser.add_argument(
+            '--type', default='swiss', choices=['swiss', 'round_robin', 'double_round_robin'],
+            help='Tournament type to simulate'
+        )
+        parser.add_argument(
+            '--players', default='8,13,20,31,64',
+            help='Comma-separated field sizes to choose from (mix odd and even)'
+        )
+        parser.add_argument(
+            '--rounds', default='5,7,9',
+            help='Comma-separated Swiss round counts to choose from (round robins play their full schedule)'
+        )
+        parser.add_argument(
+            '--database', action='store_true',
+            help='Drive generate_swiss_pairings / generate_round_robin_pairings against the database '
+                 'inside a transaction that is rolled back, and count queries. '
+                 'Without it the pure pairing functions are driven in memory.'
+        )
+        parser.add_argument('--seed', type=int, default=42, help='Random seed')
+        parser.add_argument('--output', help='Write the per-round statistics to this JSON file')
+
+    def handle(self, *args, **options):
+        sizes = self.parse_list(options['players'], '--players')
+        round_counts = self.parse_list(options['rounds'], '--rounds')
+        kind = options['type']
+        rng = random.Random(options['seed'])
+
+        # Per round number: lists of samples
+        stats = {}
+        started = time.perf_counter()
+
+        for i in range(options['tournaments']):
+            num_players = rng.choice(sizes)
+            ratings = [round(rng.gauss(1500, 300)) for _ in range(num_players)]
+            if kind == 'swiss':
+                num_rounds = min(rng.choice(round_counts), num_players - 1)
+            else:
+                num_rounds = round_robin_rounds(Tournament(tournament_type=kind), num_players)
+            results_rng = random.Random(rng.random())
+
+            if options['database']:
+                rounds = self.simulate_in_database(kind, ratings, num_rounds, results_rng)
+            else:
+                rounds = self.simulate_in_memory(kind, ratings, num_rounds, results_rng)
+
+            for number, round_stats in enumerate(rounds, start=1):
+                samples = stats.setdefault(number, {})
+                for key, value in round_stats.items():
+                    samples.setdefault(key, []).append(value)
+
+            if (i + 1) % 100 == 0:
+                self.stdout.write(f"  {i + 1}/{options['tournaments']} tournaments simulated")
+
+        summary = self.summarize(stats)
+        self.report(summary, options, time.perf_counter() - started)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({
+                    'options': {key: options[key] for key in ('tournaments', 'type', 'players', 'rounds', 'database', 'seed')},
+                    'rounds': summary,
+                }, f, indent=2)
+            self.stdout.write(f"Statistics written to {options['output']}")
+
+    def parse_list(self, value, option):
+        try:
+            values = [int(v) for v in value.split(',') if v.strip()]
+        except ValueError:
+            raise CommandError(f"{option} must be a comma-separated list of numbers")
+        if not values or (option == '--players' and min(values) < 2):
+            raise CommandError(f"{option} needs at least one value of 2 or more")
+        return values
+
+    def simulate_in_memory(self, kind, ratings, num_rounds, rng):
+        """Drive the pure pairing functions on a TournamentState"""
+        players = [User(id=i + 1, username=f"sim{i + 1}", elo=rating) for i, rating in enumerate(ratings)]
+        state = TournamentState(players)
+        rounds = []
+        meetings = {}
+        allowed_meetings = 2 if kind == 'double_round_robin' else 1
+
+        for number in range(1, num_rounds + 1):
+            before = time.perf_counter()
+            if kind == 'swiss':
+                pairings, bye_player = pair_swiss(state, number)
+            else:
+                pairings, bye_player = pair_round_robin(state, number, double=kind == 'double_round_robin')
+            latency = time.perf_counter() - before
+
+            round_stats = self.pairing_quality(state, pairings, meetings, allowed_meetings)
+            games = [(white.id, black.id, self.play(white.elo, black.elo, rng)) for white, black in pairings]
+            if bye_player:
+                games.append((bye_player.id, None, 'bye'))
+            state.add_round(games)
+
+            round_stats.update(self.color_quality(state), latency_ms=latency * 1000)
+            rounds.append(round_stats)
+
+        return rounds
+
+    def simulate_in_database(self, kind, ratings, num_rounds, rng):
+        """Drive the pairing generators on real rows, rolled back afterwards"""
+        rounds = []
+        meetings = {}
+        allowed_meetings = 2 if kind == 'double_round_robin' else 1
+        with transaction.atomic():
+            players = User.objects.bulk_create([
+                User(username=f"sim_{i + 1}", elo=rating, is_player_only=True) for i, rating in enumerate(ratings)
+            ])
+            tournament = Tournament.objects.create(
+                name='Pairing simulation', date='2000-01-01', tournament_type=kind, num_rounds=num_rounds,
+                has_started=True
+            )
+            tournament.participants.set(players)
+            update_tournament_standings(tournament)
+
+            for number in range(1, num_rounds + 1):
+                # The state before the round, for the quality figures
+                state = TournamentState.load(tournament)
+                round_obj = Round.objects.create(tournament=tournament, number=number)
+
+                with contextlib.redirect_stdout(io.StringIO()), CaptureQueriesContext(connection) as queries:
+                    before = time.perf_counter()
+                    if kind == 'swiss':
+                        pairings = generate_swiss_pairings(tournament, round_obj)
+                    else:
+                        pairings = generate_round_robin_pairings(tournament, round_obj)
+                    latency = time.perf_counter() - before
+
+                round_stats = self.pairing_quality(state, pairings, meetings, allowed_meetings)
+
+                matches = list(round_obj.matches.filter(black_player__isnull=False).select_related(
+                    'white_player', 'black_player'
+                ))
+                for match in matches:
+                    match.result = self.play(match.white_player.elo, match.black_player.elo, rng)
+                Match.objects.bulk_update(matches, ['result'])
+                round_obj.is_completed = True
+                round_obj.save(update_fields=['is_completed'])
+
+                round_stats.update(
+                    self.color_quality(TournamentState.load(tournament)),
+                    latency_ms=latency * 1000, queries=len(queries.captured_queries)
+                )
+                rounds.append(round_stats)
+
+            transaction.set_rollback(True)
+        return rounds
+
+    def play(self, white_rating, black_rating, rng):
+        """Random result with the Elo expected score for white"""
+        expected = 1 / (1 + 10 ** ((black_rating - white_rating) / 400))
+        if rng.random() < DRAW_RATE:
+            return 'draw'
+        return 'white_win' if rng.random() < expected else 'black_win'
+
+    def pairing_quality(self, state, pairings, meetings, allowed_meetings):
+        """Rematches and floaters of a round, against the state before it"""
+        rematches = 0
+        floaters = 0
+        for white, black in pairings:
+            white_record = state.records[white.id]
+            black_record = state.records[black.id]
+            pair = frozenset((white.id, black.id))
+            if meetings.get(pair, 0) >= allowed_meetings:
+                rematches += 1
+            meetings[pair] = meetings.get(pair, 0) + 1
+            if white_record.score != black_record.score:
+                floaters += 2
+        return {'rematches': rematches, 'floaters': floaters}
+
+    def color_quality(self, state):
+        """Colour imbalance after a round"""
+        records = list(state.records.values())
+        return {
+            'max_color_diff': max(abs(record.color_diff) for record in records),
+            'color_diff_over_2': sum(abs(record.color_diff) > 2 for record in records),
+            'three_in_a_row': sum(
+                len(record.colors) >= 3 and len(set(record.colors[-3:])) == 1 for record in records
+            ),
+        }
+
+    def summarize(self, stats):
+        summary = {}
+        for number, samples in sorted(stats.items()):
+            latency = np.array(samples['latency_ms'])
+            round_summary = {
+                'tournaments': len(latency),
+                'latency_p50_ms': float(np.percentile(latency, 50)),
+                'latency_p90_ms': float(np.percentile(latency, 90)),
+                'latency_p99_ms': float(np.percentile(latency, 99)),
+                'latency_max_ms': float(latency.max()),
+                'rematches': int(sum(samples['rematches'])),
+                'floaters_mean': float(np.mean(samples['floaters'])),
+                'max_color_diff': int(max(samples['max_color_diff'])),
+                'color_diff_over_2': int(sum(samples['color_diff_over_2'])),
+                'three_in_a_row': int(sum(samples['three_in_a_row'])),
+            }
+            if 'queries' in samples:
+                round_summary['queries_mean'] = float(np.mean(samples['queries']))
+                round_summary['queries_max'] = int(max(samples['queries']))
+            summary[number] = round_summary
+        return summary
+
+    def report(self, summary, options, elapsed):
+        mode = 'database' if options['database'] else 'in memory'
+        self.stdout.write(
+            f"{options['tournaments']} {options['type']} tournaments ({mode}, seed {options['seed']}) "
+            f"simulated in {elapsed:.1f}s"
+        )
+
+        header = (
+            f"{'Round':>5} {'n':>6} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} "
+            f"{'rematch':>8} {'floaters':>8} {'max|CD|':>7} {'|CD|>2':>7} {'3 in row':>8}"
+        )
+        if options['database']:
+            header += f" {'queries':>8}"
+        self.stdout.write(header)
+
+        for number, s in summary.items():
+            line = (
+                f"{number:>5} {s['tournaments']:>6} {s['latency_p50_ms']:>8.2f} {s['latency_p90_ms']:>8.2f} "
+                f"{s['latency_p99_ms']:>8.2f} {s['latency_max_ms']:>8.2f} {s['rematches']:>8} "
+                f"{s['floaters_mean']:>8.2f} {s['max_color_diff']:>7} {s['color_diff_over_2']:>7} "
+                f"{s['three_in_a_row']:>8}"
+            )
+            if options['database']:
+                line += f" {s['queries_mean']:>8.1f}"
+            self.stdout.write(line)
+
+        rematches = sum(s['rematches'] for s in summary.values())
+        if rematches:
+            self.stdout.write(self.style.WARNING(f"{rematches} rematches in total"))
+        else:
+            self.stdout.write(self.style.SUCCESS("No rematches"))
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-18 11:11
+
+from django.db import migrations, models
+from django.db.models import Q
+
+
+def mark_rated_rounds(apps, schema_editor):
+    """
+    Rounds that were completed before rating periods existed were already
+    rated game by game, so they must not be rated a second time.
+    """
+    Round = apps.get_model('chess', 'Round')
+    Round.objects.filter(
+        Q(is_completed=True) | Q(tournament__is_completed=True)
+    ).update(ratings_applied=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chess', '0011_alter_achievement_achievement_type_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='round',
+            name='ratings_applied',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_rated_rounds, migrations.RunPython.noop),
+    ]
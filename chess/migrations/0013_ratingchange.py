@@ -0,0 +1,34 @@
+# Generated by Django 5.1.7 on 2026-10-18 11:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chess', '0012_round_ratings_applied'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatingChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('time_control', models.CharField(choices=[('bullet', 'Bullet'), ('blitz', 'Blitz'), ('rapid', 'Rapid'), ('classical', 'Classical'), ('overall', 'Overall')], max_length=20)),
+                ('score', models.FloatField()),
+                ('rating_before', models.FloatField()),
+                ('rd_before', models.FloatField()),
+                ('volatility_before', models.FloatField()),
+                ('rating_after', models.FloatField()),
+                ('rd_after', models.FloatField()),
+                ('volatility_after', models.FloatField()),
+                ('match', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rating_changes', to='chess.match')),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rating_changes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('match', 'player', 'time_control')},
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.7 on 2026-10-18 11:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chess', '0013_ratingchange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatingCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateField(unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('state', models.JSONField()),
+            ],
+            options={
+                'ordering': ['as_of'],
+            },
+        ),
+    ]
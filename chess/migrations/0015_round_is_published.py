@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 11:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chess', '0014_ratingcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='round',
+            name='is_published',
+            field=models.BooleanField(default=True),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.1.7 on 2026-10-18 11:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_tournament_summaries(apps, schema_editor):
+    """
+    Store participant and round counts of every tournament, and the winner and
+    runner-up of completed ones
+    """
+    Tournament = apps.get_model('chess', 'Tournament')
+    TournamentStanding = apps.get_model('chess', 'TournamentStanding')
+    
+    for tournament in Tournament.objects.all():
+        tournament.participant_count = tournament.participants.count()
+        tournament.round_count = tournament.rounds.filter(is_published=True).count()
+        
+        if tournament.is_completed:
+            top_two = list(TournamentStanding.objects.filter(
+                tournament=tournament
+            ).order_by('-score', 'rank', 'player_id').values_list('player_id', flat=True)[:2])
+            tournament.winner_id = top_two[0] if top_two else None
+            tournament.runner_up_id = top_two[1] if len(top_two) > 1 else None
+        
+        tournament.save(update_fields=['winner', 'runner_up', 'participant_count', 'round_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chess', '0015_round_is_published'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tournament',
+            name='participant_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tournament',
+            name='round_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tournament',
+            name='runner_up',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tournaments_runner_up', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='tournament',
+            name='winner',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tournaments_won', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(fill_tournament_summaries, migrations.RunPython.noop),
+    ]
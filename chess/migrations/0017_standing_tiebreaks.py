@@ -0,0 +1,202 @@
+# Generated by Django 5.1.7 on 2026-10-18 11:38
+
+import numpy as np
+from django.db import migrations, models
+
+
+# A copy of the tiebreak engine at the time of this migration (tiebreak_service and
+# utils.assign_ranks), so later changes to those modules do not change what it does.
+# 0018_standingsnapshot uses it as well.
+
+TIEBREAK_KEYS = ['direct_encounter', 'buchholz', 'median_buchholz', 'sonneborn_berger', 'progressive']
+
+DEFAULT_TIEBREAK_ORDER = {
+    'swiss': ['buchholz', 'median_buchholz', 'direct_encounter', 'progressive'],
+    'round_robin': ['direct_encounter', 'sonneborn_berger'],
+    'double_round_robin': ['direct_encounter', 'sonneborn_berger'],
+}
+
+UNPLAYED_RESULTS = {'bye', 'white_forfeit', 'black_forfeit'}
+
+MATCH_POINTS = {
+    'white_win': (1, 0),
+    'black_win': (0, 1),
+    'draw': (0.5, 0.5),
+    'bye': (1, 0),
+    'white_forfeit': (0, 1),
+    'black_forfeit': (1, 0),
+}
+
+
+def match_points(result, has_opponent=True):
+    """Points (white, black) of a match result; without an opponent only a bye scores"""
+    if not has_opponent and result != 'bye':
+        return (0, 0)
+    return MATCH_POINTS.get(result, (0, 0))
+
+
+def tiebreak_order(tournament):
+    """The tiebreaks of a tournament in the order they are applied"""
+    if tournament.tiebreak_order:
+        return [key.strip() for key in tournament.tiebreak_order.split(',') if key.strip() in TIEBREAK_KEYS]
+    return DEFAULT_TIEBREAK_ORDER.get(tournament.tournament_type, DEFAULT_TIEBREAK_ORDER['swiss'])
+
+
+def compute_tiebreaks(player_ids, games, order=()):
+    """
+    All tiebreaks of every player, as arrays aligned with player_ids, from
+    (round_number, white_id, black_id, result) games
+    """
+    index = {player_id: i for i, player_id in enumerate(player_ids)}
+    games = [game for game in games if game[3] in MATCH_POINTS and game[1] in index]
+    column = {number: i for i, number in enumerate(sorted({game[0] for game in games}))}
+
+    shape = (len(index), len(column))
+    points = np.zeros(shape)
+    opponents = np.full(shape, -1)
+    played = np.zeros(shape, dtype=bool)
+    unplayed = np.zeros(shape, dtype=bool)
+    for round_number, white_id, black_id, result in games:
+        r = column[round_number]
+        white_points, black_points = match_points(result, black_id is not None)
+        w = index[white_id]
+        b = index.get(black_id)
+        points[w, r] = white_points
+        if b is None:
+            unplayed[w, r] = True
+            continue
+        points[b, r] = black_points
+        if result in UNPLAYED_RESULTS:
+            unplayed[w, r] = unplayed[b, r] = True
+        else:
+            opponents[w, r] = b
+            opponents[b, r] = w
+            played[w, r] = played[b, r] = True
+
+    counted = played | unplayed
+    score = points.sum(axis=1)
+    opponents = np.where(played, opponents, 0)
+
+    adjusted = np.where(played, points, 0).sum(axis=1) + 0.5 * unplayed.sum(axis=1)
+    contributions = np.where(played, adjusted[opponents], 0) + np.where(unplayed, score[:, None], 0)
+    buchholz = contributions.sum(axis=1)
+
+    cut = counted.sum(axis=1) >= 3
+    highest = np.where(counted, contributions, 0).max(axis=1, initial=0)
+    lowest = np.where(counted, contributions, np.inf).min(axis=1, initial=np.inf)
+    highest[~cut] = 0
+    lowest[~cut] = 0
+
+    tiebreaks = {
+        'buchholz': buchholz,
+        'median_buchholz': buchholz - highest - lowest,
+        'sonneborn_berger': np.where(played, score[opponents] * points, 0).sum(axis=1),
+        'progressive': np.cumsum(points, axis=1).sum(axis=1),
+    }
+
+    # Direct encounter between players tied on score and on the tiebreaks before it
+    order = list(order)
+    preceding = order[:order.index('direct_encounter')] if 'direct_encounter' in order else []
+    n = len(score)
+    encounter = np.zeros(n)
+    if played.any():
+        rows = np.nonzero(played)
+        met = np.zeros((n, n), dtype=bool)
+        met[rows[0], opponents[rows]] = True
+        scored = np.zeros((n, n))
+        np.add.at(scored, (rows[0], opponents[rows]), points[rows])
+
+        ties = np.column_stack([score] + [tiebreaks[key] for key in preceding])
+        _, groups, sizes = np.unique(ties, axis=0, return_inverse=True, return_counts=True)
+        groups = groups.reshape(-1)
+        for group in np.nonzero(sizes > 1)[0]:
+            members = np.nonzero(groups == group)[0]
+            if met[np.ix_(members, members)].sum() == len(members) * (len(members) - 1):
+                encounter[members] = scored[np.ix_(members, members)].sum(axis=1)
+    tiebreaks['direct_encounter'] = encounter
+    return tiebreaks
+
+
+def assign_ranks(standings, tiebreaks=()):
+    """
+    Rank standings by score and then by the given tiebreaks, players equal on all of
+    them sharing a rank. The old rank becomes the previous rank.
+    """
+    def sort_key(standing):
+        return (-standing.score,) + tuple(-getattr(standing, key) for key in tiebreaks)
+
+    current_rank = None
+    current_key = None
+    for i, standing in enumerate(sorted(standings, key=sort_key)):
+        key = sort_key(standing)
+        if key != current_key:
+            current_rank = i + 1
+            current_key = key
+        standing.previous_rank = standing.rank
+        standing.rank = current_rank
+
+
+def fill_tiebreaks(apps, schema_editor):
+    """Compute the tiebreaks of existing standings, rank by them and refresh the stored winners"""
+    Tournament = apps.get_model('chess', 'Tournament')
+    TournamentStanding = apps.get_model('chess', 'TournamentStanding')
+    Match = apps.get_model('chess', 'Match')
+    
+    for tournament in Tournament.objects.filter(standings__isnull=False).distinct():
+        standings = list(TournamentStanding.objects.filter(tournament=tournament))
+        order = tiebreak_order(tournament)
+        games = Match.objects.filter(tournament=tournament).values_list(
+            'round__number', 'white_player_id', 'black_player_id', 'result'
+        )
+        for key, values in compute_tiebreaks([s.player_id for s in standings], games, order).items():
+            for standing, value in zip(standings, values):
+                setattr(standing, key, float(value))
+        assign_ranks(standings, order)
+        TournamentStanding.objects.bulk_update(standings, ['rank', 'previous_rank'] + TIEBREAK_KEYS)
+        
+        if tournament.is_completed:
+            top_two = [s.player_id for s in sorted(standings, key=lambda s: (s.rank, -s.score, s.player_id))[:2]]
+            tournament.winner_id = top_two[0]
+            tournament.runner_up_id = top_two[1] if len(top_two) > 1 else None
+            tournament.save(update_fields=['winner', 'runner_up'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chess', '0016_tournament_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tournament',
+            name='tiebreak_order',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='tournamentstanding',
+            name='buchholz',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tournamentstanding',
+            name='direct_encounter',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tournamentstanding',
+            name='median_buchholz',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tournamentstanding',
+            name='progressive',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tournamentstanding',
+            name='sonneborn_berger',
+            field=models.FloatField(default=0),
+        ),
+        migrations.RunPython(fill_tiebreaks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 5.1.7 on 2026-10-18 11:40
+
+import importlib
+from types import SimpleNamespace
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_snapshots(apps, schema_editor):
+    """Rebuild the standings after every finished round of the existing tournaments"""
+    # The tiebreak engine as frozen in the previous migration
+    engine = importlib.import_module('chess.migrations.0017_standing_tiebreaks')
+    
+    Tournament = apps.get_model('chess', 'Tournament')
+    Match = apps.get_model('chess', 'Match')
+    StandingSnapshot = apps.get_model('chess', 'StandingSnapshot')
+    
+    for tournament in Tournament.objects.filter(has_started=True):
+        rounds = tournament.rounds.filter(is_published=True)
+        if not tournament.is_completed:
+            rounds = rounds.filter(is_completed=True)
+        rounds = list(rounds)
+        if not rounds:
+            continue
+        
+        player_ids = list(tournament.participants.values_list('id', flat=True))
+        games = list(Match.objects.filter(tournament=tournament).values_list(
+            'round__number', 'white_player_id', 'black_player_id', 'result'
+        ))
+        order = engine.tiebreak_order(tournament)
+        after_rounds = {}
+        for round_obj in rounds:
+            played = [game for game in games if game[0] <= round_obj.number]
+            scores = {player_id: 0.0 for player_id in player_ids}
+            for _, white_id, black_id, result in played:
+                if white_id not in scores:
+                    continue
+                white_points, black_points = engine.match_points(result, black_id is not None)
+                scores[white_id] += white_points
+                if black_id in scores:
+                    scores[black_id] += black_points
+            tiebreaks = engine.compute_tiebreaks(player_ids, played, order)
+            standings = [
+                SimpleNamespace(
+                    player_id=player_id, score=scores[player_id], rank=None, previous_rank=None,
+                    **{key: float(tiebreaks[key][i]) for key in engine.TIEBREAK_KEYS}
+                )
+                for i, player_id in enumerate(player_ids)
+            ]
+            engine.assign_ranks(standings, order)
+            after_rounds[round_obj.number] = standings
+        
+        StandingSnapshot.objects.bulk_create([
+            StandingSnapshot(
+                tournament=tournament,
+                round=round_obj,
+                player_id=standing.player_id,
+                score=standing.score,
+                rank=standing.rank,
+                tiebreaks={key: getattr(standing, key) for key in engine.TIEBREAK_KEYS}
+            )
+            for round_obj in rounds
+            for standing in after_rounds[round_obj.number]
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chess', '0017_standing_tiebreaks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StandingSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('rank', models.IntegerField()),
+                ('tiebreaks', models.JSONField(default=dict)),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standing_snapshots', to=settings.AUTH_USER_MODEL)),
+                ('round', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standing_snapshots', to='chess.round')),
+                ('tournament', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standing_snapshots', to='chess.tournament')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['player', 'tournament'], name='chess_stand_player__3848cb_idx')],
+                'unique_together': {('round', 'player')},
+            },
+        ),
+        migrations.RunPython(fill_snapshots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,100 @@
+# Generated by Django 5.1.7 on 2026-10-18 11:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Copies of the scoring rules at the time of this migration, so later changes to the
+# services do not change what it does
+
+# Result of a match from the side of the (white, black) player
+PLAYER_RESULTS = {
+    'white_win': ('win', 'loss'),
+    'black_win': ('loss', 'win'),
+    'draw': ('draw', 'draw'),
+    'bye': ('bye', None),
+    'white_forfeit': ('forfeit_loss', 'forfeit_win'),
+    'black_forfeit': ('forfeit_win', 'forfeit_loss'),
+    'pending': ('pending', 'pending'),
+}
+
+# Points (white, black) awarded for each match result
+MATCH_POINTS = {
+    'white_win': (1, 0),
+    'black_win': (0, 1),
+    'draw': (0.5, 0.5),
+    'bye': (1, 0),
+    'white_forfeit': (0, 1),
+    'black_forfeit': (1, 0),
+}
+
+
+def match_points(result, has_opponent=True):
+    """Points (white, black) of a match result; without an opponent only a bye scores"""
+    if not has_opponent and result != 'bye':
+        return (0, 0)
+    return MATCH_POINTS.get(result, (0, 0))
+
+
+def fill_player_games(apps, schema_editor):
+    """Mirror every existing match into PlayerGame, with the ratings from the ledger"""
+    from django.db.models import OuterRef, Subquery
+    
+    Match = apps.get_model('chess', 'Match')
+    PlayerGame = apps.get_model('chess', 'PlayerGame')
+    RatingChange = apps.get_model('chess', 'RatingChange')
+    
+    games = []
+    for match_id, tournament_id, white_id, black_id, result, round_number, date, time_control in Match.objects.values_list(
+        'id', 'tournament_id', 'white_player_id', 'black_player_id', 'result',
+        'round__number', 'tournament__date', 'tournament__time_control'
+    ).iterator():
+        white_result, black_result = PLAYER_RESULTS[result]
+        white_score, black_score = match_points(result, black_id is not None)
+        shared = dict(match_id=match_id, tournament_id=tournament_id, date=date, round_number=round_number, time_control=time_control)
+        games.append(PlayerGame(player_id=white_id, opponent_id=black_id, color='white', result=white_result, score=white_score, **shared))
+        if black_id:
+            games.append(PlayerGame(player_id=black_id, opponent_id=white_id, color='black', result=black_result, score=black_score, **shared))
+    PlayerGame.objects.bulk_create(games, batch_size=2000)
+    
+    ledger = RatingChange.objects.filter(
+        match_id=OuterRef('match_id'), player_id=OuterRef('player_id'), time_control=OuterRef('time_control')
+    )
+    PlayerGame.objects.update(
+        rating_before=Subquery(ledger.values('rating_before')[:1]),
+        rating_after=Subquery(ledger.values('rating_after')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chess', '0018_standingsnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayerGame',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('color', models.CharField(choices=[('white', 'White'), ('black', 'Black')], max_length=5)),
+                ('result', models.CharField(choices=[('win', 'Win'), ('loss', 'Loss'), ('draw', 'Draw'), ('bye', 'Bye'), ('forfeit_win', 'Forfeit Win'), ('forfeit_loss', 'Forfeit Loss'), ('pending', 'Pending')], max_length=12)),
+                ('score', models.FloatField(default=0)),
+                ('date', models.DateField()),
+                ('round_number', models.IntegerField()),
+                ('time_control', models.CharField(choices=[('bullet', 'Bullet'), ('blitz', 'Blitz'), ('rapid', 'Rapid'), ('classical', 'Classical')], max_length=20)),
+                ('rating_before', models.FloatField(blank=True, null=True)),
+                ('rating_after', models.FloatField(blank=True, null=True)),
+                ('match', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='player_games', to='chess.match')),
+                ('opponent', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='player_games', to=settings.AUTH_USER_MODEL)),
+                ('tournament', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='player_games', to='chess.tournament')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['player', 'result', 'color'], name='playergame_player_result'), models.Index(fields=['player', '-date', '-round_number'], name='playergame_player_history'), models.Index(fields=['player', 'time_control', 'date'], name='playergame_player_tc_date'), models.Index(fields=['tournament', 'player', 'round_number'], name='playergame_tournament_player')],
+                'unique_together': {('match', 'player')},
+            },
+        ),
+        migrations.RunPython(fill_player_games, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 5.1.7 on 2026-10-18 11:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+# Copies of the counters at the time of this migration (player_stats_service), so later
+# changes to the service do not change what it does
+
+# PlayerStats game counters, as aggregates over PlayerGame
+GAME_COUNTS = {
+    'games': Count('id', filter=~Q(result='pending')),
+    'white_wins': Count('id', filter=Q(result='win', color='white')),
+    'white_losses': Count('id', filter=Q(result='loss', color='white')),
+    'white_draws': Count('id', filter=Q(result='draw', color='white')),
+    'black_wins': Count('id', filter=Q(result='win', color='black')),
+    'black_losses': Count('id', filter=Q(result='loss', color='black')),
+    'black_draws': Count('id', filter=Q(result='draw', color='black')),
+}
+
+# PlayerStats counter for each final rank of a completed tournament
+PLACING_COUNTERS = {
+    1: 'tournaments_won',
+    2: 'silver_medals',
+    3: 'bronze_medals',
+}
+
+
+def fill_player_stats(apps, schema_editor):
+    """Count the existing games and completed tournaments of every player"""
+    
+    PlayerGame = apps.get_model('chess', 'PlayerGame')
+    PlayerStats = apps.get_model('chess', 'PlayerStats')
+    TournamentStanding = apps.get_model('chess', 'TournamentStanding')
+    
+    rows = {}
+    def counters(player_id, track):
+        return rows.setdefault((player_id, track), PlayerStats(player_id=player_id, time_control=track))
+    
+    for row in PlayerGame.objects.order_by().values('player_id', 'time_control').annotate(**GAME_COUNTS):
+        player_id, time_control = row.pop('player_id'), row.pop('time_control')
+        for track in (time_control, 'all'):
+            stats = counters(player_id, track)
+            for field, count in row.items():
+                setattr(stats, field, getattr(stats, field) + count)
+    
+    for player_id, time_control, rank in TournamentStanding.objects.filter(
+        tournament__is_completed=True
+    ).values_list('player_id', 'tournament__time_control', 'rank'):
+        for track in (time_control, 'all'):
+            stats = counters(player_id, track)
+            stats.tournaments_played += 1
+            if rank in PLACING_COUNTERS:
+                field = PLACING_COUNTERS[rank]
+                setattr(stats, field, getattr(stats, field) + 1)
+    
+    PlayerStats.objects.bulk_create(rows.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chess', '0019_playergame'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayerStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('time_control', models.CharField(choices=[('all', 'All'), ('bullet', 'Bullet'), ('blitz', 'Blitz'), ('rapid', 'Rapid'), ('classical', 'Classical')], default='all', max_length=20)),
+                ('games', models.IntegerField(default=0)),
+                ('white_wins', models.IntegerField(default=0)),
+                ('white_losses', models.IntegerField(default=0)),
+                ('white_draws', models.IntegerField(default=0)),
+                ('black_wins', models.IntegerField(default=0)),
+                ('black_losses', models.IntegerField(default=0)),
+                ('black_draws', models.IntegerField(default=0)),
+                ('tournaments_played', models.IntegerField(default=0)),
+                ('tournaments_won', models.IntegerField(default=0)),
+                ('silver_medals', models.IntegerField(default=0)),
+                ('bronze_medals', models.IntegerField(default=0)),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('player', 'time_control')},
+            },
+        ),
+        migrations.RunPython(fill_player_stats, migrations.RunPython.noop),
+    ]
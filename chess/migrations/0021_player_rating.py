@@ -0,0 +1,134 @@
+# Generated by Django 5.1.7 on 2026-10-18 11:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def move_ratings(apps, schema_editor):
+    """
+    Copy the rating columns of every user into PlayerRating rows. A row is created for every
+    track with rated games in the ledger, or with a rating state that is not the default.
+    """
+    from django.db.models import Count, Max
+    
+    PlayerRating = apps.get_model('chess', 'PlayerRating')
+    RatingChange = apps.get_model('chess', 'RatingChange')
+    User = apps.get_model('chess', 'User')
+    
+    columns = {
+        'bullet': ('bullet_elo', 'bullet_rd', 'bullet_volatility'),
+        'blitz': ('blitz_elo', 'blitz_rd', 'blitz_volatility'),
+        'rapid': ('rapid_elo', 'rapid_rd', 'rapid_volatility'),
+        'classical': ('classical_elo', 'classical_rd', 'classical_volatility'),
+        'overall': ('elo', 'rd', 'volatility'),
+    }
+    activity = {
+        (player_id, track): (games, last_played)
+        for player_id, track, games, last_played in RatingChange.objects.order_by().values_list(
+            'player_id', 'time_control'
+        ).annotate(games=Count('id'), last_played=Max('match__tournament__date'))
+    }
+    
+    ratings = []
+    fields = [field for track_fields in columns.values() for field in track_fields]
+    for user in User.objects.values('id', *fields).iterator():
+        for track, (rating_field, rd_field, volatility_field) in columns.items():
+            games, last_played = activity.get((user['id'], track), (0, None))
+            state = (user[rating_field], user[rd_field], user[volatility_field])
+            if not games and state == (1500, 350, 0.06):
+                continue
+            ratings.append(PlayerRating(
+                player_id=user['id'],
+                time_control=track,
+                rating=state[0],
+                rd=state[1],
+                volatility=state[2],
+                games=games,
+                last_played=last_played
+            ))
+    PlayerRating.objects.bulk_create(ratings, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chess', '0020_player_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayerRating',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('time_control', models.CharField(choices=[('bullet', 'Bullet'), ('blitz', 'Blitz'), ('rapid', 'Rapid'), ('classical', 'Classical'), ('overall', 'Overall')], max_length=20)),
+                ('rating', models.FloatField(default=1500)),
+                ('rd', models.FloatField(default=350)),
+                ('volatility', models.FloatField(default=0.06)),
+                ('games', models.IntegerField(default=0)),
+                ('last_played', models.DateField(blank=True, null=True)),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ratings', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['time_control', '-rating'], name='playerrating_leaderboard'), models.Index(fields=['time_control', 'last_played'], name='playerrating_activity')],
+                'unique_together': {('player', 'time_control')},
+            },
+        ),
+        migrations.RunPython(move_ratings, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='user',
+            name='blitz_elo',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='blitz_rd',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='blitz_volatility',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='bullet_elo',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='bullet_rd',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='bullet_volatility',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='classical_elo',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='classical_rd',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='classical_volatility',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='rapid_elo',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='rapid_rd',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='rapid_volatility',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='rd',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='volatility',
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.7 on 2026-10-18 13:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_highest_rated(apps, schema_editor):
+    """
+    Store the highest rated participant of completed tournaments, on today's ratings as
+    the ones at completion are not kept, and drop the saved achievement progress so the
+    next checks replay it with them
+    """
+    Tournament = apps.get_model('chess', 'Tournament')
+    AchievementProgress = apps.get_model('chess', 'AchievementProgress')
+    
+    for tournament in Tournament.objects.filter(is_completed=True):
+        tournament.highest_rated_id = tournament.participants.order_by('-elo', 'id').values_list('id', flat=True).first()
+        tournament.save(update_fields=['highest_rated'])
+    AchievementProgress.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chess', '0022_achievement_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tournament',
+            name='highest_rated',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(fill_highest_rated, migrations.RunPython.noop),
+    ]
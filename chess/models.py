@@ -2,8 +2,10 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator
-import math
 
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.dispatch import receiver
 from allauth.socialaccount.signals import social_account_added, social_account_updated
 from allauth.socialaccount.models import SocialAccount
@@ -17,38 +19,34 @@ class User(AbstractUser):
     fide_id = models.CharField(max_length=20, blank=True, null=True)
     fide_rating = models.IntegerField(blank=True, null=True)
 
-    bullet_elo = models.FloatField(default=1500)
-    bullet_rd = models.FloatField(default=350)
-    bullet_volatility = models.FloatField(default=0.06)
-    
-    blitz_elo = models.FloatField(default=1500)
-    blitz_rd = models.FloatField(default=350)
-    blitz_volatility = models.FloatField(default=0.06)
-    
-    rapid_elo = models.FloatField(default=1500)
-    rapid_rd = models.FloatField(default=350)
-    rapid_volatility = models.FloatField(default=0.06)
-    
-    classical_elo = models.FloatField(default=1500)
-    classical_rd = models.FloatField(default=350)
-    classical_volatility = models.FloatField(default=0.06)
-    
-    # Keep the original elo field as an overall rating or fallback
+    # Overall rating, mirrored from the 'overall' PlayerRating; used for seeding and sorting
     elo = models.FloatField(default=1500)
-    rd = models.FloatField(default=350)
-    volatility = models.FloatField(default=0.06)
     last_played = models.DateTimeField(auto_now=True)
 
     def get_rating_for_time_control(self, time_control):
-        if time_control == 'bullet':
-            return self.bullet_elo
-        elif time_control == 'blitz':
-            return self.blitz_elo
-        elif time_control == 'rapid':
-            return self.rapid_elo
-        elif time_control == 'classical':
-            return self.classical_elo
-        return self.elo  # Fallback to general rating
+        """Rating on a track, the default rating if the player has not been rated on it"""
+        if time_control not in dict(PlayerRating.TRACK_CHOICES):
+            time_control = 'overall'  # Fallback to general rating
+        for rating in self.ratings.all():
+            if rating.time_control == time_control:
+                return rating.rating
+        return PlayerRating._meta.get_field('rating').default
+    
+    @property
+    def bullet_elo(self):
+        return self.get_rating_for_time_control('bullet')
+    
+    @property
+    def blitz_elo(self):
+        return self.get_rating_for_time_control('blitz')
+    
+    @property
+    def rapid_elo(self):
+        return self.get_rating_for_time_control('rapid')
+    
+    @property
+    def classical_elo(self):
+        return self.get_rating_for_time_control('classical')
     
     def save(self, *args, **kwargs):
         # If it's a new player-only user without a username, create one
@@ -99,6 +97,16 @@ class Tournament(models.Model):
     has_started = models.BooleanField(default=False)
     time_control = models.CharField(max_length=20, choices=TIME_CONTROL_CHOICES, default='blitz')
     max_participants = models.IntegerField(default=20, validators=[MinValueValidator(2)])
+    # Comma-separated tiebreaks in the order they are applied; blank uses the default for the tournament type
+    tiebreak_order = models.CharField(max_length=200, blank=True)
+    
+    # Materialised results for the tournament list, filled by update_tournament_summary
+    winner = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='tournaments_won')
+    runner_up = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='tournaments_runner_up')
+    participant_count = models.IntegerField(default=0)
+    round_count = models.IntegerField(default=0)
+    # Highest rated participant when the tournament was completed, for Giant Slayer
+    highest_rated = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
     
     def __str__(self):
         return self.name
@@ -108,11 +116,11 @@ class Tournament(models.Model):
     
     def is_full(self):
         """Check if tournament has reached maximum participants"""
-        return self.participants.count() >= self.max_participants
+        return self.participant_count >= self.max_participants
     
     def spots_left(self):
         """Return number of spots left in tournament"""
-        return max(0, self.max_participants - self.participants.count())
+        return max(0, self.max_participants - self.participant_count)
     
     def is_swiss_type(self):
         """Check if tournament is Swiss type"""
@@ -139,6 +147,8 @@ class Round(models.Model):
     tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name='rounds')
     number = models.IntegerField()
     is_completed = models.BooleanField(default=False)
+    ratings_applied = models.BooleanField(default=False)  # Set once the round has been rated
+    is_published = models.BooleanField(default=True)  # Scheduled round robin rounds stay hidden until reached
     
     class Meta:
         unique_together = ('tournament', 'number')
@@ -173,10 +183,134 @@ class Match(models.Model):
         is_new = self.pk is None
         super().save(*args, **kwargs)
         
-        # Update Glicko2 ratings only for actual matches (not byes)
-        # Only if result is set and not pending
-        if not is_new and self.result not in ['pending', 'bye'] and self.black_player is not None:
-            update_glicko2_ratings(self)
+        # Correct the ratings if the result of an already rated game changed
+        if not is_new:
+            from .rating_service import sync_match_rating
+            sync_match_rating(self)
+        
+        # Mirror the game into the per-player table
+        from .player_stats_service import sync_player_games
+        sync_player_games([self.pk])
+
+class PlayerGame(models.Model):
+    """
+    One row per player per game, seen from that player's side.
+    Kept in step with Match by player_stats_service, so a per-player statistic is a
+    single indexed aggregate instead of a white_matches and a black_matches query.
+    """
+    COLOR_CHOICES = [
+        ('white', 'White'),
+        ('black', 'Black'),
+    ]
+    
+    RESULT_CHOICES = [
+        ('win', 'Win'),
+        ('loss', 'Loss'),
+        ('draw', 'Draw'),
+        ('bye', 'Bye'),
+        ('forfeit_win', 'Forfeit Win'),    # Opponent didn't show
+        ('forfeit_loss', 'Forfeit Loss'),  # Player didn't show
+        ('pending', 'Pending'),
+    ]
+    
+    match = models.ForeignKey(Match, on_delete=models.CASCADE, related_name='player_games')
+    player = models.ForeignKey(User, on_delete=models.CASCADE, related_name='player_games')
+    opponent = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+', null=True, blank=True)  # None for byes
+    tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name='player_games')
+    color = models.CharField(max_length=5, choices=COLOR_CHOICES)
+    result = models.CharField(max_length=12, choices=RESULT_CHOICES)
+    score = models.FloatField(default=0)
+    date = models.DateField()
+    round_number = models.IntegerField()
+    time_control = models.CharField(max_length=20, choices=Tournament.TIME_CONTROL_CHOICES)
+    # Rating of the player on the time control track, from the RatingChange ledger; None until rated
+    rating_before = models.FloatField(null=True, blank=True)
+    rating_after = models.FloatField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.player.username} - {self.match} - {self.result}"
+    
+    class Meta:
+        unique_together = ('match', 'player')
+        indexes = [
+            # Win/loss/draw counts by colour are answered from the index alone
+            models.Index(fields=['player', 'result', 'color'], name='playergame_player_result'),
+            # Game history, most recent first
+            models.Index(fields=['player', '-date', '-round_number'], name='playergame_player_history'),
+            models.Index(fields=['player', 'time_control', 'date'], name='playergame_player_tc_date'),
+            models.Index(fields=['tournament', 'player', 'round_number'], name='playergame_tournament_player'),
+        ]
+
+class PlayerRating(models.Model):
+    """
+    Glicko-2 state of a player on one rating track: a time control, or 'overall' for every
+    rated game. A player has a row once rated on the track.
+    """
+    TRACK_CHOICES = Tournament.TIME_CONTROL_CHOICES + [('overall', 'Overall')]
+    
+    player = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ratings')
+    time_control = models.CharField(max_length=20, choices=TRACK_CHOICES)
+    rating = models.FloatField(default=1500)
+    rd = models.FloatField(default=350)
+    volatility = models.FloatField(default=0.06)
+    games = models.IntegerField(default=0)  # Rated games on this track
+    last_played = models.DateField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.player.username} - {self.time_control} - {self.rating:.0f}"
+    
+    class Meta:
+        unique_together = ('player', 'time_control')
+        indexes = [
+            # Leaderboards
+            models.Index(fields=['time_control', '-rating'], name='playerrating_leaderboard'),
+            # Active players of a track
+            models.Index(fields=['time_control', 'last_played'], name='playerrating_activity'),
+        ]
+
+class PlayerStats(models.Model):
+    """
+    Result counters of a player, over all games (time control 'all') and per time control.
+    Kept up to date by delta in player_stats_service; rebuild_player_stats recomputes them.
+    """
+    TRACK_CHOICES = [('all', 'All')] + Tournament.TIME_CONTROL_CHOICES
+    
+    player = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stats')
+    time_control = models.CharField(max_length=20, choices=TRACK_CHOICES, default='all')
+    games = models.IntegerField(default=0)  # Finished games, byes and forfeits included
+    white_wins = models.IntegerField(default=0)
+    white_losses = models.IntegerField(default=0)
+    white_draws = models.IntegerField(default=0)
+    black_wins = models.IntegerField(default=0)
+    black_losses = models.IntegerField(default=0)
+    black_draws = models.IntegerField(default=0)
+    tournaments_played = models.IntegerField(default=0)  # Completed tournaments only
+    tournaments_won = models.IntegerField(default=0)
+    silver_medals = models.IntegerField(default=0)
+    bronze_medals = models.IntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.player.username} - {self.time_control}"
+    
+    @property
+    def wins(self):
+        return self.white_wins + self.black_wins
+    
+    @property
+    def losses(self):
+        return self.white_losses + self.black_losses
+    
+    @property
+    def draws(self):
+        return self.white_draws + self.black_draws
+    
+    @property
+    def total_games(self):
+        """Games played over the board"""
+        return self.wins + self.losses + self.draws
+    
+    class Meta:
+        unique_together = ('player', 'time_control')
 
 class TournamentStanding(models.Model):
     tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name='standings')
@@ -185,12 +319,38 @@ class TournamentStanding(models.Model):
     rank = models.IntegerField(null=True, blank=True)
     previous_rank = models.IntegerField(null=True, blank=True)
     
+    # Tiebreaks, computed by tiebreak_service
+    direct_encounter = models.FloatField(default=0)
+    buchholz = models.FloatField(default=0)
+    median_buchholz = models.FloatField(default=0)
+    sonneborn_berger = models.FloatField(default=0)
+    progressive = models.FloatField(default=0)
+    
     class Meta:
         unique_together = ('tournament', 'player')
     
     def __str__(self):
         return f"{self.player.username} - {self.score} points"
 
+class StandingSnapshot(models.Model):
+    """
+    Standings of a tournament after a round, written once when the round completes.
+    Append-only: later corrections change TournamentStanding, not the snapshots.
+    """
+    tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name='standing_snapshots')
+    round = models.ForeignKey(Round, on_delete=models.CASCADE, related_name='standing_snapshots')
+    player = models.ForeignKey(User, on_delete=models.CASCADE, related_name='standing_snapshots')
+    score = models.FloatField()
+    rank = models.IntegerField()
+    tiebreaks = models.JSONField(default=dict)
+    
+    def __str__(self):
+        return f"{self.player.username} - {self.round} - rank {self.rank}"
+    
+    class Meta:
+        unique_together = ('round', 'player')
+        indexes = [models.Index(fields=['player', 'tournament'])]
+
 class PlayerRatingHistory(models.Model):
     """
     Model to track player rating history after each tournament
@@ -208,6 +368,45 @@ class PlayerRatingHistory(models.Model):
         unique_together = ('player', 'tournament')
         ordering = ['date']
 
+class RatingChange(models.Model):
+    """
+    Ledger of the rating state of a player before and after a rated game.
+    Used to reverse or correct exactly the effect of one game.
+    """
+    TRACK_CHOICES = Tournament.TIME_CONTROL_CHOICES + [('overall', 'Overall')]
+    
+    match = models.ForeignKey(Match, on_delete=models.CASCADE, related_name='rating_changes')
+    player = models.ForeignKey(User, on_delete=models.CASCADE, related_name='rating_changes')
+    time_control = models.CharField(max_length=20, choices=TRACK_CHOICES)
+    score = models.FloatField()  # Score of the player in this game
+    rating_before = models.FloatField()
+    rd_before = models.FloatField()
+    volatility_before = models.FloatField()
+    rating_after = models.FloatField()
+    rd_after = models.FloatField()
+    volatility_after = models.FloatField()
+    
+    def __str__(self):
+        return f"{self.player.username} - {self.time_control} - {self.rating_before:.0f} -> {self.rating_after:.0f}"
+    
+    class Meta:
+        unique_together = ('match', 'player', 'time_control')
+
+class RatingCheckpoint(models.Model):
+    """
+    Snapshot of every player's rating state after all games up to a date.
+    Lets a rating replay start from here instead of from the first game.
+    """
+    as_of = models.DateField(unique=True)  # Includes all tournaments on or before this date
+    created_at = models.DateTimeField(auto_now_add=True)
+    state = models.JSONField()
+    
+    def __str__(self):
+        return f"Rating checkpoint {self.as_of}"
+    
+    class Meta:
+        ordering = ['as_of']
+
 class Achievement(models.Model):
     """Model to track player achievements and trophies"""
     ACHIEVEMENT_TYPES = [
@@ -543,150 +742,128 @@ class Achievement(models.Model):
         }
         return colors.get(self.achievement_type, 'teal')  # Default color
 
-# Glicko-2 implementation functions
-def update_glicko2_ratings(match):
-
-    if match.result in ['white_forfeit', 'black_forfeit']:
-        return  # Exit the function early - no rating changes
-    
-    """Update Glicko-2 ratings based on match result and time control"""
-    white_player = match.white_player
-    black_player = match.black_player
-    time_control = match.tournament.time_control
-    
-    # Determine which rating fields to use
-    if time_control == 'bullet':
-        white_rating = (white_player.bullet_elo - 1500) / 173.7178
-        white_rd = white_player.bullet_rd / 173.7178
-        black_rating = (black_player.bullet_elo - 1500) / 173.7178
-        black_rd = black_player.bullet_rd / 173.7178
-    elif time_control == 'blitz':
-        white_rating = (white_player.blitz_elo - 1500) / 173.7178
-        white_rd = white_player.blitz_rd / 173.7178
-        black_rating = (black_player.blitz_elo - 1500) / 173.7178
-        black_rd = black_player.blitz_rd / 173.7178
-    elif time_control == 'rapid':
-        white_rating = (white_player.rapid_elo - 1500) / 173.7178
-        white_rd = white_player.rapid_rd / 173.7178
-        black_rating = (black_player.rapid_elo - 1500) / 173.7178
-        black_rd = black_player.rapid_rd / 173.7178
-    elif time_control == 'classical':
-        white_rating = (white_player.classical_elo - 1500) / 173.7178
-        white_rd = white_player.classical_rd / 173.7178
-        black_rating = (black_player.classical_elo - 1500) / 173.7178
-        black_rd = black_player.classical_rd / 173.7178
+class AchievementProgress(models.Model):
+    """
+    How far check_achievements has folded a player's history, and the state of every
+    achievement rule at that point. The watermark is the last of a player's tournaments
+    up to which all of them are completed; only what comes after it is read again.
+    """
+    player = models.OneToOneField(User, on_delete=models.CASCADE, related_name='achievement_progress')
+    tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name='+')  # Last tournament folded
+    match = models.ForeignKey(Match, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')  # Last game folded
+    date = models.DateField()  # Date of that tournament; the watermark is (date, tournament id)
+    tournaments = models.IntegerField()  # Completed tournaments up to the watermark
+    state = models.JSONField(default=dict)  # Rule name -> rule state
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.player.username} - achievements up to {self.date}"
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_leaderboard_handler(sender, instance, update_fields=None, **kwargs):
+    """Refresh the cached leaderboards when a player shown on them may have changed"""
+    from .cache_service import bump_ratings_version
+    from .leaderboard_service import LEADERBOARD_FIELDS
+    if update_fields is None or LEADERBOARD_FIELDS & set(update_fields):
+        bump_ratings_version()
+
+@receiver(post_save, sender=User)
+def user_profile_handler(sender, instance, update_fields=None, **kwargs):
+    """Refresh the cached fragments of a player's profile when a field shown on it may have changed"""
+    from .cache_service import PROFILE_FIELDS, bump_player_versions
+    if update_fields is None or PROFILE_FIELDS & set(update_fields):
+        bump_player_versions([instance.pk])
+
+@receiver(post_save, sender=Tournament)
+def tournament_cache_handler(sender, instance, created, update_fields=None, **kwargs):
+    """Refresh the cached fragments of a tournament, and the profiles that list it"""
+    from .cache_service import bump_player_versions, bump_tournament_version
+    bump_tournament_version(instance.pk)
+    if not created and (update_fields is None or {'name', 'date', 'is_completed'} & set(update_fields)):
+        bump_player_versions(instance.participants.values_list('id', flat=True))
+
+@receiver(post_save, sender=Round)
+@receiver(post_delete, sender=Round)
+def round_cache_handler(sender, instance, **kwargs):
+    """Refresh the cached fragments of the tournament a round belongs to"""
+    from .cache_service import bump_tournament_version
+    bump_tournament_version(instance.tournament_id)
+
+@receiver(post_save, sender=Achievement)
+@receiver(post_delete, sender=Achievement)
+def achievement_cache_handler(sender, instance, **kwargs):
+    """Refresh the cached achievement fragments of a player's profile"""
+    from .cache_service import bump_player_versions
+    bump_player_versions([instance.user_id])
+
+def deleted_match_ids(origin):
+    """
+    The ids of all matches a delete started from origin removes, or None when origin
+    is not a match, round or tournament (or a queryset of them)
+    """
+    lookups = {Match: 'pk__in', Round: 'round__in', Tournament: 'tournament__in'}
+    if isinstance(origin, models.QuerySet):
+        lookup = lookups.get(origin.model)
+        return list(Match.objects.filter(**{lookup: origin}).values_list('id', flat=True)) if lookup else None
+    lookup = lookups.get(type(origin))
+    return list(Match.objects.filter(**{lookup: [origin.pk]}).values_list('id', flat=True)) if lookup else None
+
+@receiver(pre_delete, sender=Match)
+def match_pre_delete_handler(sender, instance, origin=None, **kwargs):
+    """
+    Take back the rating changes and statistics of games before they are deleted.
+    Deleting a round, a tournament or a queryset does this once for all of its
+    matches, when the first of them is about to go.
+    """
+    if getattr(origin, 'matches_taken_back', False):
+        return
+    from .rating_service import take_back_matches
+    match_ids = deleted_match_ids(origin)
+    if match_ids is None:
+        match_ids = [instance.pk]
     else:
-        # Fallback to general rating
-        white_rating = (white_player.elo - 1500) / 173.7178
-        white_rd = white_player.rd / 173.7178
-        black_rating = (black_player.elo - 1500) / 173.7178
-        black_rd = black_player.rd / 173.7178
-    
-    # System constants
-    tau = 0.5  # Volatility parameter
-    
-    # Determine white_outcome and black_outcome based on match result
-    if match.result == 'white_win':
-        white_outcome = 1
-        black_outcome = 0
-    elif match.result == 'black_win':
-        white_outcome = 0
-        black_outcome = 1
-    else:  # Draw
-        white_outcome = 0.5
-        black_outcome = 0.5
-    
-    # Function to calculate g(RD)
-    def g(rd):
-        return 1 / math.sqrt(1 + (3 * rd ** 2) / (math.pi ** 2))
-    
-    # Function to calculate E (expected outcome)
-    def E(player_rating, opponent_rating, opponent_rd):
-        return 1 / (1 + math.exp(-g(opponent_rd) * (player_rating - opponent_rating)))
-    
-    # Calculate new white player rating
-    g_black_rd = g(black_rd)
-    E_white = E(white_rating, black_rating, black_rd)
-    v_white = 1 / (g_black_rd**2 * E_white * (1 - E_white))
-    
-    # Calculate delta for white
-    delta_white = v_white * g_black_rd * (white_outcome - E_white)
-    
-    # Calculate new volatility for white
-    # ... (this part is complex and requires implementation of the volatility update algorithm)
-    # For simplicity, we'll use a fixed volatility here, but a complete implementation would update it
-    new_white_volatility = white_player.volatility
-    
-    # Calculate new RD for white
-    new_white_rd = math.sqrt(1 / ((1 / (white_rd**2)) + (1 / v_white)))
-    
-    # Calculate new rating for white
-    new_white_rating = white_rating + new_white_rd**2 * g_black_rd * (white_outcome - E_white)
-    
-    # Calculate new black player rating
-    g_white_rd = g(white_rd)
-    E_black = E(black_rating, white_rating, white_rd)
-    v_black = 1 / (g_white_rd**2 * E_black * (1 - E_black))
-    
-    # Calculate delta for black
-    delta_black = v_black * g_white_rd * (black_outcome - E_black)
-    
-    # Calculate new volatility for black
-    # ... (volatility update would go here)
-    new_black_volatility = black_player.volatility
-    
-    # Calculate new RD for black
-    new_black_rd = math.sqrt(1 / ((1 / (black_rd**2)) + (1 / v_black)))
-    
-    # Calculate new rating for black
-    new_black_rating = black_rating + new_black_rd**2 * g_white_rd * (black_outcome - E_black)
-    
-    # Update the appropriate rating fields based on time control
-    if time_control == 'bullet':
-        white_player.bullet_elo = (new_white_rating * 173.7178) + 1500
-        white_player.bullet_rd = new_white_rd * 173.7178
-        white_player.bullet_volatility = new_white_volatility
-        
-        black_player.bullet_elo = (new_black_rating * 173.7178) + 1500
-        black_player.bullet_rd = new_black_rd * 173.7178
-        black_player.bullet_volatility = new_black_volatility
-    elif time_control == 'blitz':
-        white_player.blitz_elo = (new_white_rating * 173.7178) + 1500
-        white_player.blitz_rd = new_white_rd * 173.7178
-        white_player.blitz_volatility = new_white_volatility
-        
-        black_player.blitz_elo = (new_black_rating * 173.7178) + 1500
-        black_player.blitz_rd = new_black_rd * 173.7178
-        black_player.bullet_volatility = new_black_volatility
-    elif time_control == 'rapid':
-        white_player.rapid_elo = (new_white_rating * 173.7178) + 1500
-        white_player.rapid_rd = new_white_rd * 173.7178
-        white_player.rapid_volatility = new_white_volatility
-
-        black_player.rapid_elo = (new_black_rating * 173.7178) + 1500
-        black_player.rapid_rd = new_black_rd * 173.7178
-        black_player.rapid_volatility = new_black_volatility
-    elif time_control == 'classical':
-        white_player.classical_elo = (new_white_rating * 173.7178) + 1500
-        white_player.classical_rd = new_white_rd * 173.7178
-        white_player.classical_volatility = new_white_volatility
-
-        black_player.classical_elo = (new_black_rating * 173.7178) + 1500
-        black_player.classical_rd = new_black_rd * 173.7178
-        black_player.classical_volatility = new_black_volatility
-
-    
-    # Also update the general rating for backward compatibility
-    white_player.elo = (new_white_rating * 173.7178) + 1500
-    white_player.rd = new_white_rd * 173.7178
-    white_player.volatility = new_white_volatility
-    
-    black_player.elo = (new_black_rating * 173.7178) + 1500
-    black_player.rd = new_black_rd * 173.7178
-    black_player.volatility = new_black_volatility
-    
-    white_player.save()
-    black_player.save()
+        origin.matches_taken_back = True
+    take_back_matches(match_ids)
+
+@receiver(pre_delete, sender=Tournament)
+def tournament_pre_delete_handler(sender, instance, **kwargs):
+    """Take a completed tournament out of the placings counted in its players' statistics"""
+    from .cache_service import bump_player_versions
+    bump_player_versions(instance.participants.values_list('id', flat=True))
+    if instance.is_completed:
+        from .player_stats_service import credit_tournament
+        credit_tournament(instance, sign=-1)
+
+@receiver(m2m_changed, sender=Tournament.participants.through)
+def tournament_participants_changed_handler(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep the stored participant count in step with registrations"""
+    if action == 'pre_clear':
+        # A clear does not say which rows it removes, so note them before they go
+        instance.cleared_pks = set(sender.objects.filter(
+            **{'user_id' if reverse else 'tournament_id': instance.pk}
+        ).values_list('tournament_id' if reverse else 'user_id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if action == 'post_clear':
+        pk_set = getattr(instance, 'cleared_pks', set())
+    from .cache_service import bump_player_versions, bump_tournament_version
+    if reverse:
+        bump_player_versions([instance.pk])
+        bump_tournament_version(*pk_set)
+    else:
+        bump_tournament_version(instance.pk)
+        bump_player_versions(pk_set)
+    if not reverse:
+        instance.participant_count = instance.participants.count()
+        Tournament.objects.filter(pk=instance.pk).update(participant_count=instance.participant_count)
+        return
+    # Changed from the player's side: recount only the tournaments that were affected
+    counts = sender.objects.filter(tournament_id=OuterRef('pk')).values('tournament_id').annotate(
+        count=Count('pk')
+    ).values('count')
+    Tournament.objects.filter(pk__in=pk_set).update(participant_count=Coalesce(Subquery(counts), 0))
 
 @receiver(social_account_added)
 def social_account_added_handler(request, sociallogin, **kwargs):
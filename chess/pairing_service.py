@@ -0,0 +1,464 @@
+"""
+Pairing engine.
+
+TournamentState loads everything pairing needs about a tournament in two queries.
+The pairing functions below are pure: they take the state and return pairings,
+the caller writes the matches.
+
+A Swiss round is paired by building a cost graph over the whole field and solving it with a
+maximum-weight perfect matching (Edmonds' blossom algorithm). Every candidate edge costs
+the sum of its score difference, colour preference violations, repeated floats and the
+distance from the Dutch top-half/bottom-half pairing. Rematches are never an edge.
+An odd field gets an extra bye node, so the bye is chosen together with the pairings.
+"""
+import bisect
+import logging
+
+import rustworkx as rx
+
+
+# Cost weights, from most to least important. As in the FIDE rules an absolute colour
+# preference outweighs any score difference; mild and strong ones come after it.
+SCORE_WEIGHT = 100000                     # per (half-point score difference) squared
+COLOR_WEIGHTS = {1: 500, 2: 5000, 3: 10 ** 9}  # mild / strong / absolute preference not met
+FLOAT_WEIGHT = 2000                       # floating in the same direction as last round
+RANK_WEIGHT = 10                          # per board away from the Dutch S1 vs S2 partner
+REMATCH_COST = 10 ** 9                    # only used when no pairing without rematches exists
+
+# Edge weight = BASE_WEIGHT - cost, so the maximum-weight matching is the cheapest one
+BASE_WEIGHT = 10 ** 12
+
+# Candidate opponents each player gets on either side of the ordering (and of the Dutch partner)
+INITIAL_BAND = 12
+
+
+# Points (white, black) awarded for each match result, see match_points
+MATCH_POINTS = {
+    'white_win': (1, 0),
+    'black_win': (0, 1),
+    'draw': (0.5, 0.5),
+    'bye': (1, 0),
+    'white_forfeit': (0, 1),
+    'black_forfeit': (1, 0),
+}
+
+
+def match_points(result, has_opponent=True):
+    """
+    Points (white, black) of a match result. Without an opponent only a bye scores;
+    any other result there is worth nothing. Pending games are worth nothing.
+    """
+    if not has_opponent and result != 'bye':
+        return (0, 0)
+    return MATCH_POINTS.get(result, (0, 0))
+
+
+class PlayerRecord:
+    """Pairing history of one player in a tournament"""
+    __slots__ = (
+        'player', 'score', 'opponents', 'colors', 'color_diff', 'color_pref', 'float_history', 'received_bye'
+    )
+
+    def __init__(self, player):
+        self.player = player
+        self.score = 0
+        self.opponents = set()    # IDs of previous opponents
+        self.colors = []          # 'W' or 'B' for every game played
+        self.color_diff = 0       # #White - #Black
+        # 0=neutral, +ve=white preference, -ve=black preference
+        # Magnitude: 1=mild, 2=strong (2 same in row), 3=absolute (CD >= |2|)
+        self.color_pref = 0
+        self.float_history = []   # 'up', 'down' or None for every previous round
+        self.received_bye = False
+
+    def update_color_pref(self):
+        """Colour preference following the FIDE rules"""
+        if self.color_diff >= 2:
+            self.color_pref = -3
+        elif self.color_diff <= -2:
+            self.color_pref = 3
+        elif self.color_diff == 1:
+            self.color_pref = -1
+        elif self.color_diff == -1:
+            self.color_pref = 1
+        else:
+            self.color_pref = 0
+
+        # Two of the same colour in a row takes precedence
+        if self.colors[-2:] == ['W', 'W']:
+            self.color_pref = -2
+        elif self.colors[-2:] == ['B', 'B']:
+            self.color_pref = 2
+
+
+class TournamentState:
+    """Scores, opponents, colours, floats and byes of every participant"""
+
+    def __init__(self, players):
+        self.records = {player.id: PlayerRecord(player) for player in players}
+
+    @classmethod
+    def load(cls, tournament):
+        """Load the state of a tournament: one query for the participants, one for the matches"""
+        from .models import Match
+
+        state = cls(tournament.participants.all())
+
+        round_games = []
+        current_round = None
+        for round_number, white_id, black_id, result in Match.objects.filter(
+            tournament=tournament
+        ).order_by('round__number').values_list('round__number', 'white_player_id', 'black_player_id', 'result'):
+            if round_number != current_round and round_games:
+                state.add_round(round_games)
+                round_games = []
+            current_round = round_number
+            round_games.append((white_id, black_id, result))
+        if round_games:
+            state.add_round(round_games)
+
+        return state
+
+    def players(self):
+        return [record.player for record in self.records.values()]
+
+    def add_round(self, games):
+        """Add one round of (white_id, black_id, result) games, in the order they were played"""
+        records = self.records
+        points = []
+
+        for white_id, black_id, result in games:
+            white = records.get(white_id)
+            black = records.get(black_id)
+            white_points, black_points = match_points(result, black_id is not None)
+
+            # A bye counts as a float down
+            if black_id is None:
+                if white:
+                    white.float_history.append('down' if result == 'bye' else None)
+                    white.received_bye = white.received_bye or result == 'bye'
+                    points.append((white, white_points))
+                continue
+
+            if not white or not black:
+                continue
+
+            white.opponents.add(black_id)
+            black.opponents.add(white_id)
+            white.colors.append('W')
+            black.colors.append('B')
+            white.color_diff += 1
+            black.color_diff -= 1
+
+            # The player with more points floated down, the other one up
+            white.float_history.append(
+                'down' if white.score > black.score else 'up' if white.score < black.score else None
+            )
+            black.float_history.append(
+                'down' if black.score > white.score else 'up' if black.score < white.score else None
+            )
+
+            points.append((white, white_points))
+            points.append((black, black_points))
+
+        # Scores change only after every float of the round has been recorded
+        for record, record_points in points:
+            record.score += record_points
+            record.update_color_pref()
+
+
+def pair_swiss(state, round_number):
+    """
+    Pairings for a Swiss round following the FIDE Dutch system.
+    Returns (pairings, bye_player).
+    """
+    records = sorted(state.records.values(), key=lambda r: (-r.player.elo, r.player.id))
+
+    # Exactly two players: alternate colours every round
+    if len(records) == 2:
+        first, second = records
+        if first.colors and round_number % 2 == 0:
+            # Reverse the colours of the latest game
+            return ([(first.player, second.player)] if first.colors[-1] == 'B'
+                    else [(second.player, first.player)]), None
+        return [(first.player, second.player)], None
+
+    # First round: top half against bottom half by rating, the middle player gets the bye
+    if round_number == 1:
+        players = [record.player for record in records]
+        bye_player = players.pop(len(players) // 2) if len(players) % 2 else None
+        midpoint = len(players) // 2
+        top_half = players[:midpoint]
+        bottom_half = players[midpoint:]
+
+        # Alternate colours by board so later rounds have balanced colour histories
+        pairings = [
+            (top_half[i], bottom_half[i]) if i % 2 == 0 else (bottom_half[i], top_half[i])
+            for i in range(midpoint)
+        ]
+        return pairings, bye_player
+
+    return pair_swiss_round(records)
+
+
+def pair_round_robin(state, round_number, double=False):
+    """
+    Pairings for one round of a (double) round robin from the Berger table.
+    Returns (pairings, bye_player).
+    """
+    # Sort by rating for deterministic behaviour
+    participants = sorted(state.players(), key=lambda p: (p.elo, p.id))
+    n = len(participants)
+
+    if n == 0:
+        return [], None
+
+    # Two players alternate colours every round
+    if n == 2:
+        if round_number % 2 == 1:
+            return [(participants[0], participants[1])], None
+        return [(participants[1], participants[0])], None
+
+    # For an odd number of participants each player needs n rounds, otherwise n - 1
+    needed_rounds = n if n % 2 == 1 else n - 1
+    if double:
+        needed_rounds *= 2
+    if round_number > needed_rounds:
+        logging.warning(f"Creating round {round_number} but only {needed_rounds} rounds needed for {n} players")
+
+    # A dummy player (None) gives the bye
+    if n % 2 == 1:
+        participants.append(None)
+        n += 1
+
+    # The second cycle of a double round robin reverses the colours of the first
+    is_second_cycle = double and round_number > (n - 1)
+    effective_round = round_number if not is_second_cycle else round_number - (n - 1)
+
+    # Berger table: the last player is fixed, players x and y of the others meet in the
+    # round where x + y = round (mod n - 1) and the one who would meet themselves plays
+    # the fixed player. White goes to x when (y - x) mod (n - 1) is odd, which makes
+    # every player's colours alternate from round to round.
+    m = n - 1
+    r = effective_round - 1
+    games = []
+    for x in range(m):
+        y = (r - x) % m
+        if y == x:
+            # The fixed player alternates colours by round
+            games.append((participants[m], participants[x]) if r % 2 == 0 else (participants[x], participants[m]))
+        elif x < y:
+            games.append((participants[x], participants[y]) if (y - x) % m % 2 == 1 else (participants[y], participants[x]))
+
+    pairings = []
+    bye_player = None
+    for player1, player2 in games:
+        if player1 is None or player2 is None:
+            bye_player = player2 if player1 is None else player1
+            continue
+
+        if not is_second_cycle and player2.id in state.records[player1.id].opponents:
+            logging.warning(f"Players {player1.username} and {player2.username} already played - creating rematch")
+
+        pairings.append((player2, player1) if is_second_cycle else (player1, player2))
+
+    return pairings, bye_player
+
+
+
+def pair_swiss_round(players):
+    """
+    Pair one Swiss round.
+
+    players: list of PlayerRecord.
+
+    Returns (pairings, bye_player) where pairings is a list of (white, black) users in board order.
+    """
+    ordered = sorted(players, key=lambda p: (-p.score, -p.player.elo, p.player.id))
+    n = len(ordered)
+    if n < 2:
+        return [], (ordered[0].player if ordered else None)
+
+    positions = group_positions(ordered)
+    bye_node = n if n % 2 else None
+    needed = (n + 1) // 2
+
+    # --- STEP 1: Solve on a sparse candidate band, widening it until everyone is paired ---
+    band = INITIAL_BAND
+    while True:
+        full = band >= n
+        edges = candidate_edges(ordered, positions, band, allow_rematches=False)
+        matching = solve(n, edges, bye_edges(ordered) if bye_node is not None else [])
+        if len(matching) == needed or full:
+            break
+        band *= 2
+
+    # --- STEP 2: Last resort, allow rematches rather than leave players unpaired ---
+    if len(matching) < needed:
+        edges = candidate_edges(ordered, positions, n, allow_rematches=True)
+        matching = solve(n, edges, bye_edges(ordered) if bye_node is not None else [])
+
+    # --- STEP 3: Colours and board order ---
+    pairings = []
+    bye_player = None
+    for i, j in sorted((min(a, b), max(a, b)) for a, b in matching):
+        if j == bye_node:
+            bye_player = ordered[i].player
+            continue
+        pairings.append(allocate_colors(ordered[i], ordered[j]))
+
+    return pairings, bye_player
+
+
+def solve(n, edges, bye_edges):
+    graph = rx.PyGraph()
+    graph.add_nodes_from(range(n + 1 if bye_edges else n))
+    graph.add_edges_from(edges)
+    graph.add_edges_from(bye_edges)
+    return rx.max_weight_matching(graph, max_cardinality=True, weight_fn=int)
+
+
+def group_positions(ordered):
+    """(position in score group, score group size) for every player in pairing order"""
+    positions = []
+    start = 0
+    while start < len(ordered):
+        end = start
+        while end < len(ordered) and ordered[end].score == ordered[start].score:
+            end += 1
+        positions.extend((i - start, end - start) for i in range(start, end))
+        start = end
+    return positions
+
+
+def candidate_edges(ordered, positions, band, allow_rematches):
+    """
+    Weighted edges between each player and the players within `band` places of them,
+    the players around their Dutch partner (the same place in the other half of their
+    score group) and, for players who can only take one colour, the nearest players
+    who can take the other one.
+    """
+    n = len(ordered)
+    pairs = set()
+    for i in range(n):
+        position, size = positions[i]
+        pairs.update((i, j) for j in range(i + 1, min(n, i + band + 1)))
+        half = size // 2
+        partner = i + half if position < half else i - half
+        pairs.update((i, j) for j in range(max(i + 1, partner - band // 2), min(n, partner + band // 2 + 1)))
+
+    # Players whose absolute colour preference allows only white or only black
+    only = {
+        color: [i for i in range(n) if color_violation(ordered[i], other) >= COLOR_WEIGHTS[3]]
+        for color, other in (('W', 'B'), ('B', 'W'))
+    }
+    for color, other in (('W', 'B'), ('B', 'W')):
+        blocked = set(only[color])
+        compatible = [j for j in range(n) if j not in blocked]
+        for i in only[color]:
+            k = bisect.bisect_left(compatible, i)
+            for j in compatible[max(0, k - band):k + band]:
+                pairs.add((min(i, j), max(i, j)))
+
+    edges = []
+    for i, j in pairs:
+        if i == j:
+            continue
+        rematch = ordered[j].player.id in ordered[i].opponents
+        if rematch and not allow_rematches:
+            continue
+        cost = pair_cost(ordered[i], ordered[j], positions[i][1], j - i)
+        if rematch:
+            cost += REMATCH_COST
+        edges.append((i, j, BASE_WEIGHT - cost))
+    return edges
+
+
+def bye_edges(ordered):
+    """Edges to the bye node: lowest score first, then lowest rated, one bye per player"""
+    n = len(ordered)
+    eligible = [i for i in range(n) if not ordered[i].received_bye] or list(range(n))
+    lowest = min(ordered[i].score for i in eligible)
+    edges = []
+    for i in eligible:
+        half_points = round(2 * (ordered[i].score - lowest))
+        cost = SCORE_WEIGHT * half_points * half_points + RANK_WEIGHT * (n - 1 - i)
+        edges.append((i, n, BASE_WEIGHT - cost))
+    return edges
+
+
+def pair_cost(higher, lower, group_size, distance):
+    """Cost of pairing two players `distance` places apart, `higher` being the one ranked higher"""
+    half_points = round(2 * (higher.score - lower.score))
+    cost = SCORE_WEIGHT * half_points * half_points
+
+    cost += min(
+        color_violation(higher, 'W') + color_violation(lower, 'B'),
+        color_violation(higher, 'B') + color_violation(lower, 'W'),
+    )
+
+    if half_points:
+        # The higher player floats down and the lower one floats up
+        if higher.float_history and higher.float_history[-1] == 'down':
+            cost += FLOAT_WEIGHT
+        if lower.float_history and lower.float_history[-1] == 'up':
+            cost += FLOAT_WEIGHT
+    else:
+        cost += RANK_WEIGHT * abs(distance - group_size // 2)
+
+    return cost
+
+
+def color_violation(info, color):
+    """Cost of giving a player the colour, absolute when it would mean three in a row or |CD| > 2"""
+    pref = info.color_pref
+    if not ((pref > 0 and color == 'B') or (pref < 0 and color == 'W')):
+        return 0
+    color_diff = info.color_diff + (1 if color == 'W' else -1)
+    if abs(color_diff) > 2 or info.colors[-2:] == [color, color]:
+        return COLOR_WEIGHTS[3]
+    return COLOR_WEIGHTS[min(abs(pref), 3)]
+
+
+def allocate_colors(s1, s2):
+    """
+    Colour allocation following the FIDE rules, s1 being the higher ranked player.
+    Returns (white_player, black_player).
+    """
+    # Never break an absolute preference the matching was able to respect
+    s1_white = color_violation(s1, 'W') + color_violation(s2, 'B')
+    s2_white = color_violation(s1, 'B') + color_violation(s2, 'W')
+    if s1_white != s2_white:
+        return (s1.player, s2.player) if s1_white < s2_white else (s2.player, s1.player)
+
+    p1 = s1.player
+    p2 = s2.player
+    pref1 = s1.color_pref
+    pref2 = s2.color_pref
+
+    # Opposite preferences: satisfy both
+    if pref1 * pref2 < 0:
+        return (p1, p2) if pref1 > 0 else (p2, p1)
+
+    # Only one player has a preference: satisfy it
+    if pref1 != 0 and pref2 == 0:
+        return (p1, p2) if pref1 > 0 else (p2, p1)
+    if pref1 == 0 and pref2 != 0:
+        return (p2, p1) if pref2 > 0 else (p1, p2)
+
+    # Same preference: the stronger one wins, then the larger colour imbalance
+    if pref1 != 0 and pref2 != 0:
+        if abs(pref1) != abs(pref2):
+            stronger, pref = (p1, pref1) if abs(pref1) > abs(pref2) else (p2, pref2)
+            other = p2 if stronger is p1 else p1
+            return (stronger, other) if pref > 0 else (other, stronger)
+        if abs(s1.color_diff) > abs(s2.color_diff):
+            return (p2, p1) if s1.color_diff > 0 else (p1, p2)
+        return (p1, p2) if s2.color_diff > 0 else (p2, p1)
+
+    # Both neutral: alternate from the last game, the higher ranked player first
+    if s1.colors:
+        return (p2, p1) if s1.colors[-1] == 'W' else (p1, p2)
+    if s2.colors:
+        return (p1, p2) if s2.colors[-1] == 'W' else (p2, p1)
+    return p1, p2
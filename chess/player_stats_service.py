@@ -0,0 +1,293 @@
+"""
+Per-player game records and statistics counters.
+
+Every Match is mirrored into one PlayerGame row per player, seen from that player's side.
+PlayerStats holds the counters that pages show. They are kept up to date by delta: whenever
+the PlayerGame rows of a match are rewritten, or the placings of a completed tournament
+change, only the difference is added, in the same transaction. rebuild_player_stats
+recomputes everything from PlayerGame and the standings.
+"""
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+
+from .achievement_service import reset_achievement_progress
+from .cache_service import bump_player_versions, bump_tournament_version
+from .pairing_service import match_points
+
+
+# Result of a match from the side of the (white, black) player
+PLAYER_RESULTS = {
+    'white_win': ('win', 'loss'),
+    'black_win': ('loss', 'win'),
+    'draw': ('draw', 'draw'),
+    'bye': ('bye', None),
+    'white_forfeit': ('forfeit_loss', 'forfeit_win'),
+    'black_forfeit': ('forfeit_win', 'forfeit_loss'),
+    'pending': ('pending', 'pending'),
+}
+
+# PlayerStats game counters, as aggregates over PlayerGame
+GAME_COUNTS = {
+    'games': Count('id', filter=~Q(result='pending')),
+    'white_wins': Count('id', filter=Q(result='win', color='white')),
+    'white_losses': Count('id', filter=Q(result='loss', color='white')),
+    'white_draws': Count('id', filter=Q(result='draw', color='white')),
+    'black_wins': Count('id', filter=Q(result='win', color='black')),
+    'black_losses': Count('id', filter=Q(result='loss', color='black')),
+    'black_draws': Count('id', filter=Q(result='draw', color='black')),
+}
+
+# Suffix of the per-colour PlayerStats counter for each game result
+COLOR_COUNTERS = {
+    'win': 'wins',
+    'loss': 'losses',
+    'draw': 'draws',
+}
+
+# PlayerStats counter for each final rank of a completed tournament
+PLACING_COUNTERS = {
+    1: 'tournaments_won',
+    2: 'silver_medals',
+    3: 'bronze_medals',
+}
+
+
+def sync_player_games(match_ids):
+    """Rewrite the PlayerGame rows of the given matches from their current state"""
+    from .models import Match, PlayerGame
+
+    match_ids = list(match_ids)
+    if not match_ids:
+        return []
+
+    games = []
+    for match_id, tournament_id, white_id, black_id, result, round_number, date, time_control in Match.objects.filter(
+        pk__in=match_ids
+    ).values_list(
+        'id', 'tournament_id', 'white_player_id', 'black_player_id', 'result',
+        'round__number', 'tournament__date', 'tournament__time_control'
+    ):
+        white_result, black_result = PLAYER_RESULTS[result]
+        white_score, black_score = match_points(result, black_id is not None)
+        shared = {
+            'match_id': match_id,
+            'tournament_id': tournament_id,
+            'date': date,
+            'round_number': round_number,
+            'time_control': time_control,
+        }
+        games.append(PlayerGame(
+            player_id=white_id, opponent_id=black_id, color='white', result=white_result, score=white_score, **shared
+        ))
+        if black_id:
+            games.append(PlayerGame(
+                player_id=black_id, opponent_id=white_id, color='black', result=black_result, score=black_score, **shared
+            ))
+
+    with transaction.atomic():
+        previous = PlayerGame.objects.filter(match_id__in=match_ids)
+        previous_games = list(previous.values_list('player_id', 'time_control', 'color', 'result'))
+        deltas = {}
+        add_game_deltas(deltas, previous_games, -1)
+        add_game_deltas(deltas, ((g.player_id, g.time_control, g.color, g.result) for g in games), 1)
+        previous.delete()
+        PlayerGame.objects.bulk_create(games)
+        refresh_player_game_ratings(match_ids)
+        apply_stat_deltas(deltas)
+
+    players = {game[0] for game in previous_games} | {game.player_id for game in games}
+    if games:
+        reset_achievement_progress(players, min(game.date for game in games))
+    bump_tournament_version(*{game.tournament_id for game in games})
+    bump_player_versions(players)
+    return games
+
+
+def remove_player_games(match_ids):
+    """Take the PlayerGame rows of matches that are about to be deleted out of the counters"""
+    from .models import PlayerGame
+
+    with transaction.atomic():
+        previous = PlayerGame.objects.filter(match_id__in=list(match_ids))
+        previous_games = list(previous.values_list('player_id', 'time_control', 'color', 'result', 'tournament_id', 'date'))
+        deltas = {}
+        add_game_deltas(deltas, (game[:4] for game in previous_games), -1)
+        previous.delete()
+        apply_stat_deltas(deltas)
+
+    if previous_games:
+        reset_achievement_progress({game[0] for game in previous_games}, min(game[5] for game in previous_games))
+    bump_tournament_version(*{game[4] for game in previous_games})
+    bump_player_versions({game[0] for game in previous_games})
+
+
+def refresh_player_game_ratings(match_ids=None):
+    """
+    Copy the ratings before and after each game from the RatingChange ledger, in one UPDATE.
+    Without match_ids every PlayerGame row is refreshed.
+    """
+    from .models import PlayerGame, RatingChange
+
+    ledger = RatingChange.objects.filter(
+        match_id=OuterRef('match_id'),
+        player_id=OuterRef('player_id'),
+        time_control=OuterRef('time_control')
+    )
+    games = PlayerGame.objects.all() if match_ids is None else PlayerGame.objects.filter(match_id__in=match_ids)
+    games.update(
+        rating_before=Subquery(ledger.values('rating_before')[:1]),
+        rating_after=Subquery(ledger.values('rating_after')[:1])
+    )
+
+
+def add_game_deltas(deltas, games, sign):
+    """Add the counters of (player_id, time_control, color, result) games, times sign, to deltas"""
+    for player_id, time_control, color, result in games:
+        counters = deltas.setdefault((player_id, time_control), {})
+        if result != 'pending':
+            counters['games'] = counters.get('games', 0) + sign
+        if result in COLOR_COUNTERS:
+            field = f"{color}_{COLOR_COUNTERS[result]}"
+            counters[field] = counters.get(field, 0) + sign
+
+
+def add_placing_deltas(deltas, player_id, time_control, rank, sign, played=False):
+    """Add the counters of one final placing, times sign, to deltas"""
+    counters = deltas.setdefault((player_id, time_control), {})
+    if played:
+        counters['tournaments_played'] = counters.get('tournaments_played', 0) + sign
+    field = PLACING_COUNTERS.get(rank)
+    if field:
+        counters[field] = counters.get(field, 0) + sign
+
+
+def apply_stat_deltas(deltas):
+    """
+    Add {(player_id, time_control): {field: delta}} to PlayerStats, both to the time control
+    and to the overall counters. Missing rows are created first; rows that change by the same
+    deltas share one UPDATE with F() expressions, so concurrent updates do not overwrite each other.
+    """
+    from .models import PlayerStats
+
+    combined = {}
+    for (player_id, time_control), counters in deltas.items():
+        for track in (time_control, 'all'):
+            target = combined.setdefault((player_id, track), {})
+            for field, delta in counters.items():
+                target[field] = target.get(field, 0) + delta
+    combined = {
+        key: {field: delta for field, delta in counters.items() if delta}
+        for key, counters in combined.items()
+    }
+    combined = {key: counters for key, counters in combined.items() if counters}
+    if not combined:
+        return
+
+    with transaction.atomic():
+        PlayerStats.objects.bulk_create(
+            [PlayerStats(player_id=player_id, time_control=track) for player_id, track in combined],
+            ignore_conflicts=True
+        )
+        # Most players of a tournament change by the same deltas, e.g. one tournament played
+        groups = {}
+        for (player_id, track), counters in combined.items():
+            groups.setdefault((track, tuple(sorted(counters.items()))), []).append(player_id)
+        for (track, counters), player_ids in groups.items():
+            PlayerStats.objects.filter(player_id__in=player_ids, time_control=track).update(
+                **{field: F(field) + delta for field, delta in counters}
+            )
+    bump_player_versions({player_id for player_id, _ in combined})
+
+
+def credit_tournament(tournament, sign=1):
+    """
+    Count a completed tournament in the counters of its players: played, won and medals
+    by final rank. sign=-1 takes it out again, e.g. before the tournament is deleted.
+    """
+    from .models import TournamentStanding
+
+    deltas = {}
+    for player_id, rank in TournamentStanding.objects.filter(tournament=tournament).values_list('player_id', 'rank'):
+        add_placing_deltas(deltas, player_id, tournament.time_control, rank, sign, played=True)
+    apply_stat_deltas(deltas)
+
+
+def apply_placing_changes(tournament, standings):
+    """
+    Move the won/medal counters of a completed tournament after its ranks changed.
+    standings are the rows whose rank changed, with their old rank in previous_rank.
+    """
+    deltas = {}
+    moved = set()
+    for standing in standings:
+        if standing.previous_rank == standing.rank:
+            continue
+        add_placing_deltas(deltas, standing.player_id, tournament.time_control, standing.previous_rank, -1)
+        add_placing_deltas(deltas, standing.player_id, tournament.time_control, standing.rank, 1)
+        moved.add(standing.player_id)
+    apply_stat_deltas(deltas)
+    if moved:
+        reset_achievement_progress(moved, tournament.date)
+
+
+def player_stats(player_ids, time_control='all'):
+    """PlayerStats of several players in one query, unsaved zero counters for players without any"""
+    from .models import PlayerStats
+
+    stats = {
+        row.player_id: row
+        for row in PlayerStats.objects.filter(player_id__in=list(player_ids), time_control=time_control)
+    }
+    return {
+        player_id: stats.get(player_id) or PlayerStats(player_id=player_id, time_control=time_control)
+        for player_id in player_ids
+    }
+
+
+def compute_player_stats():
+    """
+    Every PlayerStats row as it should be, computed from PlayerGame and the standings of
+    completed tournaments. Returns unsaved rows keyed by (player_id, time_control).
+    """
+    from .models import PlayerGame, PlayerStats, TournamentStanding
+
+    rows = {}
+    for row in PlayerGame.objects.order_by().values('player_id', 'time_control').annotate(**GAME_COUNTS):
+        player_id, time_control = row.pop('player_id'), row.pop('time_control')
+        for track in (time_control, 'all'):
+            stats = rows.setdefault((player_id, track), PlayerStats(player_id=player_id, time_control=track))
+            for field, count in row.items():
+                setattr(stats, field, getattr(stats, field) + count)
+
+    for player_id, time_control, rank in TournamentStanding.objects.filter(
+        tournament__is_completed=True
+    ).values_list('player_id', 'tournament__time_control', 'rank'):
+        for track in (time_control, 'all'):
+            stats = rows.setdefault((player_id, track), PlayerStats(player_id=player_id, time_control=track))
+            stats.tournaments_played += 1
+            field = PLACING_COUNTERS.get(rank)
+            if field:
+                setattr(stats, field, getattr(stats, field) + 1)
+
+    return rows
+
+
+def rebuild_player_stats():
+    """Replace every PlayerStats row by the one computed from scratch"""
+    from .models import PlayerStats
+
+    rows = compute_player_stats()
+    with transaction.atomic():
+        PlayerStats.objects.all().delete()
+        PlayerStats.objects.bulk_create(rows.values(), batch_size=1000)
+    return list(rows.values())
+
+
+def recent_matches(player, limit=10):
+    """The most recent finished matches of a player, newest first"""
+    from .models import PlayerGame
+
+    games = PlayerGame.objects.filter(player=player).exclude(result='pending').select_related(
+        'match__tournament', 'match__round', 'match__white_player', 'match__black_player'
+    ).order_by('-date', '-round_number')[:limit]
+    return [game.match for game in games]
@@ -0,0 +1,640 @@
+# rating_service.py
+import math
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery
+
+from .cache_service import bump_player_versions, bump_ratings_version
+from .player_stats_service import refresh_player_game_ratings, remove_player_games
+
+# Glicko-2 system constants
+GLICKO2_SCALE = 173.7178
+DEFAULT_RATING = 1500
+DEFAULT_RD = 350
+DEFAULT_VOLATILITY = 0.06
+TAU = 0.5  # Volatility parameter
+VOLATILITY_TOLERANCE = 0.000001  # Convergence tolerance of the volatility iteration
+VOLATILITY_MAX_ITERATIONS = 100
+
+# Rating tracks kept in PlayerRating.
+# Every rated game updates its time control track and the overall track.
+RATING_TRACKS = ('bullet', 'blitz', 'rapid', 'classical', 'overall')
+
+# Glicko-2 state fields of a PlayerRating
+RATING_FIELDS = ('rating', 'rd', 'volatility')
+
+# Score of the white player for every rated result.
+# Byes, forfeits and pending games never change ratings.
+WHITE_SCORES = {
+    'white_win': 1.0,
+    'black_win': 0.0,
+    'draw': 0.5,
+}
+
+
+def is_rated(match):
+    """Check if a match counts for ratings"""
+    return match.black_player_id is not None and match.result in WHITE_SCORES
+
+
+def compute_rating_period(ratings, rds, volatilities, white_idx, black_idx, white_scores):
+    """
+    Compute one Glicko-2 rating period for a whole set of players at once.
+
+    ratings, rds, volatilities: arrays with the current state of every player
+    white_idx, black_idx: arrays with the player index of each side of every game
+    white_scores: array with the score of the white player in every game
+
+    All games are rated against the ratings from before the period, so the
+    result does not depend on the order in which the games are given.
+    Players without games in this period keep their current state.
+
+    Returns (new_ratings, new_rds, new_volatilities) as new arrays.
+    """
+    ratings = np.asarray(ratings, dtype=float)
+    rds = np.asarray(rds, dtype=float)
+    volatilities = np.asarray(volatilities, dtype=float)
+    white_idx = np.asarray(white_idx, dtype=np.intp)
+    black_idx = np.asarray(black_idx, dtype=np.intp)
+    white_scores = np.asarray(white_scores, dtype=float)
+
+    n = len(ratings)
+    mu = (ratings - DEFAULT_RATING) / GLICKO2_SCALE
+    phi = rds / GLICKO2_SCALE
+
+    # Every game is seen once from each side
+    players = np.concatenate([white_idx, black_idx])
+    opponents = np.concatenate([black_idx, white_idx])
+    scores = np.concatenate([white_scores, 1 - white_scores])
+
+    # g(RD) of the opponent and the expected outcome E
+    g = 1 / np.sqrt(1 + 3 * phi[opponents] ** 2 / np.pi ** 2)
+    expected = 1 / (1 + np.exp(-g * (mu[players] - mu[opponents])))
+
+    # Sum the contributions of all games per player
+    v_inv = np.bincount(players, weights=g ** 2 * expected * (1 - expected), minlength=n)
+    delta_sum = np.bincount(players, weights=g * (scores - expected), minlength=n)
+    played = np.bincount(players, minlength=n) > 0
+
+    # Estimated variance v and improvement delta of every player that played
+    v = 1 / v_inv[played]
+    delta = v * delta_sum[played]
+
+    new_volatilities = volatilities.copy()
+    new_volatilities[played] = update_volatilities(phi[played], v, delta, volatilities[played])
+
+    # Pre-period RD grows with the new volatility, then shrinks with the games played
+    phi_star = np.sqrt(phi[played] ** 2 + new_volatilities[played] ** 2)
+
+    new_mu = mu.copy()
+    new_phi = phi.copy()
+    new_phi[played] = 1 / np.sqrt(1 / phi_star ** 2 + v_inv[played])
+    new_mu[played] = mu[played] + new_phi[played] ** 2 * delta_sum[played]
+
+    return (
+        new_mu * GLICKO2_SCALE + DEFAULT_RATING,
+        new_phi * GLICKO2_SCALE,
+        new_volatilities,
+    )
+
+
+def update_volatilities(phi, v, delta, sigma, tau=TAU, epsilon=VOLATILITY_TOLERANCE):
+    """
+    Glicko-2 volatility step (step 5 of Glickman's paper) for many players at once.
+
+    phi, v, delta, sigma: arrays on the Glicko-2 scale for the players that played
+    The root of f is found with the Illinois algorithm, iterated as array
+    operations on the players that have not converged yet.
+
+    Returns the array of new volatilities.
+    """
+    phi = np.asarray(phi, dtype=float)
+    v = np.asarray(v, dtype=float)
+    delta = np.asarray(delta, dtype=float)
+    a = np.log(np.asarray(sigma, dtype=float) ** 2)
+
+    def f(x, rows=slice(None)):
+        ex = np.exp(x)
+        denominator = phi[rows] ** 2 + v[rows] + ex
+        return (
+            ex * (delta[rows] ** 2 - phi[rows] ** 2 - v[rows] - ex) / (2 * denominator ** 2)
+            - (x - a[rows]) / tau ** 2
+        )
+
+    # Bracket the root between A and B
+    A = a.copy()
+    B = np.empty_like(a)
+    large_delta = delta ** 2 > phi ** 2 + v
+    B[large_delta] = np.log(delta[large_delta] ** 2 - phi[large_delta] ** 2 - v[large_delta])
+
+    small = np.flatnonzero(~large_delta)
+    k = np.ones(len(small))
+    searching = f(a[small] - k * tau, small) < 0
+    while searching.any():
+        k[searching] += 1
+        searching[searching] = f(a[small[searching]] - k[searching] * tau, small[searching]) < 0
+    B[small] = a[small] - k * tau
+
+    fA = f(A)
+    fB = f(B)
+
+    # Illinois iterations on the players that have not converged yet
+    active = np.flatnonzero(np.abs(B - A) > epsilon)
+    for _ in range(VOLATILITY_MAX_ITERATIONS):
+        if not len(active):
+            break
+        C = A[active] + (A[active] - B[active]) * fA[active] / (fB[active] - fA[active])
+        fC = f(C, active)
+
+        crossed = fC * fB[active] <= 0
+        A[active] = np.where(crossed, B[active], A[active])
+        fA[active] = np.where(crossed, fB[active], fA[active] / 2)
+        B[active] = C
+        fB[active] = fC
+
+        active = active[np.abs(B[active] - A[active]) > epsilon]
+
+    return np.exp(A / 2)
+
+
+def update_volatility_scalar(phi, v, delta, sigma, tau=TAU, epsilon=VOLATILITY_TOLERANCE):
+    """
+    Glicko-2 volatility step for a single player, following Glickman's paper literally.
+    Reference implementation for update_volatilities.
+    """
+    a = math.log(sigma ** 2)
+
+    def f(x):
+        ex = math.exp(x)
+        return ex * (delta ** 2 - phi ** 2 - v - ex) / (2 * (phi ** 2 + v + ex) ** 2) - (x - a) / tau ** 2
+
+    A = a
+    if delta ** 2 > phi ** 2 + v:
+        B = math.log(delta ** 2 - phi ** 2 - v)
+    else:
+        k = 1
+        while f(a - k * tau) < 0:
+            k += 1
+        B = a - k * tau
+
+    fA = f(A)
+    fB = f(B)
+    for _ in range(VOLATILITY_MAX_ITERATIONS):
+        if abs(B - A) <= epsilon:
+            break
+        C = A + (A - B) * fA / (fB - fA)
+        fC = f(C)
+        if fC * fB <= 0:
+            A = B
+            fA = fB
+        else:
+            fA = fA / 2
+        B = C
+        fB = fC
+
+    return math.exp(A / 2)
+
+
+def apply_rating_periods(periods):
+    """
+    Rate a sequence of rating periods and save all changed ratings at once.
+
+    periods: list of match lists, in the order they were played.
+    The PlayerRating rows involved are loaded with one query, each period is rated
+    in a single vectorised pass per rating track, and the new state is written with
+    one bulk_create and one bulk_update at the end. The before and after state of
+    every player in every game is recorded in the RatingChange ledger with one bulk_create.
+
+    Returns the list of updated PlayerRating rows.
+    """
+    from .models import RatingChange
+
+    periods = [[match for match in matches if is_rated(match)] for matches in periods]
+    periods = [matches for matches in periods if matches]
+    if not periods:
+        return []
+
+    # Keep one row per player and track so state carries over between periods
+    player_ids = {player_id for matches in periods for match in matches for player_id in (match.white_player_id, match.black_player_id)}
+    ratings = load_player_ratings(player_ids)
+    changes = []
+
+    for matches in periods:
+        # Split the period per time control; every game also counts for the overall track
+        tracks = {'overall': matches}
+        for match in matches:
+            time_control = match.tournament.time_control
+            if time_control in RATING_TRACKS:
+                tracks.setdefault(time_control, []).append(match)
+
+        for track, track_matches in tracks.items():
+            changes.extend(_rate_track(ratings, track, track_matches))
+
+    updated = save_player_ratings([ratings[key] for key in {(c.player_id, c.time_control) for c in changes}])
+    RatingChange.objects.bulk_create(changes)
+    refresh_player_game_ratings({change.match_id for change in changes})
+    bump_ratings_version()
+    bump_player_versions(player_ids)
+    return updated
+
+
+def load_player_ratings(player_ids):
+    """
+    PlayerRating rows of the players on every track, keyed by (player_id, track), in one query.
+    Tracks a player has not been rated on yet get unsaved rows at the default rating.
+    """
+    from .models import PlayerRating, User
+
+    ratings = {
+        (rating.player_id, rating.time_control): rating
+        for rating in PlayerRating.objects.filter(player_id__in=list(player_ids))
+    }
+
+    # A first overall rating starts from the seeding rating on User, which admins may have set
+    unrated = [player_id for player_id in player_ids if (player_id, 'overall') not in ratings]
+    seeds = dict(User.objects.filter(pk__in=unrated).values_list('id', 'elo')) if unrated else {}
+
+    for player_id in player_ids:
+        for track in RATING_TRACKS:
+            if (player_id, track) not in ratings:
+                rating = PlayerRating(player_id=player_id, time_control=track)
+                if track == 'overall':
+                    rating.rating = seeds.get(player_id, rating.rating)
+                ratings[(player_id, track)] = rating
+    return ratings
+
+
+def set_overall_rating(player_id, rating):
+    """
+    Set a player's overall rating by hand, e.g. to seed a new club member. Writes both
+    User.elo and the overall PlayerRating, if the player has one yet.
+    """
+    from .models import PlayerRating, User
+
+    with transaction.atomic():
+        User.objects.filter(pk=player_id).update(elo=rating)
+        PlayerRating.objects.filter(player_id=player_id, time_control='overall').update(rating=rating)
+    bump_ratings_version()
+    bump_player_versions([player_id])
+
+
+def save_player_ratings(ratings):
+    """
+    Write rated PlayerRating rows: new rows with one bulk_create, the others with one
+    bulk_update. The overall rating is mirrored onto User.elo.
+    Returns the saved rows.
+    """
+    from .models import PlayerRating, User
+
+    rated = list(ratings)
+    PlayerRating.objects.bulk_create([rating for rating in rated if rating.pk is None])
+    PlayerRating.objects.bulk_update(
+        [rating for rating in rated if rating.pk is not None],
+        list(RATING_FIELDS) + ['games', 'last_played']
+    )
+    User.objects.bulk_update(
+        [User(pk=rating.player_id, elo=rating.rating) for rating in rated if rating.time_control == 'overall'],
+        ['elo']
+    )
+    return rated
+
+
+def rating_activity():
+    """Rated games and date of the last one per (player_id, track), from the RatingChange ledger"""
+    from .models import RatingChange
+
+    return {
+        (player_id, track): (games, last_played)
+        for player_id, track, games, last_played in RatingChange.objects.order_by().values_list(
+            'player_id', 'time_control'
+        ).annotate(games=Count('id'), last_played=Max('match__tournament__date'))
+    }
+
+
+def _rate_track(ratings, track, matches):
+    """
+    Update one rating track of the players in place for a single period.
+    Returns the unsaved RatingChange ledger entries of the period.
+    """
+    from .models import RatingChange
+
+    # Index the players that take part in this period
+    index = {}
+    for match in matches:
+        index.setdefault(match.white_player_id, len(index))
+        index.setdefault(match.black_player_id, len(index))
+    period_ratings = [ratings[(player_id, track)] for player_id in index]
+
+    current = np.array([[getattr(r, field) for field in RATING_FIELDS] for r in period_ratings], dtype=float)
+    old_ratings, rds, volatilities = current.T
+
+    white_idx = np.array([index[m.white_player_id] for m in matches], dtype=np.intp)
+    black_idx = np.array([index[m.black_player_id] for m in matches], dtype=np.intp)
+    white_scores = np.array([WHITE_SCORES[m.result] for m in matches], dtype=float)
+
+    new_ratings, new_rds, new_volatilities = compute_rating_period(
+        old_ratings, rds, volatilities, white_idx, black_idx, white_scores
+    )
+
+    games = np.bincount(np.concatenate([white_idx, black_idx]), minlength=len(index))
+    played_on = max(match.tournament.date for match in matches)
+    for i, rating in enumerate(period_ratings):
+        rating.rating = float(new_ratings[i])
+        rating.rd = float(new_rds[i])
+        rating.volatility = float(new_volatilities[i])
+        rating.games += int(games[i])
+        rating.last_played = max(filter(None, (rating.last_played, played_on)))
+
+    changes = []
+    for match, white_score in zip(matches, white_scores):
+        for player_id, score in ((match.white_player_id, white_score), (match.black_player_id, 1 - white_score)):
+            i = index[player_id]
+            changes.append(RatingChange(
+                match=match,
+                player_id=player_id,
+                time_control=track,
+                score=float(score),
+                rating_before=float(old_ratings[i]),
+                rd_before=float(rds[i]),
+                volatility_before=float(volatilities[i]),
+                rating_after=float(new_ratings[i]),
+                rd_after=float(new_rds[i]),
+                volatility_after=float(new_volatilities[i]),
+            ))
+    return changes
+
+
+def sync_match_rating(match):
+    """
+    Bring the ratings in line with the current result of a match after it was saved.
+
+    Games in rounds that were not rated yet are left alone; they are rated when
+    the round completes. For rated games only the ledgered delta of this one game
+    is reversed and the new one applied, so a correction costs a few row updates
+    instead of a rebuild.
+    """
+    from .models import Round
+
+    changes = list(match.rating_changes.all())
+
+    if not changes:
+        # A game that becomes rated in a round that was already rated, e.g. a forfeit turned into a win
+        if is_rated(match) and Round.objects.filter(pk=match.round_id, ratings_applied=True).exists():
+            _rate_single_match(match)
+        return
+
+    if not is_rated(match):
+        reverse_rating_changes(changes)
+        return
+
+    white_score = WHITE_SCORES[match.result]
+    scores = {match.white_player_id: white_score, match.black_player_id: 1 - white_score}
+    if all(change.player_id in scores and change.score == scores[change.player_id] for change in changes):
+        return  # Rated result did not change
+
+    if any(change.player_id not in scores for change in changes):
+        # The players of the game changed, rate it from scratch
+        with transaction.atomic():
+            reverse_rating_changes(changes)
+            _rate_single_match(match)
+        return
+
+    with transaction.atomic():
+        _correct_rating_changes(match, changes, white_score)
+
+
+def _rate_single_match(match):
+    """Rate one game on top of the current ratings of both players"""
+    with transaction.atomic():
+        apply_rating_periods([[match]])
+
+
+def _correct_rating_changes(match, changes, white_score):
+    """Replace the ledgered outcome of a game with a new score for white"""
+    from .models import RatingChange
+
+    shifts = {}
+    for track in {change.time_control for change in changes}:
+        white = next(c for c in changes if c.time_control == track and c.player_id == match.white_player_id)
+        black = next(c for c in changes if c.time_control == track and c.player_id == match.black_player_id)
+
+        # Rate the game again from the state both players had before it
+        new_ratings, new_rds, new_volatilities = compute_rating_period(
+            [white.rating_before, black.rating_before],
+            [white.rd_before, black.rd_before],
+            [white.volatility_before, black.volatility_before],
+            [0], [1], [white_score]
+        )
+
+        for i, change in enumerate((white, black)):
+            deltas = shifts.setdefault((change.player_id, track), {})
+            deltas['rating'] = float(new_ratings[i]) - change.rating_after
+            deltas['rd'] = float(new_rds[i]) - change.rd_after
+            deltas['volatility'] = float(new_volatilities[i]) - change.volatility_after
+
+            change.score = white_score if i == 0 else 1 - white_score
+            change.rating_after = float(new_ratings[i])
+            change.rd_after = float(new_rds[i])
+            change.volatility_after = float(new_volatilities[i])
+
+    _shift_ratings(shifts)
+    RatingChange.objects.bulk_update(
+        changes,
+        ['score', 'rating_after', 'rd_after', 'volatility_after']
+    )
+
+
+def take_back_matches(match_ids):
+    """Take back the rating changes and statistics of games together, before they are deleted"""
+    from .models import RatingChange
+
+    match_ids = list(match_ids)
+    changes = list(RatingChange.objects.filter(match_id__in=match_ids))
+    if changes:
+        reverse_rating_changes(changes)
+    remove_player_games(match_ids)
+
+
+def reverse_rating_changes(changes):
+    """Undo exactly the deltas recorded in the given ledger entries and remove them"""
+    from .models import RatingChange
+
+    shifts = {}
+    for change in changes:
+        deltas = shifts.setdefault((change.player_id, change.time_control), {})
+        deltas['rating'] = deltas.get('rating', 0) + change.rating_before - change.rating_after
+        deltas['rd'] = deltas.get('rd', 0) + change.rd_before - change.rd_after
+        deltas['volatility'] = deltas.get('volatility', 0) + change.volatility_before - change.volatility_after
+        deltas['games'] = deltas.get('games', 0) - 1
+
+    with transaction.atomic():
+        _shift_ratings(shifts)
+        RatingChange.objects.filter(pk__in=[change.pk for change in changes]).delete()
+
+
+def _shift_ratings(shifts):
+    """
+    Add deltas to PlayerRating rows, keyed by (player_id, track), with one UPDATE per row.
+    Shifts of the overall track are mirrored onto User.elo.
+    """
+    from .models import PlayerRating, User
+
+    for (player_id, track), deltas in shifts.items():
+        PlayerRating.objects.filter(player_id=player_id, time_control=track).update(
+            **{field: F(field) + delta for field, delta in deltas.items()}
+        )
+        if track == 'overall':
+            User.objects.filter(pk=player_id).update(elo=Subquery(
+                PlayerRating.objects.filter(player_id=OuterRef('pk'), time_control='overall').values('rating')[:1]
+            ))
+    bump_ratings_version()
+    bump_player_versions(player_id for player_id, _ in shifts)
+
+
+def rate_round(round_obj):
+    """
+    Apply the rating period of a completed round.
+    A round is only ever rated once, no matter how often it is completed.
+    """
+    return rate_rounds(round_obj.tournament, [round_obj.pk])
+
+
+def rate_tournament(tournament):
+    """Apply the rating periods of all rounds of a tournament that were not rated yet"""
+    return rate_rounds(tournament)
+
+
+def rate_rounds(tournament, round_ids=None):
+    """
+    Rate the given rounds of a tournament (all unrated rounds if round_ids is None),
+    one rating period per round in round order.
+    """
+    from .models import Match, Round
+
+    with transaction.atomic():
+        rounds = Round.objects.select_for_update().filter(
+            tournament=tournament,
+            ratings_applied=False
+        )
+        if round_ids is not None:
+            rounds = rounds.filter(pk__in=round_ids)
+        rounds = list(rounds.order_by('number').values_list('id', flat=True))
+
+        if not rounds:
+            return []
+
+        Round.objects.filter(pk__in=rounds).update(ratings_applied=True)
+
+        matches = Match.objects.filter(
+            round_id__in=rounds,
+            black_player__isnull=False,
+            result__in=list(WHITE_SCORES)
+        ).select_related('tournament', 'white_player', 'black_player')
+
+        # One rating period per round
+        periods = {round_id: [] for round_id in rounds}
+        for match in matches:
+            periods[match.round_id].append(match)
+
+        return apply_rating_periods([periods[round_id] for round_id in rounds])
+
+
+def record_rating_history(tournament, participants):
+    """
+    Store the rating of every participant on the tournament's time control after a completed
+    tournament, in one INSERT. Participants that already have an entry keep it.
+    """
+    from .models import PlayerRatingHistory
+
+    PlayerRatingHistory.objects.bulk_create([
+        PlayerRatingHistory(
+            player=participant,
+            tournament=tournament,
+            date=tournament.date,
+            rating=round(participant.get_rating_for_time_control(tournament.time_control)),
+            time_control=tournament.time_control
+        )
+        for participant in participants
+    ], ignore_conflicts=True)
+
+
+def new_rating_state(num_players, seeds=None):
+    """
+    Create an in-memory rating state for a full replay.
+    For every track it holds (ratings, rds, volatilities) arrays indexed by player position.
+    seeds maps (player position, track) to a starting (rating, rd, volatility); every other
+    player starts at the defaults.
+    """
+    state = {
+        track: (
+            np.full(num_players, DEFAULT_RATING, dtype=float),
+            np.full(num_players, DEFAULT_RD, dtype=float),
+            np.full(num_players, DEFAULT_VOLATILITY, dtype=float),
+        )
+        for track in RATING_TRACKS
+    }
+    for (i, track), seed in (seeds or {}).items():
+        for arrays, value in zip(state[track], seed):
+            arrays[i] = value
+    return state
+
+
+def replay_period(state, track, white_idx, black_idx, white_scores):
+    """
+    Rate one period of a track directly on in-memory state arrays.
+
+    white_idx, black_idx: player positions in the state arrays
+    Returns (players, inverse, before, after) where players are the positions
+    that took part, inverse maps the concatenated white and black sides onto
+    players, and before/after are (ratings, rds, volatilities) of those players.
+    """
+    ratings, rds, volatilities = state[track]
+    white_idx = np.asarray(white_idx, dtype=np.intp)
+    players, inverse = np.unique(
+        np.concatenate([white_idx, np.asarray(black_idx, dtype=np.intp)]),
+        return_inverse=True
+    )
+
+    before = (ratings[players], rds[players], volatilities[players])
+    after = compute_rating_period(
+        *before, inverse[:len(white_idx)], inverse[len(white_idx):], white_scores
+    )
+
+    ratings[players], rds[players], volatilities[players] = after
+    return players, inverse, before, after
+
+
+def dump_rating_state(state, player_ids):
+    """Convert an in-memory rating state into JSON for a RatingCheckpoint"""
+    return {
+        'player_ids': list(player_ids),
+        'tracks': {
+            track: [arrays[0].tolist(), arrays[1].tolist(), arrays[2].tolist()]
+            for track, arrays in state.items()
+        },
+    }
+
+
+def load_rating_state(data, player_ids, seeds=None):
+    """
+    Build an in-memory rating state for player_ids from checkpoint JSON.
+    Players that did not exist at the time of the checkpoint start at the defaults,
+    or at their seeds (see new_rating_state).
+    """
+    state = new_rating_state(len(player_ids), seeds)
+    position = {player_id: i for i, player_id in enumerate(player_ids)}
+
+    # Map checkpoint positions onto the current positions
+    saved = [(i, position[player_id]) for i, player_id in enumerate(data['player_ids']) if player_id in position]
+    if not saved:
+        return state
+    source = np.array([i for i, _ in saved], dtype=np.intp)
+    target = np.array([j for _, j in saved], dtype=np.intp)
+
+    for track, arrays in data['tracks'].items():
+        if track not in state:
+            continue
+        for current, stored in zip(state[track], arrays):
+            current[target] = np.asarray(stored, dtype=float)[source]
+    return state
@@ -1,3 +1,1159 @@
-from django.test import TestCase
+import contextlib
+import datetime
+import io
+import json
+import os
+import random
+import tempfile
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import achievement_service, cache_service
+from .models import (
+    Achievement, AchievementProgress, Match, PlayerGame, PlayerRating, PlayerStats, RatingChange, Round,
+    StandingSnapshot, Tournament, TournamentStanding, User,
+)
+from .pairing_service import TournamentState, match_points, pair_round_robin, pair_swiss
+from .player_stats_service import compute_player_stats, sync_player_games
+from .rating_service import (
+    GLICKO2_SCALE, compute_rating_period, rate_round, update_volatilities, update_volatility_scalar,
+)
+from .utils import (
+    apply_result_change, generate_swiss_pairings, schedule_round_robin, snapshot_standings, standings_after_rounds,
+    update_tournament_standings, update_tournament_summary,
+)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class TournamentDetailQueryTests(TestCase):
+    """The tournament page runs the same queries however many rounds and players a tournament has"""
+
+    def create_tournament(self, num_players, num_rounds, completed=False):
+        tournament = Tournament.objects.create(
+            name=f"{num_players} players", date=datetime.date.today(), tournament_type='swiss',
+            num_rounds=num_rounds, has_started=True, is_completed=completed
+        )
+        players = User.objects.bulk_create([
+            User(username=f"t{tournament.pk}p{i}", first_name=f"Player {i}") for i in range(num_players)
+        ])
+        tournament.participants.set(players)
+
+        rounds = Round.objects.bulk_create([
+            Round(tournament=tournament, number=number, is_published=True,
+                  is_completed=completed or number < num_rounds)
+            for number in range(1, num_rounds + 1)
+        ])
+        matches = []
+        for round_obj in rounds:
+            rotated = players[round_obj.number:] + players[:round_obj.number]
+            for white, black in zip(rotated[::2], rotated[1::2]):
+                matches.append(Match(
+                    tournament=tournament, round=round_obj, white_player=white, black_player=black,
+                    result='white_win' if round_obj.is_completed else 'pending'
+                ))
+        Match.objects.bulk_create(matches)
+        TournamentStanding.objects.bulk_create([
+            TournamentStanding(tournament=tournament, player=player, score=0, rank=rank)
+            for rank, player in enumerate(players, start=1)
+        ])
+        return tournament
+
+    def count_queries(self, tournament):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('tournament_detail', args=[tournament.pk]))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assertConstantQueries(self, small, large):
+        expected = self.count_queries(small)
+        with self.assertNumQueries(expected):
+            response = self.client.get(reverse('tournament_detail', args=[large.pk]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_live_tournament(self):
+        self.assertConstantQueries(self.create_tournament(4, 2), self.create_tournament(40, 9))
+
+    def test_completed_tournament(self):
+        self.assertConstantQueries(
+            self.create_tournament(4, 2, completed=True), self.create_tournament(40, 9, completed=True)
+        )
+
+    def test_live_tournament_as_staff(self):
+        staff = User.objects.create(username='arbiter', is_staff=True)
+        self.client.force_login(staff)
+        self.assertConstantQueries(self.create_tournament(4, 2), self.create_tournament(40, 9))
+
+
+class GlickoTests(SimpleTestCase):
+    """The batched Glicko-2 step reproduces Glickman's worked example and the per-player volatility solver"""
+
+    def test_worked_example(self):
+        # A 1500 player with RD 200 beats a 1400 player and loses to 1550 and 1700 players
+        ratings, rds, volatilities = compute_rating_period(
+            [1500, 1400, 1550, 1700], [200, 30, 100, 300], [0.06] * 4, [0, 0, 0], [1, 2, 3], [1, 0, 0]
+        )
+        # The paper rounds its intermediate values, so the results agree to its precision
+        self.assertAlmostEqual((ratings[0] - 1500) / GLICKO2_SCALE, -0.2069, places=4)
+        self.assertAlmostEqual(rds[0] / GLICKO2_SCALE, 0.8722, places=4)
+        self.assertAlmostEqual(ratings[0], 1464.06, delta=0.01)
+        self.assertAlmostEqual(rds[0], 151.52, delta=0.01)
+        self.assertAlmostEqual(volatilities[0], 0.05999, delta=0.00001)
+
+    def test_volatility_solver(self):
+        rng = random.Random(4)
+        rows = [
+            (rng.uniform(0.2, 2), rng.uniform(0.5, 20), rng.uniform(-3, 3), rng.uniform(0.03, 0.1))
+            for _ in range(200)
+        ]
+        # Include a large improvement, which brackets the root differently
+        rows.append((0.2, 0.5, 4, 0.06))
+        vectorised = update_volatilities(*zip(*rows))
+        for row, volatility in zip(rows, vectorised):
+            self.assertAlmostEqual(volatility, update_volatility_scalar(*row), places=9)
+
+    def test_players_without_games(self):
+        ratings, rds, volatilities = compute_rating_period(
+            [1500, 1600, 1700], [200, 80, 50], [0.06, 0.05, 0.07], [0], [1], [0.5]
+        )
+        self.assertEqual((ratings[2], rds[2], volatilities[2]), (1700, 50, 0.07))
+
+
+class SwissPairingTests(SimpleTestCase):
+    """Swiss rounds pair everyone once, without rematches, broken colour limits or second byes"""
+
+    def simulate(self, num_players, num_rounds, rng):
+        players = [User(id=i + 1, username=f"s{i + 1}", elo=rng.randint(1000, 2200)) for i in range(num_players)]
+        state = TournamentState(players)
+        for number in range(1, num_rounds + 1):
+            pairings, bye_player = pair_swiss(state, number)
+            paired = [player.id for pairing in pairings for player in pairing]
+            if bye_player:
+                paired.append(bye_player.id)
+            self.assertEqual(sorted(paired), [player.id for player in players])
+
+            for white, black in pairings:
+                self.assertNotIn(black.id, state.records[white.id].opponents)
+            if bye_player:
+                self.assertFalse(state.records[bye_player.id].received_bye)
+
+            games = [(white.id, black.id, rng.choice(['white_win', 'black_win', 'draw'])) for white, black in pairings]
+            if bye_player:
+                games.append((bye_player.id, None, 'bye'))
+            state.add_round(games)
+
+            for record in state.records.values():
+                self.assertLessEqual(abs(record.color_diff), 2)
+                self.assertNotEqual(record.colors[-3:], ['W'] * 3)
+                self.assertNotEqual(record.colors[-3:], ['B'] * 3)
+
+    def test_random_tournaments(self):
+        rng = random.Random(1)
+        for _ in range(150):
+            num_players = rng.choice([6, 7, 8, 9, 12, 13, 20, 31])
+            self.simulate(num_players, min(rng.choice([5, 7, 9]), num_players // 2), rng)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class BergerScheduleTests(TestCase):
+    """Round robins follow the Berger table: everyone meets once (twice with colours reversed)"""
+
+    def schedule(self, num_players, double):
+        players = [User(id=i + 1, username=f"b{i + 1}", elo=1500 + i) for i in range(num_players)]
+        state = TournamentState(players)
+        num_rounds = (num_players if num_players % 2 else num_players - 1) * (2 if double else 1)
+        meetings = {}
+        colors = {player.id: [] for player in players}
+        byes = {}
+        for number in range(1, num_rounds + 1):
+            pairings, bye_player = pair_round_robin(state, number, double=double)
+            paired = [player.id for pairing in pairings for player in pairing]
+            self.assertEqual(len(paired) + bool(bye_player), num_players)
+            self.assertEqual(len(set(paired)), len(paired))
+            for white, black in pairings:
+                meetings.setdefault(frozenset((white.id, black.id)), []).append(white.id)
+                colors[white.id].append('W')
+                colors[black.id].append('B')
+            if bye_player:
+                byes[bye_player.id] = byes.get(bye_player.id, 0) + 1
+        return meetings, colors, byes
+
+    def test_round_robin(self):
+        for num_players in range(3, 12):
+            meetings, colors, byes = self.schedule(num_players, double=False)
+            self.assertEqual(len(meetings), num_players * (num_players - 1) // 2)
+            self.assertTrue(all(len(whites) == 1 for whites in meetings.values()))
+            self.assertEqual(byes, {i: 1 for i in range(1, num_players + 1)} if num_players % 2 else {})
+            for history in colors.values():
+                self.assertLessEqual(abs(history.count('W') - history.count('B')), 1)
+                self.assertFalse(any(len(set(history[i:i + 3])) == 1 for i in range(len(history) - 2)))
+
+    def test_double_round_robin(self):
+        for num_players in range(3, 12):
+            meetings, colors, byes = self.schedule(num_players, double=True)
+            self.assertEqual(len(meetings), num_players * (num_players - 1) // 2)
+            self.assertTrue(all(len(set(whites)) == 2 for whites in meetings.values()))
+            self.assertEqual(byes, {i: 2 for i in range(1, num_players + 1)} if num_players % 2 else {})
+            for history in colors.values():
+                self.assertEqual(history.count('W'), history.count('B'))
+
+    def test_schedule(self):
+        tournament = Tournament.objects.create(
+            name='Round robin', date=datetime.date.today(), tournament_type='double_round_robin'
+        )
+        tournament.participants.set([User.objects.create(username=f"p{i}") for i in range(5)])
+        with CaptureQueriesContext(connection) as queries:
+            schedule_round_robin(tournament)
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "chess_match"')]
+        self.assertEqual(len(inserts), 1)
+
+        rounds = list(tournament.rounds.order_by('number'))
+        self.assertEqual(len(rounds), 10)
+        self.assertEqual([round_obj.is_published for round_obj in rounds], [True] + [False] * 9)
+        byes = Match.objects.filter(tournament=tournament, black_player__isnull=True)
+        self.assertEqual(byes.count(), 10)
+        self.assertEqual(set(byes.filter(round=rounds[0]).values_list('result', flat=True)), {'bye'})
+        self.assertEqual(set(byes.exclude(round=rounds[0]).values_list('result', flat=True)), {'pending'})
+        self.assertEqual(TournamentStanding.objects.get(
+            tournament=tournament, player=byes.get(round=rounds[0]).white_player
+        ).score, 1)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class PairingStateTests(TestCase):
+    """The pairing state is loaded in two queries and a round is written with one insert"""
+
+    def create_tournament(self, num_players):
+        tournament = Tournament.objects.create(name=f"{num_players} players", date=datetime.date.today())
+        tournament.participants.set(User.objects.bulk_create([
+            User(username=f"t{tournament.pk}p{i}", elo=1200 + 37 * i % 900) for i in range(num_players)
+        ]))
+        return tournament
+
+    def pair(self, tournament, number):
+        round_obj = Round.objects.create(tournament=tournament, number=number, is_completed=True)
+        with contextlib.redirect_stdout(io.StringIO()), CaptureQueriesContext(connection) as queries:
+            generate_swiss_pairings(tournament, round_obj)
+        return round_obj, len(queries)
+
+    def test_load(self):
+        tournament = self.create_tournament(9)
+        rng = random.Random(2)
+        played = []
+        for number in range(1, 4):
+            round_obj, _ = self.pair(tournament, number)
+            games = []
+            for match in round_obj.matches.order_by('pk'):
+                if match.black_player_id:
+                    match.result = rng.choice(['white_win', 'black_win', 'draw'])
+                    match.save()
+                games.append((match.white_player_id, match.black_player_id, match.result))
+            played.append(games)
+
+        expected = TournamentState(tournament.participants.all())
+        for games in played:
+            expected.add_round(games)
+        with self.assertNumQueries(2):
+            state = TournamentState.load(tournament)
+
+        fields = ('score', 'opponents', 'colors', 'color_diff', 'color_pref', 'float_history', 'received_bye')
+        for player_id, record in expected.records.items():
+            loaded = state.records[player_id]
+            self.assertEqual([getattr(loaded, field) for field in fields], [getattr(record, field) for field in fields])
+
+    def test_constant_queries(self):
+        small = self.create_tournament(8)
+        large = self.create_tournament(40)
+        for number in (1, 2):
+            _, expected = self.pair(small, number)
+            _, queries = self.pair(large, number)
+            self.assertEqual(queries, expected)
+            Match.objects.filter(round__number=number).update(result='draw')
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class SimulatePairingsTests(TestCase):
+    """simulate_pairings is reproducible and drives the same pairing code in memory and in the database"""
+
+    def simulate(self, *args):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'rounds.json')
+            call_command('simulate_pairings', '--tournaments=4', '--seed=3', f"--output={output}", *args,
+                         stdout=io.StringIO())
+            with open(output) as f:
+                rounds = json.load(f)['rounds']
+        # Timings differ from run to run
+        return {
+            number: {key: value for key, value in stats.items() if not key.startswith('latency')}
+            for number, stats in rounds.items()
+        }
+
+    def test_swiss(self):
+        in_memory = self.simulate('--players=8,9', '--rounds=3')
+        self.assertEqual(in_memory, self.simulate('--players=8,9', '--rounds=3'))
+        in_database = self.simulate('--players=8,9', '--rounds=3', '--database')
+        self.assertFalse(User.objects.exists())
+
+        self.assertEqual(list(in_memory), ['1', '2', '3'])
+        for number, stats in in_database.items():
+            self.assertEqual(stats['tournaments'], 4)
+            self.assertEqual(stats['rematches'], 0)
+            self.assertGreater(stats.pop('queries_max'), 0)
+            stats.pop('queries_mean')
+            self.assertEqual(stats, in_memory[number])
+
+    def test_round_robin(self):
+        rounds = self.simulate('--type=double_round_robin', '--players=5')
+        self.assertEqual(len(rounds), 10)
+        self.assertEqual(sum(stats['rematches'] for stats in rounds.values()), 0)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class RatingSeedTests(TestCase):
+    """Ratings set by hand survive rated rounds, later saves and a full recompute"""
+
+    def setUp(self):
+        self.white = User.objects.create(username='white', elo=1800)
+        self.black = User.objects.create(username='black')
+        self.seeded = User.objects.create(username='seeded', elo=1900)
+        self.tournament = Tournament.objects.create(
+            name='Rated', date=datetime.date.today(), time_control='blitz', has_started=True
+        )
+        self.round = Round.objects.create(tournament=self.tournament, number=1, is_completed=True)
+        Match.objects.create(
+            tournament=self.tournament, round=self.round, white_player=self.white,
+            black_player=self.black, result='draw'
+        )
+
+    def overall(self, player):
+        return PlayerRating.objects.get(player=player, time_control='overall').rating
+
+    def black_ratings(self):
+        rows = PlayerRating.objects.filter(player=self.black).values_list('time_control', 'rating', 'rd')
+        return {track: (rating, rd) for track, rating, rd in rows}
+
+    def test_stale_save_keeps_rating(self):
+        stale = User.objects.get(pk=self.white.pk)
+        rate_round(self.round)
+        rated = self.overall(self.white)
+        self.assertNotEqual(rated, 1800)
+
+        stale.first_name = 'Edited'
+        stale.save()
+        self.assertEqual(self.overall(self.white), rated)
+
+    def test_staff_edit(self):
+        rate_round(self.round)
+        rated = self.overall(self.white)
+        self.client.force_login(User.objects.create(username='arbiter', is_staff=True))
+        form = {'username': 'white', 'first_name': '', 'last_name': '', 'email': '', 'lichess_account': '',
+                'chesscom_account': '', 'fide_rating': '', 'is_active': 'on'}
+
+        # Editing other details does not write the rating
+        self.client.post(reverse('user_edit', args=[self.white.pk]), {**form, 'first_name': 'W', 'elo': rated})
+        self.assertEqual(User.objects.get(pk=self.white.pk).first_name, 'W')
+        self.assertEqual(User.objects.get(pk=self.white.pk).elo, rated)
+
+        self.client.post(reverse('user_edit', args=[self.white.pk]), {**form, 'elo': 2000})
+        self.assertEqual(User.objects.get(pk=self.white.pk).elo, 2000)
+        self.assertEqual(self.overall(self.white), 2000)
+
+    def test_recompute_keeps_seeds(self):
+        rate_round(self.round)
+        rated = {player.pk: player.elo for player in User.objects.all()}
+
+        call_command('recompute_ratings', stdout=io.StringIO())
+
+        for player in User.objects.all():
+            self.assertAlmostEqual(player.elo, rated[player.pk], places=6)
+        self.assertEqual(User.objects.get(pk=self.seeded.pk).elo, 1900)
+        self.assertAlmostEqual(self.overall(self.white), rated[self.white.pk], places=6)
+
+    def test_recompute_without_ledger(self):
+        # Rows carried over from before the ledger already include their games. Their
+        # seeds are lost, so the players start at the default
+        User.objects.filter(pk=self.white.pk).update(elo=1500)
+        rate_round(self.round)
+        rated = self.black_ratings()
+        RatingChange.objects.all().delete()
+        PlayerRating.objects.update(games=0)
+
+        call_command('recompute_ratings', stdout=io.StringIO())
+
+        replayed = self.black_ratings()
+        self.assertEqual(replayed.keys(), rated.keys())
+        for track, (rating, rd) in rated.items():
+            self.assertAlmostEqual(replayed[track][0], rating, places=6)
+            self.assertAlmostEqual(replayed[track][1], rd, places=6)
+        self.assertEqual(User.objects.get(pk=self.seeded.pk).elo, 1900)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class MatchDeleteTests(TestCase):
+    """Deleting rated games takes back their ratings and statistics once for the whole delete"""
+
+    def setUp(self):
+        self.players = [User.objects.create(username=f"p{i}") for i in range(4)]
+
+    def create_tournament(self, num_rounds):
+        tournament = Tournament.objects.create(
+            name=f"{num_rounds} rounds", date=datetime.date.today(), time_control='blitz', has_started=True
+        )
+        for number in range(1, num_rounds + 1):
+            round_obj = Round.objects.create(tournament=tournament, number=number, is_completed=True)
+            for white, black in ((0, 1), (2, 3)):
+                Match.objects.create(
+                    tournament=tournament, round=round_obj, white_player=self.players[white],
+                    black_player=self.players[black], result='white_win' if number % 2 else 'draw'
+                )
+            rate_round(round_obj)
+        return tournament
+
+    def assertUnrated(self):
+        self.assertFalse(RatingChange.objects.exists())
+        self.assertFalse(PlayerGame.objects.exists())
+        for rating in PlayerRating.objects.all():
+            self.assertAlmostEqual(rating.rating, 1500, places=6)
+            self.assertEqual(rating.games, 0)
+
+    def count_queries(self, delete):
+        with CaptureQueriesContext(connection) as queries:
+            delete()
+        return len(queries)
+
+    def test_tournament_delete(self):
+        short = self.count_queries(self.create_tournament(1).delete)
+        self.assertUnrated()
+        self.assertEqual(self.count_queries(self.create_tournament(5).delete), short)
+        self.assertUnrated()
+
+    def test_round_delete(self):
+        tournament = self.create_tournament(3)
+        tournament.rounds.get(number=3).delete()
+        self.assertEqual(RatingChange.objects.count(), 16)
+        self.assertEqual(PlayerGame.objects.count(), 8)
+
+        tournament.rounds.all().delete()
+        self.assertUnrated()
+
+    def test_single_match_delete(self):
+        tournament = self.create_tournament(2)
+        for match in Match.objects.filter(tournament=tournament):
+            match.delete()
+        self.assertUnrated()
+
+    def test_unreached_rounds(self):
+        tournament = Tournament.objects.create(name='Round robin', date=datetime.date.today())
+        tournament.participants.set(self.players)
+        self.client.force_login(User.objects.create(username='arbiter', is_staff=True))
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.client.post(reverse('tournament_start', args=[tournament.pk]),
+                             {'tournament_type': 'round_robin', 'num_rounds': 3})
+            self.assertEqual(tournament.rounds.count(), 3)
+            self.client.post(reverse('complete_tournament', args=[tournament.pk]))
+
+        round_obj = tournament.rounds.get()
+        self.assertEqual(round_obj.number, 1)
+        self.assertEqual(Match.objects.filter(tournament=tournament).count(), 2)
+        self.assertEqual(set(PlayerGame.objects.values_list('match__round', flat=True)), {round_obj.pk})
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class StandingsScoringTests(TestCase):
+    """Incremental result changes score exactly like a full recompute of the standings"""
+
+    def setUp(self):
+        self.tournament = Tournament.objects.create(name='Scoring', date=datetime.date.today(), has_started=True)
+        self.players = User.objects.bulk_create([User(username=f"s{i}") for i in range(3)])
+        self.tournament.participants.set(self.players)
+        round_obj = Round.objects.create(tournament=self.tournament, number=1)
+        self.game = Match.objects.create(
+            tournament=self.tournament, round=round_obj, white_player=self.players[0],
+            black_player=self.players[1], result='pending'
+        )
+        self.alone = Match.objects.create(
+            tournament=self.tournament, round=round_obj, white_player=self.players[2], result='pending'
+        )
+        update_tournament_standings(self.tournament)
+
+    def scores(self):
+        return dict(TournamentStanding.objects.filter(tournament=self.tournament).values_list('player_id', 'score'))
+
+    def set_result(self, match, result):
+        previous_result = match.result
+        match.result = result
+        match.save()
+        sync_player_games([match.pk])
+        apply_result_change(match, previous_result)
+
+    def assertPathsAgree(self, expected):
+        incremental = self.scores()
+        update_tournament_standings(self.tournament)
+        self.assertEqual(incremental, self.scores())
+        self.assertEqual([incremental[player.pk] for player in self.players], expected)
+        self.assertEqual(
+            dict(PlayerGame.objects.values_list('player_id', 'score')),
+            {player.pk: score for player, score in zip(self.players, expected)}
+        )
+
+    def test_forfeit_without_opponent(self):
+        self.set_result(self.game, 'black_forfeit')
+        self.set_result(self.alone, 'black_forfeit')
+        self.assertPathsAgree([1, 0, 0])
+
+    def test_bye(self):
+        self.set_result(self.game, 'draw')
+        self.set_result(self.alone, 'bye')
+        self.assertPathsAgree([0.5, 0.5, 1])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class StandingsQueryTests(TestCase):
+    """A full standings recompute takes the same queries for any field and writes only what changed"""
+
+    def create_tournament(self, num_players, rng):
+        tournament = Tournament.objects.create(name=f"{num_players} players", date=datetime.date.today())
+        players = User.objects.bulk_create([User(username=f"t{tournament.pk}p{i}") for i in range(num_players)])
+        tournament.participants.set(players)
+        for number in range(1, 4):
+            round_obj = Round.objects.create(tournament=tournament, number=number, is_completed=True)
+            order = rng.sample(players, num_players)
+            Match.objects.bulk_create([
+                Match(tournament=tournament, round=round_obj, white_player=white, black_player=black,
+                      result=rng.choice(['white_win', 'black_win', 'draw', 'white_forfeit', 'black_forfeit']))
+                for white, black in zip(order[::2], order[1::2])
+            ] + [Match(tournament=tournament, round=round_obj, white_player=order[-1], result='bye')])
+        return tournament
+
+    def recompute(self, tournament):
+        with CaptureQueriesContext(connection) as queries:
+            update_tournament_standings(tournament)
+        return queries
+
+    def test_scores_and_ranks(self):
+        tournament = self.create_tournament(9, random.Random(1))
+        self.recompute(tournament)
+
+        expected = {}
+        for white_id, black_id, result in Match.objects.values_list('white_player_id', 'black_player_id', 'result'):
+            white_points, black_points = match_points(result, black_id is not None)
+            expected[white_id] = expected.get(white_id, 0) + white_points
+            if black_id:
+                expected[black_id] = expected.get(black_id, 0) + black_points
+        standings = list(TournamentStanding.objects.filter(tournament=tournament).order_by('rank'))
+        self.assertEqual({standing.player_id: standing.score for standing in standings}, expected)
+        self.assertEqual(standings[0].rank, 1)
+        self.assertEqual([standing.score for standing in standings], sorted(expected.values(), reverse=True))
+
+        # Once the previous ranks have caught up, a recompute without changes writes nothing
+        self.recompute(tournament)
+        self.assertFalse([query for query in self.recompute(tournament) if query['sql'].startswith('UPDATE')])
+
+    def test_constant_queries(self):
+        rng = random.Random(2)
+        small = self.create_tournament(5, rng)
+        large = self.create_tournament(21, rng)
+        self.assertEqual(len(self.recompute(large)), len(self.recompute(small)))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class StandingSnapshotTests(TestCase):
+    """Snapshots keep the standings after every round, rebuilt right even after later rounds were played"""
+
+    def test_rebuilt_snapshots(self):
+        rng = random.Random(3)
+        tournament = Tournament.objects.create(name='Snapshots', date=datetime.date.today(), tournament_type='swiss')
+        players = User.objects.bulk_create([User(username=f"s{i}") for i in range(7)])
+        tournament.participants.set(players)
+
+        live = {}
+        for number in range(1, 4):
+            round_obj = Round.objects.create(tournament=tournament, number=number, is_published=True)
+            order = rng.sample(players, len(players))
+            Match.objects.bulk_create([
+                Match(tournament=tournament, round=round_obj, white_player=white, black_player=black,
+                      result=rng.choice(['white_win', 'black_win', 'draw']))
+                for white, black in zip(order[::2], order[1::2])
+            ] + [Match(tournament=tournament, round=round_obj, white_player=order[-1], result='bye')])
+            update_tournament_standings(tournament)
+            live[round_obj.pk] = {
+                standing.player_id: (standing.score, standing.rank, standing.buchholz)
+                for standing in TournamentStanding.objects.filter(tournament=tournament)
+            }
+
+        # All rounds at once, after the last one was played
+        with self.assertNumQueries(4):
+            snapshot_standings(tournament)
+        for round_id, standings in live.items():
+            self.assertEqual({
+                snapshot.player_id: (snapshot.score, snapshot.rank, snapshot.tiebreaks['buchholz'])
+                for snapshot in StandingSnapshot.objects.filter(round_id=round_id)
+            }, standings)
+
+        # Snapshots are written once
+        self.assertEqual(snapshot_standings(tournament), [])
+        self.assertEqual(StandingSnapshot.objects.count(), 21)
+
+
+class ClubMixin:
+    """Plays tournaments through the views, the way the arbiters do"""
+
+    RESULTS = ['white_win', 'black_win', 'draw', 'white_forfeit']
+
+    def setUp(self):
+        self.rng = random.Random(7)
+        self.client.force_login(User.objects.create(username='arbiter', is_staff=True))
+        self.players = User.objects.bulk_create([
+            User(username=f"c{i}", elo=1200 + self.rng.randint(0, 1000)) for i in range(10)
+        ])
+
+    def play(self, number, tournament_type='swiss', complete=True, size=None):
+        tournament = Tournament.objects.create(
+            name=f"Club {number}", date=datetime.date(2024, 1, 3) + datetime.timedelta(days=7 * number),
+            time_control=self.rng.choice(['bullet', 'blitz', 'rapid', 'classical'])
+        )
+        tournament.participants.set(self.rng.sample(self.players, size or self.rng.randint(4, 7)))
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.client.post(reverse('tournament_start', args=[tournament.pk]),
+                             {'tournament_type': tournament_type, 'num_rounds': 3})
+            while True:
+                round_obj = tournament.rounds.filter(is_published=True, is_completed=False).order_by('number').first()
+                if round_obj is None:
+                    break
+                for match in round_obj.matches.filter(black_player__isnull=False):
+                    self.client.post(reverse('inline_match_result', args=[match.pk]),
+                                     {'result': self.rng.choice(self.RESULTS)})
+                if not complete:
+                    break
+                self.client.post(reverse('complete_round', args=[tournament.pk, round_obj.pk]))
+            if complete:
+                self.client.post(reverse('complete_tournament', args=[tournament.pk]))
+        tournament.refresh_from_db()
+        return tournament
+
+    def correct(self, match, result):
+        """Correct a result through the result form, which also works on completed tournaments"""
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.client.post(reverse('match_result', args=[match.pk]), {'result': result})
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class PlayerStatsTests(ClubMixin, TestCase):
+    """The statistics counters kept by delta always equal a recompute from scratch"""
+
+    def assertCountersAgree(self):
+        fields = [field.name for field in PlayerStats._meta.fields if field.name not in ('id', 'player', 'time_control')]
+
+        def counters(rows):
+            return {
+                (row.player_id, row.time_control): values for row in rows
+                for values in [tuple(getattr(row, field) for field in fields)] if any(values)
+            }
+        self.assertEqual(counters(PlayerStats.objects.all()), counters(compute_player_stats().values()))
+
+    def test_counters(self):
+        tournaments = [self.play(n, tournament_type) for n, tournament_type in enumerate(
+            ['swiss', 'round_robin', 'swiss', 'double_round_robin']
+        )]
+        self.play(4, complete=False)
+        self.assertTrue(PlayerStats.objects.filter(tournaments_won__gt=0).exists())
+        self.assertCountersAgree()
+
+        # Corrections to a completed tournament move its games and its placings
+        for match in Match.objects.filter(tournament=tournaments[0], black_player__isnull=False)[:3]:
+            self.correct(match, 'black_win' if match.result == 'white_win' else 'white_win')
+        self.assertCountersAgree()
+
+        tournaments[1].delete()
+        tournaments[2].rounds.order_by('number').last().delete()
+        self.assertCountersAgree()
+
+
+def previous_achievements(user):
+    """
+    The achievements the checks before the rule registry gave a player, one query per check,
+    as {achievement_type: count}. Achievements tied to a tournament are only listed by type.
+    """
+    earned = {}
+    tournaments = list(Tournament.objects.filter(participants=user, is_completed=True).order_by('date', 'id'))
+    standings = {s.tournament_id: s for s in TournamentStanding.objects.filter(player=user, tournament__in=tournaments)}
+    placings = [standings[t.pk].rank for t in tournaments if t.pk in standings]
+    for achievement_type, threshold in (('tournament_veteran_10', 10), ('tournament_veteran_25', 25), ('tournament_veteran_50', 50)):
+        if len(tournaments) >= threshold:
+            earned[achievement_type] = len(tournaments)
+    for rank, thresholds in ((1, (1, 3, 5, 10)), (2, (3, 5)), (3, (3, 5))):
+        prefix = {1: 'tournament_win', 2: 'silver_medal', 3: 'bronze_medal'}[rank]
+        for threshold in thresholds:
+            if placings.count(rank) >= threshold:
+                earned[f"{prefix}_{threshold}"] = placings.count(rank)
+
+    won = [t for t in tournaments if t.pk in standings and standings[t.pk].rank == 1]
+    for t in won:
+        earned[achievement_service.SpecialistRule.FORMATS[t.tournament_type]] = None
+        earned[achievement_service.SpecialistRule.TIME_CONTROLS[t.time_control]] = None
+    seasons = achievement_service.TitleCollectionRule.SEASONS
+    if len({t.time_control for t in won}) == 4:
+        earned['grand_slam'] = None
+    if len({t.tournament_type for t in won}) == 3:
+        earned['format_master'] = None
+    if len({seasons[t.date.month] for t in won}) == 4:
+        earned['seasonal_champion'] = None
+
+    perfect_tournaments = 0
+    for t in tournaments:
+        results = list(PlayerGame.objects.filter(tournament=t, player=user).exclude(result='pending')
+                       .order_by('round_number').values_list('result', flat=True))
+        standing = standings.get(t.pk)
+        wins, losses = results.count('win'), results.count('loss')
+        perfect_tournaments += bool(results) and not losses
+        if standing and results:
+            checks = {
+                'comeback_kid': standing.rank == 1 and results[0] == 'loss',
+                'perfect_score': wins == len(results),
+                'undefeated': not losses,
+                'support_bear': not wins,
+                'dummies': standing.rank == t.participants.count(),
+                'goat': standing.rank == 1 and wins == len(results),
+                'truce_seeker': (len(results) - wins - losses) / len(results) >= 0.5,
+                # On the ratings at completion, which the tournament keeps since the registry
+                'giant_slayer': PlayerGame.objects.filter(tournament=t, player=user, opponent=t.highest_rated, result='win').exists(),
+            }
+            earned.update((achievement_type, None) for achievement_type, check in checks.items() if check)
+        if len(results) >= 2 and results[-1] == 'win' and all(r not in ('win', 'draw') for r in results[:-1]):
+            earned['last_stand'] = None
+        rounds = list(t.rounds.order_by('-number'))
+        if standing and standing.rank == 1 and len(rounds) >= 2:
+            snapshots = StandingSnapshot.objects.filter(round=rounds[1])
+            snapshot = snapshots.filter(player=user).first()
+            if snapshot and snapshot.rank - 1 >= snapshots.count() / 2:
+                earned['comeback_king'] = None
+        if standing and len(rounds) >= 5 and standing.score >= 0.9 * len(rounds):
+            earned['score_maximizer'] = None
+    if perfect_tournaments >= 5:
+        earned['the_perfectionist'] = None
+    if won and sum(t.date < won[0].date for t in tournaments) >= 10:
+        earned['late_bloomer'] = None
+
+    dates = list(user.tournaments.order_by('date').values_list('date', flat=True))
+    weeks = best = 1
+    for before, after in zip(dates, dates[1:]):
+        weeks = weeks + 1 if 5 <= (after - before).days <= 9 else 1
+        best = max(best, weeks)
+    if len(dates) >= 10 and best >= 10:
+        earned['bar_legend'] = None
+
+    games = list(PlayerGame.objects.filter(player=user).exclude(result='pending')
+                 .order_by('date', 'tournament_id', 'round_number', 'match_id').select_related('opponent'))
+    streaks = {'all': [0, 0], 'white': [0, 0], 'black': [0, 0]}
+    draws = max_draws = 0
+    pattern = []
+    by_opponent = {}
+    by_date = {}
+    for game in games:
+        won_game = game.result == 'win'
+        for key in ('all', game.color):
+            streaks[key][0] = streaks[key][0] + 1 if won_game else 0
+            streaks[key][1] = max(streaks[key])
+        if won_game:
+            streaks['black' if game.color == 'white' else 'white'][0] = 0
+        draws = draws + 1 if game.result == 'draw' else 0
+        max_draws = max(max_draws, draws)
+        if game.result != 'draw':
+            pattern.append('win' if won_game else 'loss')
+        if game.opponent_id:
+            by_opponent.setdefault(game.opponent_id, []).append(won_game)
+        by_date[game.date] = by_date.get(game.date, 0) + 1
+    for achievement_type, length in (('hat_trick', 3), ('winning_streak_5', 5), ('winning_streak_10', 10)):
+        if streaks['all'][1] >= length:
+            earned[achievement_type] = None
+    if streaks['white'][1] >= 5:
+        earned['white_dominator'] = None
+    if streaks['black'][1] >= 5:
+        earned['black_defender'] = None
+    if max_draws >= 3:
+        earned['draw_magnet'] = None
+    if any(pattern[i:i + 6] == achievement_service.ResultPatternRule.PHOENIX for i in range(len(pattern))):
+        earned['phoenix_rising'] = None
+    if len(by_opponent) >= 15:
+        earned['social_butterfly'] = None
+    for results in by_opponent.values():
+        if any(results[i:i + 3] == [True] * 3 for i in range(len(results))):
+            earned['rival_nemesis'] = None
+    if len(games) >= 100:
+        earned['century_club'] = None
+    if max(by_date.values(), default=0) >= 10:
+        earned['blitz_marathon'] = None
+    underdog = sum(1 for game in games if game.result == 'win' and game.opponent and game.opponent.elo >= user.elo + 200)
+    if underdog:
+        earned['underdog'] = underdog
+    forfeits = sum(1 for game in games if game.result == 'forfeit_loss')
+    if forfeits >= 3:
+        earned['early_departure'] = forfeits
+    for achievement_type, threshold in achievement_service.RatingMilestoneRule.THRESHOLDS.items():
+        if user.blitz_elo >= threshold:
+            earned[achievement_type] = None
+    return earned
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class AchievementRuleTests(ClubMixin, TestCase):
+    """The rule registry gives every player the achievements the per-player checks before it gave"""
+
+    COUNTED = {
+        'tournament_veteran_10', 'tournament_veteran_25', 'tournament_veteran_50', 'tournament_win_1',
+        'tournament_win_3', 'tournament_win_5', 'tournament_win_10', 'silver_medal_3', 'silver_medal_5',
+        'bronze_medal_3', 'bronze_medal_5', 'underdog', 'early_departure',
+    }
+
+    def achievements(self, player):
+        return {
+            achievement_type: count if achievement_type in self.COUNTED else None
+            for achievement_type, count in Achievement.objects.filter(user=player).values_list('achievement_type', 'count')
+        }
+
+    def test_registry_matches_previous_checks(self):
+        formats = ['swiss', 'round_robin', 'double_round_robin']
+        for number in range(8):
+            self.play(number, formats[number % 3])
+        self.play(8, complete=False)
+
+        # Both replay the full history on today's ratings
+        Achievement.objects.all().delete()
+        AchievementProgress.objects.all().delete()
+        awarded = set()
+        for player in User.objects.filter(pk__in=[player.pk for player in self.players]):
+            achievement_service.check_achievements(player)
+            # Kingmaker came after the registry, the previous checks had none
+            found = self.achievements(player)
+            found.pop('kingmaker', None)
+            self.assertEqual(found, previous_achievements(player), player.username)
+            awarded.update(found)
+        self.assertGreater(len(awarded), 10)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class AchievementProgressTests(ClubMixin, TestCase):
+    """Folding new games into the saved rule states gives what a full replay of the history gives"""
+
+    def assertIncrementalIsFull(self):
+        players = list(User.objects.filter(pk__in=[player.pk for player in self.players]))
+        incremental, _ = achievement_service.evaluate_players(players)
+        for player in players:
+            full = achievement_service.evaluate(achievement_service.PlayerHistory.load(player))
+            self.assertEqual(
+                sorted((a.achievement_type, a.count, a.tournament_id) for a in incremental[player.pk]),
+                sorted((a.achievement_type, a.count, a.tournament_id) for a in full),
+                player.username
+            )
+
+    def test_late_result_change(self):
+        tournaments = [self.play(number) for number in range(5)]
+        self.play(5, complete=False)
+        self.assertTrue(AchievementProgress.objects.exists())
+        self.assertIncrementalIsFull()
+
+        # Turn around the results of the first tournament, long behind every watermark
+        first = Match.objects.filter(tournament=tournaments[0], black_player__isnull=False).order_by('id')
+        for match in first:
+            self.correct(match, 'black_win' if match.result == 'white_win' else 'white_win')
+        players = set(first.values_list('white_player', flat=True)) | set(first.values_list('black_player', flat=True))
+        self.assertFalse(AchievementProgress.objects.filter(player__in=players).exists())
+        self.assertTrue(AchievementProgress.objects.exclude(player__in=players).exists())
+        self.assertIncrementalIsFull()
+
+        # And check again with the progress saved after the change
+        achievement_service.check_players_achievements(list(User.objects.filter(pk__in=players)))
+        self.play(6)
+        self.assertIncrementalIsFull()
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class TournamentAchievementTests(ClubMixin, TestCase):
+    """Checking a tournament's participants together gives what checking them one by one gives"""
+
+    def awards(self, awards):
+        return sorted((a.achievement_type, a.count or 1, a.tournament_id) for a in awards)
+
+    def test_batch_matches_single_checks(self):
+        for number in range(4):
+            self.play(number, ['swiss', 'round_robin'][number % 2])
+        Achievement.objects.all().delete()
+        AchievementProgress.objects.all().delete()
+
+        players = list(User.objects.filter(pk__in=[player.pk for player in self.players]))
+        batch, _ = achievement_service.evaluate_players(players)
+        for player in players:
+            single, _ = achievement_service.evaluate_players([player])
+            self.assertEqual(self.awards(batch[player.pk]), self.awards(single[player.pk]), player.username)
+
+        tournament = Tournament.objects.latest('date')
+        new_achievements = achievement_service.check_tournament_achievements(tournament)
+        self.assertEqual(set(new_achievements), set(tournament.participants.all()))
+        for participant, achievements in new_achievements.items():
+            self.assertEqual(self.awards(achievements), self.awards(batch[participant.pk]))
+            self.assertEqual(Achievement.objects.filter(user=participant).count(), len(achievements))
+
+    def test_queries_do_not_grow_with_participants(self):
+        small, large = self.play(0, size=4), self.play(1, size=8)
+        queries = []
+        for tournament in (small, large):
+            Achievement.objects.all().delete()
+            AchievementProgress.objects.all().delete()
+            with CaptureQueriesContext(connection) as context:
+                achievement_service.check_tournament_achievements(tournament)
+            queries.append(len(context))
+        self.assertEqual(queries[0], queries[1])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class BackfillAchievementsTests(ClubMixin, TestCase):
+    """The shards of a backfill, resumed or not, add up to checking every player together"""
+
+    def setUp(self):
+        super().setUp()
+        for number in range(4):
+            self.play(number, ['swiss', 'round_robin'][number % 2])
+        self.player_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+        self.reset()
+        achievement_service.check_players_achievements(list(User.objects.all()))
+        self.expected = self.achievements()
+        self.assertTrue(self.expected)
+        self.reset()
+
+    def reset(self):
+        Achievement.objects.all().delete()
+        AchievementProgress.objects.all().delete()
+
+    def achievements(self):
+        return set(Achievement.objects.values_list('user', 'achievement_type', 'count', 'tournament'))
+
+    def backfill(self, *args):
+        call_command('backfill_achievements', '--workers=1', '--shard-size=3', *args, stdout=io.StringIO())
+
+    def test_shards(self):
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint = os.path.join(directory, 'checkpoint.json')
+            self.backfill(f"--checkpoint={checkpoint}")
+            self.assertEqual(self.achievements(), self.expected)
+            self.assertFalse(os.path.exists(checkpoint))
+
+            # An interrupted run resumes after its completed shards
+            self.reset()
+            with open(checkpoint, 'w') as f:
+                json.dump({'done': [[self.player_ids[0], self.player_ids[2]]]}, f)
+            self.backfill(f"--checkpoint={checkpoint}")
+            skipped = set(self.player_ids[:3])
+            self.assertTrue(any(row[0] in skipped for row in self.expected))
+            self.assertEqual(self.achievements(), {row for row in self.expected if row[0] not in skipped})
+
+            self.backfill(f"--checkpoint={checkpoint}", '--restart')
+            self.assertEqual(self.achievements(), self.expected)
+
+    def test_single_scan_and_dry_run(self):
+        self.backfill('--dry-run')
+        self.assertFalse(Achievement.objects.exists())
+        self.assertFalse(AchievementProgress.objects.exists())
+
+        self.backfill('--single-scan')
+        self.assertEqual(self.achievements(), self.expected)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class ClubScanTests(ClubMixin, TestCase):
+    """One scan over the whole club gives every player the awards and progress of their own history"""
+
+    def progress(self, rows):
+        return {
+            row.player_id: (row.tournament_id, row.date, row.match_id, row.tournaments, row.state) for row in rows
+        }
+
+    def test_club_scan_matches_players(self):
+        for number in range(6):
+            self.play(number, ['swiss', 'round_robin', 'double_round_robin'][number % 3])
+        self.play(6, complete=False)
+        self.play(7)
+        AchievementProgress.objects.all().delete()
+
+        with CaptureQueriesContext(connection) as context:
+            players, club_awards, club_saved = achievement_service.evaluate_club()
+        self.assertLessEqual(len(context), 8)
+
+        awards, saved = achievement_service.evaluate_players(players)
+        for player in players:
+            self.assertEqual(
+                sorted((a.achievement_type, a.count, a.tournament_id) for a in club_awards[player.pk]),
+                sorted((a.achievement_type, a.count, a.tournament_id) for a in awards[player.pk]),
+                player.username
+            )
+        self.assertEqual(self.progress(club_saved), self.progress(saved))
+
+        # The tournament left open holds back the watermark of its participants
+        self.assertGreater(len({a.achievement_type for player_awards in awards.values() for a in player_awards}), 10)
+        self.assertGreater(len({row.tournament_id for row in saved}), 1)
+
+
+class DirectEncounterTests(SimpleTestCase):
+    """Direct encounter only separates players still tied on the tiebreaks before it"""
+
+    # A, B and C score 2 and beat each other in a cycle; A has the higher Buchholz
+    GAMES = [
+        (1, 'A', 'B', 'white_win'), (1, 'C', 'E', 'white_win'),
+        (2, 'B', 'C', 'white_win'), (2, 'A', 'D', 'white_win'),
+        (3, 'C', 'A', 'white_win'), (3, 'B', 'E', 'white_win'),
+        (4, 'D', 'E', 'white_win'),
+    ]
+
+    def ranks(self, order):
+        standings = standings_after_rounds(list('ABCDE'), self.GAMES, [4], order)[4]
+        return {standing.player_id: standing.rank for standing in standings}
+
+    def test_after_buchholz(self):
+        ranks = self.ranks(['buchholz', 'direct_encounter'])
+        self.assertEqual([ranks[player] for player in 'ABC'], [1, 2, 3])
+
+    def test_first(self):
+        # Everyone in the cycle scored one point against the others
+        ranks = self.ranks(['direct_encounter'])
+        self.assertEqual([ranks[player] for player in 'ABC'], [1, 1, 1])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CacheVersionTests(TestCase):
+    """A version never goes back to a value it had before, and only moves on for changes that show"""
+
+    def test_eviction_and_bumps(self):
+        seen = [cache_service.tournament_version(1)]
+        self.assertEqual(cache_service.tournament_version(1), seen[0])
+
+        cache.delete(cache_service.tournament_version_key(1))
+        seen.append(cache_service.tournament_version(1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cache_service.bump_tournament_version(1)
+        seen.append(cache_service.tournament_version(1))
+
+        cache.delete(cache_service.tournament_version_key(1))
+        with self.captureOnCommitCallbacks(execute=True):
+            cache_service.bump_tournament_version(1)
+        seen.append(cache_service.tournament_version(1))
+
+        self.assertEqual(len(set(seen)), len(seen))
+
+    def test_profile_saves(self):
+        player = User.objects.create(username='player')
+        version = cache_service.player_version(player.pk)
+
+        # Logging in only writes last_login
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.force_login(player)
+        self.assertEqual(cache_service.player_version(player.pk), version)
+
+        player.lichess_account = 'player'
+        with self.captureOnCommitCallbacks(execute=True):
+            player.save(update_fields=['lichess_account'])
+        self.assertNotEqual(cache_service.player_version(player.pk), version)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_round_etag(self):
+        white, black = User.objects.create(username='white'), User.objects.create(username='black')
+        tournament = Tournament.objects.create(name='t', date=datetime.date.today())
+        round_obj = Round.objects.create(tournament=tournament, number=1, is_published=True)
+        match = Match.objects.create(tournament=tournament, round=round_obj, white_player=white, black_player=black)
+        url = reverse('tournament_round', args=[tournament.pk, 1])
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.client.force_login(User.objects.create(username='arbiter', is_staff=True))
+        with self.captureOnCommitCallbacks(execute=True), contextlib.redirect_stdout(io.StringIO()):
+            self.client.post(reverse('inline_match_result', args=[match.pk]), {'result': 'draw'})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, '½-½')
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ParticipantCountTests(TestCase):
+    """Registrations keep the stored participant counts of just the tournaments they touch"""
+
+    def setUp(self):
+        self.players = [User.objects.create(username=f"p{i}") for i in range(3)]
+        self.tournaments = [
+            Tournament.objects.create(name=f"t{i}", date=datetime.date.today()) for i in range(3)
+        ]
+        for tournament in self.tournaments[:2]:
+            tournament.participants.set(self.players)
+
+    def counts(self):
+        return list(Tournament.objects.order_by('pk').values_list('participant_count', flat=True))
+
+    def test_clear_from_player(self):
+        Tournament.objects.filter(pk=self.tournaments[2].pk).update(participant_count=99)
+        self.players[0].tournaments.clear()
+        self.assertEqual(self.counts(), [2, 2, 99])
+
+    def test_clear_from_tournament(self):
+        versions = [cache_service.player_version(player.pk) for player in self.players]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tournaments[0].participants.clear()
+        self.assertEqual(self.counts(), [0, 3, 0])
+        for player, version in zip(self.players, versions):
+            self.assertNotEqual(cache_service.player_version(player.pk), version)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class KingmakerTests(TestCase):
+    """Kingmaker goes to a player who beats a leader in the final round, who then does not win"""
+
+    def setUp(self):
+        self.a, self.b, self.c, self.d = [User.objects.create(username=name) for name in 'abcd']
+
+    def play(self, *rounds):
+        tournament = Tournament.objects.create(name='Final round', date=datetime.date.today(), has_started=True)
+        tournament.participants.set([self.a, self.b, self.c, self.d])
+        for number, games in enumerate(rounds, start=1):
+            round_obj = Round.objects.create(tournament=tournament, number=number, is_completed=True)
+            for white, black, result in games:
+                Match.objects.create(
+                    tournament=tournament, round=round_obj, white_player=white, black_player=black, result=result
+                )
+        update_tournament_standings(tournament)
+        snapshot_standings(tournament)
+        tournament.is_completed = True
+        tournament.save()
+        update_tournament_summary(tournament)
+
+    def kingmakers(self):
+        players = list(User.objects.order_by('pk'))
+        histories = achievement_service.load_histories(players, {})
+        found = {
+            player.username for player in players
+            if 'kingmaker' in {award.achievement_type for award in achievement_service.evaluate(histories[player.pk])}
+        }
+        _, awards, _ = achievement_service.evaluate_club()
+        self.assertEqual(found, {
+            player.username for player in players
+            if 'kingmaker' in {award.achievement_type for award in awards[player.pk]}
+        })
+        return found
+
+    def test_leader_loses_the_tournament(self):
+        self.play(
+            [(self.a, self.b, 'white_win'), (self.c, self.d, 'draw')],
+            [(self.c, self.a, 'white_win'), (self.b, self.d, 'white_win')],
+        )
+        self.assertEqual(self.kingmakers(), {'c'})
+
+    def test_leader_still_wins(self):
+        self.play(
+            [(self.a, self.b, 'white_win'), (self.c, self.d, 'draw')],
+            [(self.c, self.a, 'draw'), (self.b, self.d, 'white_win')],
+        )
+        self.assertEqual(self.kingmakers(), set())
@@ -0,0 +1,181 @@
+"""
+Tiebreak engine.
+
+All results of a tournament are loaded in one query into a players x rounds result matrix
+(points scored, opponent, whether the game was played over the board). Every tiebreak is
+then a vectorised pass over that matrix, so refreshing the standings does not query the
+opponents of each player.
+
+Unplayed rounds (byes and forfeits) follow the FIDE tiebreak regulations: they count as a
+game against a dummy opponent with the player's own score, and an opponent's unplayed
+rounds count as draws when that opponent's score is used for Buchholz.
+"""
+import numpy as np
+
+from .pairing_service import MATCH_POINTS, match_points
+
+
+# Field on TournamentStanding for every tiebreak, with its usual abbreviation
+TIEBREAK_LABELS = {
+    'direct_encounter': 'DE',
+    'buchholz': 'BH',
+    'median_buchholz': 'MBH',
+    'sonneborn_berger': 'SB',
+    'progressive': 'PS',
+}
+
+# Order used when a tournament has none of its own
+DEFAULT_TIEBREAK_ORDER = {
+    'swiss': ['buchholz', 'median_buchholz', 'direct_encounter', 'progressive'],
+    'round_robin': ['direct_encounter', 'sonneborn_berger'],
+    'double_round_robin': ['direct_encounter', 'sonneborn_berger'],
+}
+
+UNPLAYED_RESULTS = {'bye', 'white_forfeit', 'black_forfeit'}
+
+
+class ResultMatrix:
+    """Results of a tournament as players x rounds arrays"""
+    __slots__ = ('player_ids', 'points', 'opponents', 'played', 'unplayed')
+
+    def __init__(self, player_ids, games):
+        """
+        games: (round_number, white_id, black_id, result) tuples. Pending games and
+        players that are not in player_ids are left out.
+        """
+        self.player_ids = list(player_ids)
+        index = {player_id: i for i, player_id in enumerate(self.player_ids)}
+        games = [game for game in games if game[3] in MATCH_POINTS and game[1] in index]
+        rounds = {game[0] for game in games}
+        column = {number: i for i, number in enumerate(sorted(rounds))}
+
+        shape = (len(self.player_ids), len(rounds))
+        self.points = np.zeros(shape)
+        self.opponents = np.full(shape, -1)
+        self.played = np.zeros(shape, dtype=bool)     # Game over the board against a real opponent
+        self.unplayed = np.zeros(shape, dtype=bool)   # Bye or forfeit
+
+        for round_number, white_id, black_id, result in games:
+            r = column[round_number]
+            white_points, black_points = match_points(result, black_id is not None)
+            w = index[white_id]
+            b = index.get(black_id)
+            self.points[w, r] = white_points
+            if b is None:
+                self.unplayed[w, r] = True
+                continue
+            self.points[b, r] = black_points
+            if result in UNPLAYED_RESULTS:
+                self.unplayed[w, r] = self.unplayed[b, r] = True
+            else:
+                self.opponents[w, r] = b
+                self.opponents[b, r] = w
+                self.played[w, r] = self.played[b, r] = True
+
+    @classmethod
+    def load(cls, tournament_id, player_ids):
+        """Load the results of a tournament in one query"""
+        from .models import Match
+
+        return cls(player_ids, Match.objects.filter(tournament_id=tournament_id).values_list(
+            'round__number', 'white_player_id', 'black_player_id', 'result'
+        ))
+
+
+def compute_tiebreaks(matrix, order=()):
+    """
+    All tiebreaks of every player, as arrays aligned with matrix.player_ids. order is the
+    tournament's tiebreak order; direct encounter is decided between the players still
+    tied on score and on the tiebreaks that come before it.
+    """
+    points = matrix.points
+    played = matrix.played
+    counted = played | matrix.unplayed
+    score = points.sum(axis=1)
+    # Opponent index that is safe to use on unplayed rounds, masked out afterwards
+    opponents = np.where(played, matrix.opponents, 0)
+
+    # Scores used for Buchholz: an opponent's unplayed rounds count as draws
+    adjusted = np.where(played, points, 0).sum(axis=1) + 0.5 * matrix.unplayed.sum(axis=1)
+    contributions = np.where(played, adjusted[opponents], 0) + np.where(matrix.unplayed, score[:, None], 0)
+    buchholz = contributions.sum(axis=1)
+
+    # Median-Buchholz drops the highest and lowest contribution once there are three or more
+    cut = counted.sum(axis=1) >= 3
+    highest = np.where(counted, contributions, 0).max(axis=1, initial=0)
+    lowest = np.where(counted, contributions, np.inf).min(axis=1, initial=np.inf)
+    highest[~cut] = 0
+    lowest[~cut] = 0
+    median_buchholz = buchholz - highest - lowest
+
+    sonneborn_berger = np.where(played, score[opponents] * points, 0).sum(axis=1)
+    progressive = np.cumsum(points, axis=1).sum(axis=1)
+
+    tiebreaks = {
+        'buchholz': buchholz,
+        'median_buchholz': median_buchholz,
+        'sonneborn_berger': sonneborn_berger,
+        'progressive': progressive,
+    }
+    order = list(order)
+    preceding = order[:order.index('direct_encounter')] if 'direct_encounter' in order else []
+    tiebreaks['direct_encounter'] = direct_encounter(
+        score, opponents, played, points, [tiebreaks[key] for key in preceding]
+    )
+    return tiebreaks
+
+
+def direct_encounter(score, opponents, played, points, preceding=()):
+    """
+    Points scored against the players on the same score and the same preceding tiebreaks,
+    for groups of tied players that have all met each other. Everyone else gets 0.
+    """
+    n = len(score)
+    result = np.zeros(n)
+    if not played.any():
+        return result
+
+    rows = np.nonzero(played)
+    met = np.zeros((n, n), dtype=bool)
+    met[rows[0], opponents[rows]] = True
+    scored = np.zeros((n, n))
+    np.add.at(scored, (rows[0], opponents[rows]), points[rows])
+
+    ties = np.column_stack([score, *preceding])
+    _, groups, sizes = np.unique(ties, axis=0, return_inverse=True, return_counts=True)
+    groups = groups.reshape(-1)
+    for group in np.nonzero(sizes > 1)[0]:
+        members = np.nonzero(groups == group)[0]
+        between = met[np.ix_(members, members)]
+        if between.sum() == len(members) * (len(members) - 1):
+            result[members] = scored[np.ix_(members, members)].sum(axis=1)
+    return result
+
+
+def tiebreak_order(tournament):
+    """The tiebreaks of a tournament in the order they are applied"""
+    if tournament.tiebreak_order:
+        return [key.strip() for key in tournament.tiebreak_order.split(',') if key.strip() in TIEBREAK_LABELS]
+    return DEFAULT_TIEBREAK_ORDER.get(tournament.tournament_type, DEFAULT_TIEBREAK_ORDER['swiss'])
+
+
+def apply_tiebreaks(tournament_id, standings, order=()):
+    """
+    Compute the tiebreaks of a tournament, applied in the given order, and set them on
+    its standings. Returns the standings whose tiebreaks changed.
+    """
+    standings = list(standings)
+    matrix = ResultMatrix.load(tournament_id, [standing.player_id for standing in standings])
+    tiebreaks = compute_tiebreaks(matrix, order)
+
+    changed = []
+    for i, standing in enumerate(standings):
+        different = False
+        for key, values in tiebreaks.items():
+            value = float(values[i])
+            if getattr(standing, key) != value:
+                setattr(standing, key, value)
+                different = True
+        if different:
+            changed.append(standing)
+    return changed
@@ -23,6 +23,7 @@ urlpatterns = [
     path('tournament/<int:tournament_id>/remove-player/<int:player_id>/', views.remove_player_from_tournament, name='remove_player_from_tournament'),
     path('tournament/<int:tournament_id>/complete/', views.complete_tournament, name='complete_tournament'),
     path('tournament/<int:tournament_id>/round/<int:round_id>/complete/', views.complete_round, name='complete_round'),
+    path('tournament/<int:tournament_id>/rounds/<int:number>/', views.tournament_round, name='tournament_round'),
     path('tournament/<int:pk>/delete/', views.DeleteTournamentView.as_view(), name='tournament_delete'),
 
     path('tournament/<int:tournament_id>/register/', views.register_for_tournament, name='tournament_register'),
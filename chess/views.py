@@ -5,17 +5,26 @@ from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse_lazy
 from django.contrib import messages
-from django.db.models import F, Count, Sum, Q, Avg
+from django.db.models import F, Count, Sum, Q, Avg, Prefetch
 from django.http import HttpResponseRedirect, JsonResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import etag, require_GET
 from django.views.generic import TemplateView
 from django.utils import timezone
 import datetime
+import functools
+import logging
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import logout
 
-from .models import Achievement, PlayerRatingHistory, Tournament, User, Match, Round, TournamentStanding
+from .models import Achievement, PlayerGame, PlayerRatingHistory, Tournament, User, Match, Round, TournamentStanding
+from .player_stats_service import credit_tournament, player_stats, recent_matches
+from .cache_service import FRAGMENT_TIMEOUT, deferred, deferred_group, player_version, ratings_version, tournament_version
+from .leaderboard_service import leaderboard
 from .forms import EmptyForm, MatchResultForm, ProfileEditForm, SimplePlayerRegistrationForm, StartTournamentSettingsForm, TournamentForm, UserEditForm, UserRegistrationForm, AddPlayerToTournamentForm
-from .utils import generate_swiss_pairings, generate_round_robin_pairings, update_tournament_standings
+from .tiebreak_service import TIEBREAK_LABELS, tiebreak_order
+from .utils import apply_result_change, delete_rounds, generate_swiss_pairings, generate_round_robin_pairings, publish_round, schedule_round_robin, snapshot_standings, update_tournament_standings, update_tournament_summary
+from .rating_service import rate_round, rate_tournament, record_rating_history, set_overall_rating
 
 
 class HomeView(ListView):
@@ -25,50 +34,28 @@ class HomeView(ListView):
     context_object_name = 'players'
     
     def get_queryset(self):
-        # Get users ordered by Elo rating, excluding superusers/staff
-        players = list(User.objects.filter(
-            is_active=True, 
-            is_staff=False, 
-            is_superuser=False
-        ).order_by('-elo')[:20])
+        # Top players by overall rating, from the cached leaderboard
+        players = leaderboard('overall')
         
-        # Calculate match statistics for each player
+        # Match statistics of all players from their stored counters, in one query
+        stats = player_stats([player['id'] for player in players])
         for player in players:
-            # Get player's match history
-            white_matches = player.white_matches.exclude(result='pending')
-            black_matches = player.black_matches.exclude(result='pending')
-            
-            # Calculate win/loss/draw stats
-            wins = white_matches.filter(result='white_win').count() + black_matches.filter(result='black_win').count()
-            losses = white_matches.filter(result='black_win').count() + black_matches.filter(result='white_win').count()
-            draws = white_matches.filter(result='draw').count() + black_matches.filter(result='draw').count()
-            
-            player.wins = wins
-            player.losses = losses
-            player.draws = draws
-            player.total_games = wins + losses + draws
+            player_stats_row = stats[player['id']]
+            player['wins'] = player_stats_row.wins
+            player['losses'] = player_stats_row.losses
+            player['draws'] = player_stats_row.draws
+            player['total_games'] = player_stats_row.total_games
         
         return players
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # Sort players by each time control rating
-        context['bullet_players'] = list(User.objects.filter(
-            is_active=True, is_staff=False, is_superuser=False
-        ).order_by('-bullet_elo')[:20])
-        
-        context['blitz_players'] = list(User.objects.filter(
-            is_active=True, is_staff=False, is_superuser=False
-        ).order_by('-blitz_elo')[:20])
-        
-        context['rapid_players'] = list(User.objects.filter(
-            is_active=True, is_staff=False, is_superuser=False
-        ).order_by('-rapid_elo')[:20])
-        
-        context['classical_players'] = list(User.objects.filter(
-            is_active=True, is_staff=False, is_superuser=False
-        ).order_by('-classical_elo')[:20])
+        # Players by each time control rating, from the cached leaderboards
+        context['bullet_players'] = leaderboard('bullet')
+        context['blitz_players'] = leaderboard('blitz')
+        context['rapid_players'] = leaderboard('rapid')
+        context['classical_players'] = leaderboard('classical')
         
         # Make sure we're getting tournaments from today onward and they're not completed
         from django.utils import timezone
@@ -84,6 +71,7 @@ class HomeView(ListView):
 class PlayerDetailView(DetailView):
     """View for player profiles"""
     model = User
+    queryset = User.objects.prefetch_related('ratings')
     template_name = 'chess/player_detail.html'
     context_object_name = 'player'
     
@@ -94,14 +82,9 @@ class PlayerDetailView(DetailView):
         # Get player's tournaments (most recent first)
         context['tournaments'] = player.tournaments.all().order_by('-date')
         
-        # Get player's match history
-        white_matches = player.white_matches.exclude(result='pending')
-        black_matches = player.black_matches.exclude(result='pending')
-        
-        # Calculate win/loss/draw stats
-        wins = white_matches.filter(result='white_win').count() + black_matches.filter(result='black_win').count()
-        losses = white_matches.filter(result='black_win').count() + black_matches.filter(result='white_win').count()
-        draws = white_matches.filter(result='draw').count() + black_matches.filter(result='draw').count()
+        # Win/loss/draw stats, overall and by color, from the stored counters
+        stats = player_stats([player.id])[player.id]
+        wins, losses, draws = stats.wins, stats.losses, stats.draws
         
         context['wins'] = wins
         context['losses'] = losses
@@ -109,13 +92,8 @@ class PlayerDetailView(DetailView):
         context['total_games'] = wins + losses + draws
         
         # Add performance by color stats
-        white_wins = white_matches.filter(result='white_win').count()
-        white_losses = white_matches.filter(result='black_win').count()
-        white_draws = white_matches.filter(result='draw').count()
-        
-        black_wins = black_matches.filter(result='black_win').count()
-        black_losses = black_matches.filter(result='white_win').count()
-        black_draws = black_matches.filter(result='draw').count()
+        white_wins, white_losses, white_draws = stats.white_wins, stats.white_losses, stats.white_draws
+        black_wins, black_losses, black_draws = stats.black_wins, stats.black_losses, stats.black_draws
         
         context['white_wins'] = white_wins
         context['white_losses'] = white_losses
@@ -137,31 +115,24 @@ class PlayerDetailView(DetailView):
         context['white_win_rate'] = white_win_rate
         context['black_win_rate'] = black_win_rate
         
-        # Recent match history (most recent first - reversed order)
-        combined_matches = list(white_matches) + list(black_matches)
-        combined_matches.sort(key=lambda x: (x.round.tournament.date, x.round.number), reverse=True)
-        context['recent_matches'] = combined_matches[:10]  # Keep only the 10 most recent
+        # Recent match history (most recent first)
+        context['recent_matches'] = recent_matches(player)
         
         # Calculate blitz rating change over last month
         from django.utils import timezone
         import datetime
         one_month_ago = timezone.now() - datetime.timedelta(days=30)
         
-        # Get blitz matches from tournaments in the last month
-        blitz_matches = Match.objects.filter(
-            (Q(white_player=player) | Q(black_player=player)),
-            tournament__time_control='blitz',
-            tournament__date__gte=one_month_ago,
-            result__in=['white_win', 'black_win', 'draw']
-        ).order_by('tournament__date', 'round__number')
-        
-        # Get the earliest blitz match from more than a month ago to establish baseline
-        earliest_match = Match.objects.filter(
-            (Q(white_player=player) | Q(black_player=player)),
-            tournament__time_control='blitz',
-            tournament__date__lt=one_month_ago,
-            result__in=['white_win', 'black_win', 'draw']
-        ).order_by('-tournament__date', '-round__number').first()
+        # Get blitz games from tournaments in the last month
+        blitz_games = PlayerGame.objects.filter(
+            player=player,
+            time_control='blitz',
+            result__in=['win', 'loss', 'draw']
+        )
+        blitz_matches = blitz_games.filter(date__gte=one_month_ago)
+        
+        # Is there a blitz game from more than a month ago to establish a baseline
+        earliest_match = blitz_games.filter(date__lt=one_month_ago).exists()
         
         # Calculate rating change
         blitz_rating_month_ago = 1500  # Default starting rating
@@ -169,7 +140,7 @@ class PlayerDetailView(DetailView):
         if earliest_match:
             # This is a simplified approximation - in reality you'd need a rating history table
             # to accurately track historical ratings
-            blitz_rating_month_ago = player.blitz_elo - (10 * len(blitz_matches))
+            blitz_rating_month_ago = player.blitz_elo - (10 * blitz_matches.count())
         
         context['blitz_rating_change'] = player.blitz_elo - blitz_rating_month_ago
         
@@ -231,45 +202,28 @@ class PlayerDetailView(DetailView):
 
         one_month_ago = timezone.now() - datetime.timedelta(days=30)
 
-        # Get blitz matches from tournaments in the last month
-        blitz_matches = Match.objects.filter(
-            (Q(white_player=player) | Q(black_player=player)),
-            tournament__time_control='blitz',
-            tournament__date__gte=one_month_ago,
-            result__in=['white_win', 'black_win', 'draw']
-        ).order_by('tournament__date', 'round__number')
+        # Get blitz games from tournaments in the last month
+        blitz_games = PlayerGame.objects.filter(
+            player=player,
+            time_control='blitz',
+            result__in=['win', 'loss', 'draw']
+        )
+        blitz_matches = blitz_games.filter(date__gte=one_month_ago)
 
-        # Get the earliest blitz match from more than a month ago to establish baseline
-        earliest_match = Match.objects.filter(
-            (Q(white_player=player) | Q(black_player=player)),
-            tournament__time_control='blitz',
-            tournament__date__lt=one_month_ago,
-            result__in=['white_win', 'black_win', 'draw']
-        ).order_by('-tournament__date', '-round__number').first()
+        # Is there a blitz game from more than a month ago to establish a baseline
+        earliest_match = blitz_games.filter(date__lt=one_month_ago).exists()
 
         # Calculate rating change
         blitz_rating_month_ago = 1500  # Default starting rating
 
         if earliest_match:
             # This is a simplified approximation - in reality you'd need a rating history table
-            blitz_rating_month_ago = player.blitz_elo - (10 * len(blitz_matches))
+            blitz_rating_month_ago = player.blitz_elo - (10 * blitz_matches.count())
 
         context['blitz_rating_change'] = player.blitz_elo - blitz_rating_month_ago
 
-        # Calculate number of tournaments won
-        tournaments_won = 0
-        tournaments_participated = player.tournaments.filter(is_completed=True).order_by('date')
-
-        for tournament in tournaments_participated:
-            try:
-                # Check if player has rank 1 in the standings (winner)
-                standing = tournament.standings.get(player=player, rank=1)
-                if standing:
-                    tournaments_won += 1
-            except:
-                pass
-
-        context['tournaments_won'] = tournaments_won
+        # Number of tournaments won
+        context['tournaments_won'] = stats.tournaments_won
         
         return context
 
@@ -280,74 +234,25 @@ class TournamentListView(ListView):
     context_object_name = 'tournaments'
     
     def get_queryset(self):
-        """Get tournaments and pre-calculate winners"""
-        tournaments = Tournament.objects.all().order_by('-date')
-        
-        # For each tournament, find the winner and runner-up
-        result = []
-        for tournament in tournaments:
-            # Manually execute updated standings calculation for completed tournaments
-            if tournament.is_completed:
-                from .utils import update_tournament_standings
-                update_tournament_standings(tournament)
-                
-                # Get standings sorted by score
-                standings = list(tournament.standings.all().order_by('-score'))
-                
-                # Find winner and runner-up
-                if standings:
-                    tournament.winner = standings[0].player
-                    tournament.runner_up = standings[1].player if len(standings) > 1 else None
-                else:
-                    tournament.winner = None
-                    tournament.runner_up = None
-            
-            result.append(tournament)
-        
-        return result
+        """Tournaments with their stored winner and runner-up, in one query"""
+        return Tournament.objects.select_related('winner', 'runner_up').order_by('-date')
         
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         from django.utils import timezone
         today = timezone.now().date()
         
-        # Add upcoming tournaments to context
-        upcoming_tournaments = Tournament.objects.filter(
-            is_completed=False,
-            date__gte=today
-        ).order_by('date')
+        # Split the one list instead of querying again
+        tournaments = list(context['tournaments'])
         
-        # Process upcoming tournaments to attach winners (should be None for upcoming)
-        processed_upcoming = []
-        for tournament in upcoming_tournaments:
-            tournament.winner = None
-            tournament.runner_up = None
-            processed_upcoming.append(tournament)
-        
-        context['upcoming_tournaments'] = processed_upcoming
-        
-        # Add past tournaments to context
-        past_tournaments = Tournament.objects.filter(
-            is_completed=True
-        ).order_by('-date')
-        
-        # Process past tournaments to attach winners (CLEAN VERSION)
-        processed_past = []
-        for tournament in past_tournaments:
-            # Get standings sorted by score
-            standings = list(tournament.standings.all().order_by('-score'))
-            
-            # Find winner and runner-up WITHOUT adding emoji
-            if standings and len(standings) > 0:
-                tournament.winner = standings[0].player  # Just assign the player object
-                tournament.runner_up = standings[1].player if len(standings) > 1 else None
-            else:
-                tournament.winner = None
-                tournament.runner_up = None
-            
-            processed_past.append(tournament)
+        # Upcoming tournaments, soonest first
+        context['upcoming_tournaments'] = sorted(
+            (t for t in tournaments if not t.is_completed and t.date >= today),
+            key=lambda t: t.date
+        )
         
-        context['past_tournaments'] = processed_past
+        # Past tournaments, most recent first
+        context['past_tournaments'] = [t for t in tournaments if t.is_completed]
         
         return context
 
@@ -357,55 +262,139 @@ class TournamentDetailView(DetailView):
     template_name = 'chess/tournament_detail.html'
     context_object_name = 'tournament'
     
+    # Context that is only computed when a template fragment using it is not in the cache
+    DEFERRED_CONTEXT = (
+        'standings', 'tiebreak_labels', 'participants', 'rounds', 'round_games', 'current_round',
+        'current_matches', 'all_rounds_completed', 'can_end_tournament', 'available_players',
+    )
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        tournament = self.get_object()
-        
-        # Get tournament standings ordered by score (descending) and rating (descending)
-        standings = tournament.standings.all().order_by('-score', '-player__elo')
-        context['standings'] = standings
-        
-        # Get all rounds in order
-        rounds = tournament.rounds.all().order_by('number')
-        context['rounds'] = rounds
-        
-        # Get all matches organized by round number
-        rounds_matches = {}
-        for round_obj in rounds:
-            # Separate normal matches and bye matches
-            normal_matches = list(round_obj.matches.filter(black_player__isnull=False))
-            bye_matches = list(round_obj.matches.filter(black_player__isnull=True, result='bye'))
-            
-            # Combine lists, with bye matches at the end
-            rounds_matches[round_obj.number] = normal_matches + bye_matches
+        tournament = self.object
         
-        context['rounds_matches'] = rounds_matches
+        # Fragments are cached per tournament version; pairings also show ratings
+        context['fragment_version'] = f"{tournament_version(tournament.id)}.{ratings_version()}"
+        context['fragment_timeout'] = FRAGMENT_TIMEOUT
         
-        # Get current round (first incomplete round)
-        try:
-            current_round = rounds.filter(is_completed=False).earliest('number')
-            context['current_round'] = current_round
-            
-            # Get matches for current round, with bye matches at the end
-            normal_matches = list(current_round.matches.filter(black_player__isnull=False))
-            bye_matches = list(current_round.matches.filter(black_player__isnull=True, result='bye'))
-            context['current_matches'] = normal_matches + bye_matches
-        except Round.DoesNotExist:
-            # If all rounds are completed, set the last round as current
-            if rounds.exists():
-                context['current_round'] = rounds.latest('number')
-                normal_matches = list(context['current_round'].matches.filter(black_player__isnull=False))
-                bye_matches = list(context['current_round'].matches.filter(black_player__isnull=True, result='bye'))
-                context['current_matches'] = normal_matches + bye_matches
+        for name in self.DEFERRED_CONTEXT:
+            context[name] = deferred(functools.partial(getattr, self, name))
+        return context
+    
+    @functools.cached_property
+    def tiebreaks(self):
+        # Tiebreak columns, in the order the tournament applies them
+        return tiebreak_order(self.object)
+    
+    @functools.cached_property
+    def tiebreak_labels(self):
+        return [TIEBREAK_LABELS[key] for key in self.tiebreaks]
+    
+    @functools.cached_property
+    def participants(self):
+        # Participants with their ratings on every track
+        return list(self.object.participants.prefetch_related('ratings'))
+    
+    @functools.cached_property
+    def players(self):
+        # Every player on the page by id, so standings and matches share one set of User rows
+        return {player.id: player for player in self.participants}
+    
+    def attach_players(self, objects, *fields):
+        """
+        Set the players of the given standings or matches from self.players, loading
+        players that no longer take part (and their ratings) in one extra query
+        """
+        missing = {
+            getattr(obj, f"{field}_id") for obj in objects for field in fields
+        } - set(self.players) - {None}
+        if missing:
+            for player in User.objects.filter(pk__in=missing).prefetch_related('ratings'):
+                self.players[player.id] = player
+        for obj in objects:
+            for field in fields:
+                player_id = getattr(obj, f"{field}_id")
+                if player_id is not None:
+                    setattr(obj, field, self.players[player_id])
+    
+    @functools.cached_property
+    def standings(self):
+        # Get tournament standings in rank order (score, then the tiebreaks) and by rating within a shared rank
+        standings = list(self.object.standings.order_by('rank', '-score', '-player__elo'))
+        self.attach_players(standings, 'player')
+        for standing in standings:
+            standing.tiebreak_values = [getattr(standing, key) for key in self.tiebreaks]
+        return standings
+    
+    @functools.cached_property
+    def rounds(self):
+        # All published rounds in order; their games are loaded separately
+        return list(self.object.rounds.filter(is_published=True).order_by('number'))
+    
+    @functools.cached_property
+    def round_games(self):
+        # The rounds with the games of each in round_obj.games, for the staff accordion
+        games = {round_obj.id: [] for round_obj in self.rounds}
+        matches = list(Match.objects.filter(round__in=self.rounds).order_by('id'))
+        self.attach_players(matches, 'white_player', 'black_player')
+        for match in matches:
+            games[match.round_id].append(match)
+        for round_obj in self.rounds:
+            round_obj.games = games[round_obj.id]
+        return self.rounds
+    
+    @functools.cached_property
+    def current_round(self):
+        # Get current round (first incomplete round), or the last one once all are completed
+        for round_obj in self.rounds:
+            if not round_obj.is_completed:
+                return round_obj
+        return self.rounds[-1] if self.rounds else None
+    
+    @functools.cached_property
+    def all_rounds_completed(self):
+        # No more rounds to complete - hides the "Complete Current Round" button
+        return bool(self.rounds) and all(round_obj.is_completed for round_obj in self.rounds)
+    
+    @functools.cached_property
+    def current_matches(self):
+        if self.current_round is None:
+            return []
+        
+        # Matches of the current round, with bye matches at the end
+        matches = list(self.current_round.matches.order_by('id'))
+        self.attach_players(matches, 'white_player', 'black_player')
+        normal_matches = [match for match in matches if match.black_player_id]
+        bye_matches = [match for match in matches if not match.black_player_id and match.result == 'bye']
+        current_matches = normal_matches + bye_matches
+        
+        # Get player rankings from standings
+        player_rankings = {}
+        for standing in self.standings:
+            player_rankings[standing.player_id] = standing.rank or 999
+        
+        # Calculate board values and assign board numbers
+        for match in current_matches:
+            # Skip for bye matches
+            if match.black_player is None:
+                match.board_value = 9999  # High value so byes appear last
+                continue
                 
-                # No more rounds to complete - set a flag to hide the "Complete Current Round" button
-                context['all_rounds_completed'] = True
-            else:
-                context['current_round'] = None
-                context['current_matches'] = []
+            white_rank = player_rankings.get(match.white_player_id, 999)
+            black_rank = player_rankings.get(match.black_player_id, 999)
+            match.board_value = white_rank + black_rank
+        
+        # Sort matches by board value and assign board numbers
+        current_matches.sort(key=lambda m: m.board_value)
+        for i, match in enumerate(current_matches):
+            match.board_number = i + 1
+        return current_matches
+    
+    @functools.cached_property
+    def can_end_tournament(self):
+        tournament = self.object
         
         # Calculate the expected number of rounds for this tournament
-        participant_count = tournament.participants.count()
+        participant_count = tournament.participant_count
         
         # Special handling for 2-player tournaments
         if participant_count == 2:
@@ -431,51 +420,45 @@ class TournamentDetailView(DetailView):
                 expected_rounds = tournament.num_rounds
         
         # Check if all expected rounds exist and are completed
-        completed_rounds_count = rounds.filter(is_completed=True).count()
-        context['can_end_tournament'] = (completed_rounds_count >= expected_rounds)
-        
-        # For board numbers assignment (unchanged)
-        if context['current_round'] and context['current_matches']:
-            current_matches = list(context['current_matches'])
-            
-            # Get player rankings from standings
-            player_rankings = {}
-            for standing in context['standings']:
-                player_rankings[standing.player.id] = standing.rank or 999
-            
-            # Calculate board values and assign board numbers
-            for match in current_matches:
-                # Skip for bye matches
-                if match.black_player is None:
-                    match.board_value = 9999  # High value so byes appear last
-                    continue
-                    
-                white_rank = player_rankings.get(match.white_player.id, 999)
-                black_rank = player_rankings.get(match.black_player.id, 999)
-                match.board_value = white_rank + black_rank
-            
-            # Sort matches by board value and assign board numbers
-            current_matches.sort(key=lambda m: m.board_value)
-            for i, match in enumerate(current_matches):
-                match.board_number = i + 1
-            
-            context['current_matches'] = current_matches
-        
+        completed_rounds_count = sum(1 for round_obj in self.rounds if round_obj.is_completed)
+        return completed_rounds_count >= expected_rounds
+    
+    @functools.cached_property
+    def available_players(self):
         # Add available players for dropdown (unchanged)
-        if self.request.user.is_staff and not tournament.is_completed:
-            # Get already registered player IDs
-            registered_player_ids = tournament.participants.values_list('id', flat=True)
-            
-            # Get available players (not registered, not staff/superuser)
-            available_players = User.objects.filter(
-                is_active=True, 
-                is_staff=False, 
-                is_superuser=False
-            ).exclude(id__in=registered_player_ids).order_by('first_name', 'last_name')
-            
-            context['available_players'] = available_players
+        if not self.request.user.is_staff or self.object.is_completed:
+            return []
         
-        return context
+        # Get available players (not registered, not staff/superuser)
+        return User.objects.filter(
+            is_active=True, 
+            is_staff=False, 
+            is_superuser=False
+        ).exclude(tournaments=self.object).order_by('first_name', 'last_name')
+
+def round_etag(request, tournament_id, number):
+    """ETag of a round fragment: changes whenever the tournament or the ratings change"""
+    return f"{tournament_version(tournament_id)}.{ratings_version()}"
+
+@require_GET
+@cache_control(no_cache=True)
+@etag(round_etag)
+def tournament_round(request, tournament_id, number):
+    """The games of one published round as an HTML fragment, loaded when its tab is opened"""
+    round_obj = get_object_or_404(
+        Round.objects.select_related('tournament'), tournament_id=tournament_id, number=number, is_published=True
+    )
+    
+    def games():
+        return list(round_obj.matches.select_related('white_player', 'black_player').order_by('id'))
+    
+    return render(request, 'chess/tournament_round.html', {
+        'tournament': round_obj.tournament,
+        'round_obj': round_obj,
+        'games': deferred(games),
+        'fragment_version': round_etag(request, tournament_id, number),
+        'fragment_timeout': FRAGMENT_TIMEOUT,
+    })
 
 class CreateTournamentView(LoginRequiredMixin, UserPassesTestMixin, CreateView):
     """View for creating new tournaments (admin only)"""
@@ -543,15 +526,14 @@ class StartTournamentView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
         tournament.has_started = True
         tournament.save()
         
-        # Create first round
-        round_obj = Round.objects.create(tournament=tournament, number=1)
-        
         # Generate pairings based on tournament type
         try:
-            # Generate the pairings for the first round!
             if tournament.tournament_type in ['round_robin', 'double_round_robin']:
-                generate_round_robin_pairings(tournament, round_obj)
+                # The whole schedule is known up front, round 1 is published right away
+                schedule_round_robin(tournament)
             else:  # Swiss
+                # Create and pair the first round!
+                round_obj = Round.objects.create(tournament=tournament, number=1)
                 generate_swiss_pairings(tournament, round_obj)
             
             # Calculate total planned rounds for this tournament type
@@ -581,8 +563,8 @@ class StartTournamentView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
             messages.success(self.request, f"Tournament started! Round 1 pairings generated.")
         except Exception as e:
             messages.error(self.request, f"Error starting tournament: {str(e)}")
-            # Delete the round if there was an error
-            round_obj.delete()
+            # Delete the rounds if there was an error
+            tournament.rounds.all().delete()
             tournament.has_started = False
             tournament.save()
             return self.form_invalid(form)
@@ -599,10 +581,18 @@ class EnterMatchResultView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
         return self.request.user.is_staff
     
     def form_valid(self, form):
+        if not self.object.round.is_published:
+            messages.error(self.request, "This round has not been published yet")
+            return HttpResponseRedirect(reverse_lazy('tournament_detail', kwargs={'pk': self.object.tournament.pk}))
+        
+        previous_result = form.initial.get('result')
         match = form.save()
         tournament = match.tournament
         round_obj = match.round
         
+        # Apply just this result to the standings
+        apply_result_change(match, previous_result)
+        
         # Check if all matches in this round are completed
         pending_matches = round_obj.matches.filter(result='pending')
         
@@ -612,9 +602,15 @@ class EnterMatchResultView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
                 round_obj.is_completed = True
                 round_obj.save()
                 
-                # Update tournament standings
+                # Rate all games of the round as one rating period
+                rate_round(round_obj)
+                
+                # Full recompute of the standings at the end of the round, as a check on the incremental updates
                 update_tournament_standings(tournament)
                 
+                # Keep the standings after this round
+                snapshot_standings(tournament, [round_obj])
+                
                 # Calculate the planned total rounds based on tournament type
                 participant_count = tournament.participants.count()
                 if tournament.tournament_type == 'round_robin':
@@ -624,15 +620,18 @@ class EnterMatchResultView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
                 else:  # Swiss only now
                     planned_rounds = tournament.num_rounds
                 
+                next_round = Round.objects.filter(
+                    tournament=tournament,
+                    number=round_obj.number + 1
+                ).first()
+                
+                if next_round and not next_round.is_published:
+                    # Scheduled round robin: the next round only has to be published
+                    publish_round(next_round)
+                    messages.success(self.request, f"Round {round_obj.number} completed. Round {next_round.number} is now published.")
                 # Check if there are more rounds to be played and if the next round doesn't already exist
-                if round_obj.number < planned_rounds:
-                    # Check if the next round already exists
-                    next_round_exists = Round.objects.filter(
-                        tournament=tournament,
-                        number=round_obj.number + 1
-                    ).exists()
-                    
-                    if not next_round_exists:
+                elif round_obj.number < planned_rounds:
+                    if not next_round:
                         # Create next round
                         next_round = Round.objects.create(
                             tournament=tournament,
@@ -704,7 +703,7 @@ class UserListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
         return self.request.user.is_staff
     
     def get_queryset(self):
-        return User.objects.order_by('-is_active', 'username')
+        return User.objects.prefetch_related('ratings').order_by('-is_active', 'username')
 
 class UserEditView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
     """View for superusers to edit user details"""
@@ -717,8 +716,14 @@ class UserEditView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
         return self.request.user.is_staff
     
     def form_valid(self, form):
-        messages.success(self.request, f"User {form.instance.username} updated successfully")
-        return super().form_valid(form)
+        # The rating is written on its own, so saving the other details cannot overwrite a
+        # rating that changed since the form was loaded
+        user = form.save(commit=False)
+        user.save(update_fields=[field for field in form.Meta.fields if field != 'elo'])
+        if 'elo' in form.changed_data:
+            set_overall_rating(user.pk, form.cleaned_data['elo'])
+        messages.success(self.request, f"User {user.username} updated successfully")
+        return HttpResponseRedirect(self.success_url)
 
 class UserCreateView(LoginRequiredMixin, UserPassesTestMixin, CreateView):
     """View for superusers to create new users"""
@@ -748,7 +753,7 @@ class ProfileView(TemplateView):
         # Determine which user's profile to show
         if 'pk' in kwargs:
             # If a specific user ID is provided, show their profile
-            profile_user = get_object_or_404(User, pk=kwargs['pk'])
+            profile_user = get_object_or_404(User.objects.prefetch_related('ratings'), pk=kwargs['pk'])
             context['is_own_profile'] = self.request.user.is_authenticated and self.request.user.id == profile_user.id
         else:
             # If no user ID provided, show the current user's profile
@@ -760,8 +765,40 @@ class ProfileView(TemplateView):
             
         context['profile_user'] = profile_user
         
-        # Get upcoming tournaments the user is registered for
+        # Check for new achievements (only if viewing own profile)
+        if context['is_own_profile']:
+            from .achievement_service import check_achievements
+            context['new_achievements'] = check_achievements(profile_user)
+        
+        # Fragments are cached per player version; upcoming tournaments also depend on the day
         today = timezone.now().date()
+        context['fragment_version'] = f"{player_version(profile_user.id)}.{ratings_version()}.{today.isoformat()}"
+        context['fragment_timeout'] = FRAGMENT_TIMEOUT
+        
+        # The rest is only computed for fragments that are not in the cache
+        context.update(deferred_group(
+            lambda: self.get_tournament_context(profile_user, today),
+            ('upcoming_tournaments', 'past_tournaments')
+        ))
+        context.update(deferred_group(
+            lambda: self.get_stats_context(profile_user),
+            ('total_matches', 'wins', 'white_wins', 'black_wins', 'losses', 'white_losses', 'black_losses',
+             'draws', 'white_draws', 'black_draws', 'total_games', 'win_percentage', 'white_win_rate',
+             'black_win_rate', 'tournament_count', 'tournaments_won', 'avg_position', 'avg_points',
+             'avg_total_players')
+        ))
+        context.update(deferred_group(
+            lambda: self.get_achievement_context(profile_user),
+            ('achievement_categories', 'total_achievements')
+        ))
+        context['recent_matches'] = deferred(lambda: recent_matches(profile_user))
+        
+        return context
+    
+    def get_tournament_context(self, profile_user, today):
+        context = {}
+        
+        # Get upcoming tournaments the user is registered for
         context['upcoming_tournaments'] = Tournament.objects.filter(
             participants=profile_user,
             date__gte=today,
@@ -774,56 +811,46 @@ class ProfileView(TemplateView):
             is_completed=True
         ).order_by('-date')
         
-        # Process tournaments and their standings separately
-        processed_past_tournaments = []
-        for tournament in past_tournaments:
-            # Create a temporary copy of the tournament for display purposes
-            tournament_info = {
+        # The user's standing in each of them, in one query
+        standings = {
+            standing.tournament_id: standing
+            for standing in TournamentStanding.objects.filter(tournament__in=past_tournaments, player=profile_user)
+        }
+        context['past_tournaments'] = [
+            {
                 'id': tournament.id,
                 'name': tournament.name,
                 'date': tournament.date,
-                'standings': None
+                'standings': standings.get(tournament.id)
             }
-            
-            # Try to find the user's standing for this tournament
-            try:
-                standing = TournamentStanding.objects.get(
-                    tournament=tournament,
-                    player=profile_user
-                )
-                tournament_info['standings'] = standing
-            except TournamentStanding.DoesNotExist:
-                pass
-            
-            processed_past_tournaments.append(tournament_info)
-        
-        context['past_tournaments'] = processed_past_tournaments
+            for tournament in past_tournaments
+        ]
+        return context
+    
+    def get_stats_context(self, profile_user):
+        context = {}
         
-        # Calculate match statistics
-        white_matches = profile_user.white_matches.exclude(result='pending')
-        black_matches = profile_user.black_matches.exclude(result='pending')
+        # Match statistics, overall and by color, from the stored counters
+        stats = player_stats([profile_user.id])[profile_user.id]
         
         # Total matches
-        context['total_matches'] = white_matches.count() + black_matches.count()
+        context['total_matches'] = stats.games
         
         # Wins calculation
-        white_wins = white_matches.filter(result='white_win').count()
-        black_wins = black_matches.filter(result='black_win').count()
-        context['wins'] = white_wins + black_wins
+        white_wins, black_wins = stats.white_wins, stats.black_wins
+        context['wins'] = stats.wins
         context['white_wins'] = white_wins
         context['black_wins'] = black_wins
         
         # Losses calculation
-        white_losses = white_matches.filter(result='black_win').count()
-        black_losses = black_matches.filter(result='white_win').count()
-        context['losses'] = white_losses + black_losses
+        white_losses, black_losses = stats.white_losses, stats.black_losses
+        context['losses'] = stats.losses
         context['white_losses'] = white_losses
         context['black_losses'] = black_losses
         
         # Draws calculation
-        white_draws = white_matches.filter(result='draw').count()
-        black_draws = black_matches.filter(result='draw').count()
-        context['draws'] = white_draws + black_draws
+        white_draws, black_draws = stats.white_draws, stats.black_draws
+        context['draws'] = stats.draws
         context['white_draws'] = white_draws
         context['black_draws'] = black_draws
         
@@ -850,20 +877,48 @@ class ProfileView(TemplateView):
         else:
             context['black_win_rate'] = 0
         
-        # Recent match history
-        combined_matches = list(white_matches) + list(black_matches)
-        combined_matches.sort(key=lambda x: (x.round.tournament.date, x.round.number), reverse=True)
-        context['recent_matches'] = combined_matches[:10]  # Keep only the 10 most recent
+        # Tournament statistics
+        # Calculate number of tournaments played
+        tournaments_participated = profile_user.tournaments.filter(is_completed=True)
+        context['tournament_count'] = stats.tournaments_played
+
+        # Number of tournaments won, from the stored counters
+        tournaments_won = stats.tournaments_won
+        avg_position = 0
+        avg_points = 0
+        avg_total_players = 0  # Add this variable
+
+        if context['tournament_count'] > 0:
+            # Calculate average position and points
+            standings = TournamentStanding.objects.filter(
+                tournament__in=tournaments_participated,
+                player=profile_user
+            )
+            
+            if standings.exists():
+                avg_position = standings.aggregate(Avg('rank'))['rank__avg']
+                avg_points = standings.aggregate(Avg('score'))['score__avg']
+                
+                # Calculate average number of participants
+                total_participants = 0
+                for tournament in tournaments_participated:
+                    total_participants += tournament.participants.count()
+                
+                avg_total_players = total_participants / context['tournament_count']
+
+        context['tournaments_won'] = tournaments_won
+        context['avg_position'] = avg_position if avg_position else 0
+        context['avg_points'] = avg_points if avg_points else 0
+        context['avg_total_players'] = avg_total_players
+        
+        return context
+    
+    def get_achievement_context(self, profile_user):
+        context = {}
         
         # Get user achievements
         from .models import Achievement
         
-        # Check for new achievements (only if viewing own profile)
-        if context['is_own_profile']:
-            from .achievement_service import check_achievements
-            new_achievements = check_achievements(profile_user)
-            context['new_achievements'] = new_achievements
-        
         # Organize achievements by category
         achievements = Achievement.objects.filter(user=profile_user).order_by('-date_achieved')
         
@@ -910,49 +965,6 @@ class ProfileView(TemplateView):
         context['achievement_categories'] = achievement_categories
         context['total_achievements'] = achievements.count()
         
-        # Tournament statistics
-        # Calculate number of tournaments played
-        tournaments_participated = profile_user.tournaments.filter(is_completed=True)
-        context['tournament_count'] = tournaments_participated.count()
-
-        # Calculate number of tournaments won
-        tournaments_won = 0
-        avg_position = 0
-        avg_points = 0
-        avg_total_players = 0  # Add this variable
-
-        if context['tournament_count'] > 0:
-            # Count tournaments where the user was ranked 1st
-            for tournament in tournaments_participated:
-                try:
-                    standing = tournament.standings.get(player=profile_user, rank=1)
-                    if standing:
-                        tournaments_won += 1
-                except TournamentStanding.DoesNotExist:
-                    pass
-                
-            # Calculate average position and points
-            standings = TournamentStanding.objects.filter(
-                tournament__in=tournaments_participated,
-                player=profile_user
-            )
-            
-            if standings.exists():
-                avg_position = standings.aggregate(Avg('rank'))['rank__avg']
-                avg_points = standings.aggregate(Avg('score'))['score__avg']
-                
-                # Calculate average number of participants
-                total_participants = 0
-                for tournament in tournaments_participated:
-                    total_participants += tournament.participants.count()
-                
-                avg_total_players = total_participants / context['tournament_count']
-
-        context['tournaments_won'] = tournaments_won
-        context['avg_position'] = avg_position if avg_position else 0
-        context['avg_points'] = avg_points if avg_points else 0
-        context['avg_total_players'] = avg_total_players
-        
         return context
 
 
@@ -978,7 +990,7 @@ def user_toggle_active(request, pk):
     
     user = get_object_or_404(User, pk=pk)
     user.is_active = not user.is_active
-    user.save()
+    user.save(update_fields=['is_active'])
     
     status = "activated" if user.is_active else "deactivated"
     messages.success(request, f"User {user.username} {status} successfully")
@@ -1071,7 +1083,12 @@ def complete_round(request, tournament_id, round_id):
         print("Round doesn't belong to this tournament, aborting")
         messages.error(request, "Round doesn't belong to this tournament")
         return redirect('tournament_detail', pk=tournament_id)
-    
+
+    if not round_obj.is_published:
+        print("Round has not been published yet, aborting")
+        messages.error(request, "This round has not been published yet")
+        return redirect('tournament_detail', pk=tournament_id)
+
     # Check if any matches are still pending
     pending_matches = round_obj.matches.filter(result='pending')
     print(f"Pending matches: {pending_matches.count()}")
@@ -1090,10 +1107,17 @@ def complete_round(request, tournament_id, round_id):
     round_obj.is_completed = True
     round_obj.save()
     
+    # Rate all games of the round as one rating period
+    logging.info(f"Rating round {round_obj.number} of tournament {tournament.id} as one rating period")
+    rate_round(round_obj)
+    
     # Update tournament standings
     print("Updating tournament standings")
     update_tournament_standings(tournament)
     
+    # Keep the standings after this round
+    snapshot_standings(tournament, [round_obj])
+    
     # Get current standings
     standings = TournamentStanding.objects.filter(tournament=tournament).order_by('-score')
     print("Current standings:")
@@ -1138,13 +1162,20 @@ def complete_round(request, tournament_id, round_id):
     
     print(f"Current round: {round_obj.number}, Planned rounds: {planned_rounds}")
     
+    next_round = Round.objects.filter(
+        tournament=tournament,
+        number=round_obj.number + 1
+    ).first()
+    
+    if next_round and not next_round.is_published:
+        # Scheduled round robin: the next round only has to be published
+        logging.info(f"Publishing scheduled round {next_round.number} of tournament {tournament.id}")
+        publish_round(next_round)
+        messages.success(request, f"Round {round_obj.number} completed. Round {next_round.number} is now published.")
     # Check if there are more rounds to be played
-    if round_obj.number < planned_rounds:
+    elif round_obj.number < planned_rounds:
         # Check if the next round already exists
-        next_round_exists = Round.objects.filter(
-            tournament=tournament,
-            number=round_obj.number + 1
-        ).exists()
+        next_round_exists = next_round is not None
         
         print(f"Round {round_obj.number} < Planned rounds {planned_rounds}")
         print(f"Next round already exists: {next_round_exists}")
@@ -1214,6 +1245,9 @@ def complete_tournament(request, tournament_id):
         messages.error(request, "This tournament is already completed")
         return redirect('tournament_detail', pk=tournament_id)
     
+    # Rounds of the schedule that were never reached are dropped
+    delete_rounds(tournament.rounds.filter(is_published=False))
+    
     # Ensure all matches have results before completing
     pending_matches = tournament.matches.filter(result='pending')
     if pending_matches.exists():
@@ -1226,85 +1260,40 @@ def complete_tournament(request, tournament_id):
     # Update tournament standings one last time
     update_tournament_standings(tournament)
     
+    # Keep the standings after every round that has none yet, the final round included
+    snapshot_standings(tournament)
+    
+    # Rate every round that has not been rated yet
+    rate_tournament(tournament)
+    
     # Mark the tournament as completed BEFORE checking achievements
     tournament.is_completed = True
     tournament.save()
     
+    # Store the results shown on the tournament list
+    update_tournament_summary(tournament)
+    
+    # Count the final placings in the players' statistics
+    credit_tournament(tournament)
+    
     # Get the tournament winner
-    try:
-        winner_standing = TournamentStanding.objects.get(
-            tournament=tournament,
-            rank=1
-        )
-        winner = winner_standing.player
+    winner = tournament.winner
+    if winner:
         messages.success(request, f"Tournament winner: {winner.get_full_name() or winner.username}")
-    except TournamentStanding.DoesNotExist:
-        winner = None
+    else:
         messages.warning(request, "No tournament winner could be determined")
     
-    # Save rating history for each participant
-    for participant in tournament.participants.all():
-        # Determine which rating to use based on tournament time control
-        if tournament.time_control == 'bullet':
-            rating = participant.bullet_elo
-        elif tournament.time_control == 'blitz':
-            rating = participant.blitz_elo
-        elif tournament.time_control == 'rapid':
-            rating = participant.rapid_elo
-        elif tournament.time_control == 'classical':
-            rating = participant.classical_elo
-        else:
-            rating = participant.elo
-            
-        # Use get_or_create to avoid the unique constraint error
-        PlayerRatingHistory.objects.get_or_create(
-            player=participant,
-            tournament=tournament,
-            defaults={
-                'date': tournament.date,
-                'rating': round(rating),  # Store as rounded integer
-                'time_control': tournament.time_control
-            }
-        )
-        
-        # Check for achievements - with additional verification for tournament winners
-        from .achievement_service import check_achievements
-        
-        # If this participant is the winner, ensure they get the tournament_win_1 achievement
-        if winner and participant.id == winner.id:
-            # Count their total tournament wins
-            win_count = TournamentStanding.objects.filter(
-                player=participant,
-                rank=1,
-                tournament__is_completed=True
-            ).count()
-            
-            # Check if they already have the tournament_win_1 achievement
-            existing_achievement = Achievement.objects.filter(
-                user=participant, 
-                achievement_type='tournament_win_1'
-            ).first()
-            
-            if existing_achievement:
-                # Update the count if needed
-                if existing_achievement.count != win_count:
-                    existing_achievement.count = win_count
-                    existing_achievement.save()
-                    messages.info(request, f"Updated tournament win count for {participant.get_full_name()}")
-            else:
-                # Create the achievement
-                Achievement.objects.create(
-                    user=participant, 
-                    achievement_type='tournament_win_1',
-                    count=win_count
-                )
-                messages.info(request, f"{participant.get_full_name()} earned: Tournament Champion")
-        
-        # Run standard achievement check for all participants
-        new_achievements = check_achievements(participant)
+    # Rating history and achievements of all participants together
+    from .achievement_service import check_tournament_achievements
+    
+    participants = list(tournament.participants.prefetch_related('ratings'))
+    record_rating_history(tournament, participants)
+    
+    achievement_names = dict(Achievement.ACHIEVEMENT_TYPES)
+    for participant, new_achievements in check_tournament_achievements(tournament, participants).items():
         if new_achievements:
-            achievement_names = [dict(Achievement.ACHIEVEMENT_TYPES).get(a.achievement_type) for a in new_achievements]
-            messages.info(request, f"{participant.get_full_name()} earned new achievements: {', '.join(achievement_names)}")
+            names = [achievement_names.get(a.achievement_type) for a in new_achievements]
+            messages.info(request, f"{participant.get_full_name()} earned new achievements: {', '.join(names)}")
     
     messages.success(request, "Tournament has been marked as completed")
     return redirect('tournament_detail', pk=tournament_id)
@@ -1322,7 +1311,7 @@ def player_search(request):
             Q(last_name__icontains=query) |
             Q(lichess_account__icontains=query) |
             Q(chesscom_account__icontains=query)
-        ).order_by('-elo')
+        ).prefetch_related('ratings').order_by('-elo')
     else:
         players = User.objects.none()
     
@@ -1351,13 +1340,16 @@ def inline_match_result(request, match_id):
     if request.method != 'POST':
         return JsonResponse({'success': False, 'error': 'Invalid request method'})
     
-    match = get_object_or_404(Match, pk=match_id)
+    match = get_object_or_404(Match.objects.select_related('tournament', 'round'), pk=match_id)
     tournament = match.tournament
     
     # Check if tournament is completed
     if tournament.is_completed:
         return JsonResponse({'success': False, 'error': 'Tournament is already completed'})
     
+    if not match.round.is_published:
+        return JsonResponse({'success': False, 'error': 'Round has not been published yet'})
+    
     # Get the new result from the form
     result = request.POST.get('result')
     
@@ -1373,8 +1365,8 @@ def inline_match_result(request, match_id):
     match.result = result
     match.save()
     
-    # Update tournament standings
-    update_tournament_standings(tournament)
+    # Apply just this result to the standings
+    apply_result_change(match, previous_result)
     
     # We will NOT check for achievements here anymore - only at tournament completion
     
@@ -1383,7 +1375,7 @@ def inline_match_result(request, match_id):
 def player_rating_history(request, player_id):
     """API view to get rating history data for a player chart"""
     try:
-        player = User.objects.get(pk=player_id)
+        player = User.objects.prefetch_related('ratings').get(pk=player_id)
         
         # Get player's rating history entries
         history_entries = PlayerRatingHistory.objects.filter(
@@ -1411,17 +1403,8 @@ def player_rating_history(request, player_id):
                         player=player
                     )
                     
-                    # Determine which rating field to use based on time control
-                    if time_control == 'bullet':
-                        rating = player.bullet_elo
-                    elif time_control == 'blitz':
-                        rating = player.blitz_elo
-                    elif time_control == 'rapid':
-                        rating = player.rapid_elo
-                    elif time_control == 'classical':
-                        rating = player.classical_elo
-                    else:
-                        rating = player.elo
+                    # Rating on the tournament's time control
+                    rating = player.get_rating_for_time_control(time_control)
                     
                     # Add tournament data point
                     data.append({
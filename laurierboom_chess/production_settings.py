@@ -169,6 +169,22 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Cache used for the rating leaderboards, the page fragments and the version counters behind
+# their keys. It must be shared by every worker process and dyno, so it lives in the database;
+# the table is created by `manage.py createcachetable` in the release phase.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'django_cache'),
+        # Room for the page fragments of every tournament and profile; the default of 300
+        # entries would keep evicting them
+        'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 10000))},
+    }
+}
+
+# Build the leaderboards on the first request of every process instead of on demand
+LEADERBOARD_WARMUP = os.environ.get('LEADERBOARD_WARMUP', 'False') == 'True'
+
 # Security settings for production
 if not DEBUG:
     SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
@@ -141,4 +141,19 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Cache used for the rating leaderboards. A file cache is shared by all worker processes;
+# set CACHE_BACKEND to django.core.cache.backends.locmem.LocMemCache for a single process.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', str(BASE_DIR / '.cache')),
+        # Room for the page fragments of every tournament and profile; the default of 300
+        # entries would keep evicting them
+        'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 10000))},
+    }
+}
+
+# Build the leaderboards on the first request of every process instead of on demand
+LEADERBOARD_WARMUP = os.environ.get('LEADERBOARD_WARMUP', 'False') == 'True'